@@ -0,0 +1,25 @@
+# request bodies for the batch endpoints
+import os
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+
+# Upper bound on queries per batch request
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "500"))
+
+
+class BatchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_QUERIES)
+    stream: bool = False  # NDJSON, one line per query in input order, as each finishes
+
+
+class KBSearchBatchRequest(BatchRequest):
+    k: int = Field(5, ge=1)
+    mode: Optional[Literal["dense", "bm25", "hybrid"]] = None
+    nprobe: Optional[int] = None
+    ef_search: Optional[int] = None
+    rerank: Optional[bool] = None
+    rerank_budget_ms: Optional[float] = None
+
+
+class RouteBatchRequest(BatchRequest):
+    concurrency: Optional[int] = Field(None, ge=1)  # items answered at once (default LLM_BATCH_CONCURRENCY)
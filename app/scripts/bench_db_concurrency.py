@@ -0,0 +1,159 @@
+import argparse
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+import numpy as np
+
+# Add the root directory to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+
+from create_db import DB_PATH, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+
+# Compare SQLite read throughput under concurrent readers for the old engine
+# setup (rollback journal, default pragmas, a fresh connection per request)
+# against the tuned one (WAL, synchronous=NORMAL, cache/mmap pragmas, pooled
+# read-only connections), optionally while a loader-like writer commits.
+#
+#   python app/scripts/bench_db_concurrency.py --readers 8 --seconds 10
+#   python app/scripts/bench_db_concurrency.py --readers 8 --writer --rows 200000
+
+QUERIES = [
+    "SELECT * FROM jira_tickets WHERE status = 'Open' LIMIT 50",
+    "SELECT * FROM jira_tickets WHERE assignee = 'ahmed_ali' AND priority = 'High' LIMIT 50",
+    "SELECT status, COUNT(*) FROM jira_tickets GROUP BY status",
+    "SELECT * FROM deployments WHERE service = 'payments' ORDER BY date DESC LIMIT 5",
+    "SELECT name, email FROM employees WHERE team = 'Backend' LIMIT 50",
+]
+STATUSES = ["Open", "In Progress", "Closed", "Blocked"]
+PRIORITIES = ["Low", "Medium", "High", "Critical"]
+
+
+def prepare_copy(src: Path, workdir: Path, extra_rows: int, journal_mode: str) -> Path:
+    """Copy the DB (so the real one's journal mode is untouched) and pad jira_tickets."""
+    path = workdir / f"bench_{journal_mode.lower()}.db"
+    shutil.copyfile(src, path)
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA journal_mode = {journal_mode}")
+    rng = random.Random(0)
+    conn.executemany(
+        "INSERT OR IGNORE INTO jira_tickets (id, summary, status, assignee, priority) VALUES (?, ?, ?, ?, ?)",
+        ((f"BENCH-{i}", f"Synthetic ticket {i}", rng.choice(STATUSES), f"user_{i % 500}", rng.choice(PRIORITIES))
+         for i in range(extra_rows)),
+    )
+    conn.commit()
+    conn.close()
+    return path
+
+
+def baseline_connect(path: Path) -> sqlite3.Connection:
+    # Mirrors the old setup: new connection per request, library defaults
+    return sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+
+
+def tuned_connect(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False,
+                           timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    conn.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA query_only = ON")
+    return conn
+
+
+def reader(path: Path, tuned: bool, stop: threading.Event, latencies: list, errors: list):
+    conn = tuned_connect(path) if tuned else None
+    i = random.randrange(len(QUERIES))
+    while not stop.is_set():
+        sql = QUERIES[i % len(QUERIES)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            c = conn if tuned else baseline_connect(path)
+            c.execute(sql).fetchall()
+            if not tuned:
+                c.close()
+            latencies.append(time.perf_counter() - started)
+        except sqlite3.OperationalError as e:
+            errors.append(str(e))
+    if conn is not None:
+        conn.close()
+
+
+def writer(path: Path, tuned: bool, stop: threading.Event, commits: list, batch: int, pause: float):
+    """Loader stand-in: repeated transactions that rewrite a batch of tickets."""
+    conn = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    if tuned:
+        conn.execute("PRAGMA synchronous = NORMAL")
+    rng = random.Random(1)
+    n = 0
+    while not stop.is_set():
+        try:
+            conn.executemany(
+                "INSERT INTO jira_tickets (id, summary, status, assignee, priority) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET status = excluded.status, priority = excluded.priority",
+                ((f"LOAD-{(n * batch + j) % 50000}", "Loader row", rng.choice(STATUSES), "loader",
+                  rng.choice(PRIORITIES)) for j in range(batch)),
+            )
+            conn.commit()
+            commits.append(time.perf_counter())
+            n += 1
+        except sqlite3.OperationalError:
+            conn.rollback()
+        time.sleep(pause)
+    conn.close()
+
+
+def run(path: Path, tuned: bool, readers: int, seconds: float, with_writer: bool, batch: int, pause: float):
+    stop = threading.Event()
+    latencies, errors, commits = [], [], []
+    threads = [threading.Thread(target=reader, args=(path, tuned, stop, latencies, errors)) for _ in range(readers)]
+    if with_writer:
+        threads.append(threading.Thread(target=writer, args=(path, tuned, stop, commits, batch, pause)))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    lat_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "qps": len(latencies) / seconds,
+        "p50": float(np.percentile(lat_ms, 50)),
+        "p95": float(np.percentile(lat_ms, 95)),
+        "p99": float(np.percentile(lat_ms, 99)),
+        "errors": len(errors),
+        "commits": len(commits),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite concurrent-reader benchmark: old vs tuned engine setup")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--rows", type=int, default=50000, help="synthetic tickets added to the copy")
+    parser.add_argument("--writer", action="store_true", help="run a loader-like writer alongside the readers")
+    parser.add_argument("--write-batch", type=int, default=500)
+    parser.add_argument("--write-pause-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers x {args.seconds:.0f}s, writer={'on' if args.writer else 'off'}, "
+          f"+{args.rows} synthetic tickets")
+    print(f"\n{'setup':<10} {'qps':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'commits':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, journal_mode, tuned in (("baseline", "DELETE", False), ("tuned", "WAL", True)):
+            path = prepare_copy(args.db, Path(workdir), args.rows, journal_mode)
+            r = run(path, tuned, args.readers, args.seconds, args.writer, args.write_batch,
+                    args.write_pause_ms / 1000)
+            print(f"{name:<10} {r['qps']:>9.0f} {r['p50']:>8.2f} {r['p95']:>8.2f} {r['p99']:>8.2f} "
+                  f"{r['errors']:>7} {r['commits']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+import numpy as np
+import faiss
+
+# Add the root directory to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+
+from app.services.kb_index_types import INDEX_TYPES, index_config, make_index, train_index, search
+
+# Compare the KB index types on recall@k (against exact flat search), query
+# latency and memory, sweeping the query-time knobs.
+#
+#   python app/scripts/bench_kb_index.py --synthetic 200000
+#   python app/scripts/bench_kb_index.py --source kb --queries 200
+
+NPROBE_SWEEP = [1, 4, 16, 64]
+EF_SEARCH_SWEEP = [16, 32, 64, 128]
+
+
+def synthetic_vectors(n: int, dim: int, clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """Clustered gaussian vectors; uniform random data makes every ANN index look bad."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    labels = rng.integers(0, clusters, n)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def kb_vectors() -> np.ndarray:
+    from app.services.embeddings import get_embeddings
+    from app.services.kb_store import kb_store
+    vectors = get_embeddings([m["text"] for m in kb_store.snapshot().meta])
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def make_queries(vectors: np.ndarray, n: int, seed: int = 1) -> np.ndarray:
+    """Perturbed corpus vectors, so each query has a meaningful neighbourhood."""
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.integers(0, len(vectors), n)]
+    queries = picks + 0.1 * rng.standard_normal(picks.shape).astype("float32")
+    faiss.normalize_L2(queries)
+    return np.ascontiguousarray(queries, dtype="float32")
+
+
+def index_bytes(index) -> int:
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def measure(index, queries: np.ndarray, truth: np.ndarray, k: int, **knobs):
+    latencies = []
+    hits = 0
+    for i in range(len(queries)):
+        started = time.perf_counter()
+        _, ids = search(index, queries[i:i + 1], k, **knobs)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += len(set(ids[0].tolist()) & set(truth[i].tolist()))
+    latencies = np.array(latencies)
+    return {
+        "recall_at_k": hits / float(truth.size),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency/memory benchmark for KB index types")
+    parser.add_argument("--source", choices=["synthetic", "kb"], default="synthetic")
+    parser.add_argument("--synthetic", type=int, default=100_000, help="number of synthetic vectors")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--json", type=str, default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    vectors = kb_vectors() if args.source == "kb" else synthetic_vectors(args.synthetic, args.dim)
+    queries = make_queries(vectors, args.queries)
+    ids = np.arange(len(vectors), dtype="int64")
+    print(f"Corpus: {len(vectors)} x {vectors.shape[1]}, queries: {len(queries)}, k={args.k}")
+
+    # Ground truth from exact search
+    exact = make_index(vectors.shape[1], {"type": "flat"})
+    exact.add_with_ids(vectors, ids)
+    _, truth = exact.search(queries, args.k)
+
+    results = []
+    for index_type in args.types:
+        config = index_config(index_type, len(vectors), nlist=args.nlist)
+        index = make_index(vectors.shape[1], config)
+        started = time.perf_counter()
+        train_index(index, vectors)
+        index.add_with_ids(vectors, ids)
+        build_seconds = time.perf_counter() - started
+        memory = index_bytes(index)
+
+        if config["type"] in ("ivf", "ivfpq"):
+            sweep = [{"nprobe": n} for n in NPROBE_SWEEP if n <= config["nlist"]]
+        elif config["type"] == "hnsw":
+            sweep = [{"ef_search": ef} for ef in EF_SEARCH_SWEEP]
+        else:
+            sweep = [{}]
+
+        for knobs in sweep:
+            row = {"config": config, "knobs": knobs, "build_seconds": build_seconds, "index_bytes": memory}
+            row.update(measure(index, queries, truth, args.k, **knobs))
+            results.append(row)
+            print(
+                f"{config['type']:<6} {json.dumps(knobs):<20} recall@{args.k}={row['recall_at_k']:.3f} "
+                f"p50={row['p50_ms']:.3f}ms p99={row['p99_ms']:.3f}ms "
+                f"mem={memory / 1e6:.1f}MB build={build_seconds:.1f}s"
+            )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
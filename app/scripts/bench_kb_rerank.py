@@ -0,0 +1,97 @@
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+import numpy as np
+
+# Add the root directory to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+
+from app.services import kb_reranker
+from app.services.kb_retriever import SEARCH_MODES, search_kb
+from app.services.kb_store import kb_store
+from app.services.kb_router import KB_SYSTEM_PROMPT, prepare_kb_prompt
+from app.services.context_builder import build_kb_context
+from app.services.groq_client import ask_llama3
+from app.scripts.eval_kb_retrieval import generated_queries, load_queries
+
+# Compare KB retrieval with and without the cross-encoder rerank stage: how
+# much context reaches the prompt, whether the relevant file is still in it,
+# and what it costs in latency. With --llm every query is also answered, so
+# end-to-end latency includes the LLM call (point LLM_BASE_URL at
+# app/scripts/mock_llm_server.py to measure without a real provider).
+#
+#   python app/scripts/bench_kb_rerank.py --queries q.jsonl --llm
+#   python app/scripts/bench_kb_rerank.py --baseline-k 10 --rerank-k 3 --budget-ms 100
+
+
+def run_config(name, queries, k, rerank, budget_ms, mode, llm):
+    before = kb_reranker.stats()
+    retrieval, e2e, raw_tokens, sent_tokens, hits = [], [], [], [], []
+    for item in queries:
+        started = time.perf_counter()
+        chunks = search_kb(item["query"], k, mode=mode, rerank=rerank, rerank_budget_ms=budget_ms)
+        retrieval.append((time.perf_counter() - started) * 1000)
+        # Context size before the prompt budget trims it, and what is actually sent
+        raw_tokens.append(build_kb_context(chunks, budget=10 ** 9).tokens)
+        prompt, context = prepare_kb_prompt(item["query"], chunks)
+        sent_tokens.append(context.prompt_tokens)
+        hits.append(any(c["file"] in item["files"] for c in context.chunks))
+        if llm:
+            ask_llama3(KB_SYSTEM_PROMPT, prompt)
+            e2e.append((time.perf_counter() - started) * 1000)
+    after = kb_reranker.stats()
+    row = {
+        "config": name, "k": k, "rerank": rerank, "queries": len(queries),
+        "hit_rate": float(np.mean(hits)),
+        "context_tokens_mean": float(np.mean(raw_tokens)),
+        "prompt_tokens_mean": float(np.mean(sent_tokens)),
+        "retrieval_p50_ms": float(np.percentile(retrieval, 50)),
+        "retrieval_p95_ms": float(np.percentile(retrieval, 95)),
+    }
+    if e2e:
+        row.update({"e2e_p50_ms": float(np.percentile(e2e, 50)), "e2e_p95_ms": float(np.percentile(e2e, 95))})
+    if rerank:
+        row["reranked"] = after["reranked"] - before["reranked"]
+        row["fallbacks"] = {reason: n - before["fallbacks"].get(reason, 0) for reason, n in after["fallbacks"].items()
+                            if n - before["fallbacks"].get(reason, 0)}
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Context size / latency benchmark for the KB rerank stage")
+    parser.add_argument("--queries", type=str, default=None, help="JSONL of labelled queries (default: generate from the KB)")
+    parser.add_argument("--generate", type=int, default=100, help="number of generated queries")
+    parser.add_argument("--baseline-k", type=int, default=10, help="chunks sent without reranking")
+    parser.add_argument("--rerank-k", type=int, default=3, help="chunks sent after reranking")
+    parser.add_argument("--budget-ms", type=float, default=kb_reranker.KB_RERANK_BUDGET_MS, help="rerank latency budget")
+    parser.add_argument("--mode", choices=SEARCH_MODES, default=None, help="first-stage search mode")
+    parser.add_argument("--llm", action="store_true", help="also call the LLM and report end-to-end latency")
+    parser.add_argument("--json", type=str, default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    snapshot = kb_store.snapshot()
+    queries = load_queries(args.queries) if args.queries else generated_queries(snapshot.meta, args.generate)
+    print(f"KB: {len(snapshot.meta)} chunks; queries: {len(queries)}; rerank candidates: {kb_reranker.KB_RERANK_CANDIDATES}")
+    # Load the cross-encoder up front so no query falls back while it loads
+    kb_reranker.warm_up()
+
+    results = []
+    for name, k, rerank in [("baseline", args.baseline_k, False), ("rerank", args.rerank_k, True)]:
+        row = run_config(name, queries, k, rerank, args.budget_ms, args.mode, args.llm)
+        results.append(row)
+        e2e = f" e2e p50={row['e2e_p50_ms']:.0f}ms p95={row['e2e_p95_ms']:.0f}ms" if "e2e_p50_ms" in row else ""
+        extra = f" reranked={row['reranked']} fallbacks={row['fallbacks']}" if rerank else ""
+        print(f"{name:<8} k={k:<3} hit={row['hit_rate']:.3f} context={row['context_tokens_mean']:.0f} tok "
+              f"prompt={row['prompt_tokens_mean']:.0f} tok retrieval p50={row['retrieval_p50_ms']:.1f}ms "
+              f"p95={row['retrieval_p95_ms']:.1f}ms{e2e}{extra}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import json
+import random
+import re
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+import numpy as np
+
+# Add the root directory to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+
+from app.services.kb_retriever import SEARCH_MODES, search_kb
+from app.services.kb_store import kb_store
+from app.services.kb_bm25 import tokenize
+from app.services.embeddings import query_cache
+
+# Recall/latency of the KB search modes (dense, bm25, hybrid RRF) on labelled
+# queries. Relevance is judged per file, so it survives re-chunking.
+#
+#   python app/scripts/eval_kb_retrieval.py                      # queries generated from the KB
+#   python app/scripts/eval_kb_retrieval.py --queries q.jsonl    # {"query": ..., "files": [...], "kind": ...}
+#   python app/scripts/eval_kb_retrieval.py --json eval.json
+#
+# Generated queries come in two kinds: "identifier" (a rare token such as a
+# service name, ticket key or CLI flag) and "sentence" (the first words of a
+# sentence from the chunk). Both favour lexical matching; hand-labelled
+# paraphrased questions are the better judge of dense quality, generated ones
+# are for comparing modes and catching regressions.
+
+K_SWEEP = [1, 3, 5, 10]
+SENTENCE_WORDS = 12
+IDENTIFIER_RE = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)+|[a-z]+\d+[a-z0-9]*|\d{3,}")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def generated_queries(meta, n, seed=0):
+    rng = random.Random(seed)
+    meta = [m for m in meta if m["text"] is not None]  # skip chunks of sources edited since indexing
+    files_with = defaultdict(set)
+    for m in meta:
+        for token in set(tokenize(m["text"])):
+            files_with[token].add(m["file"])
+
+    identifiers, sentences = [], []
+    for m in meta:
+        for token in sorted(set(tokenize(m["text"]))):
+            if IDENTIFIER_RE.fullmatch(token) and len(files_with[token]) <= 2:
+                identifiers.append({"query": token, "files": sorted(files_with[token]), "kind": "identifier"})
+        for sentence in SENTENCE_RE.split(m["text"]):
+            words = sentence.split()
+            if len(words) >= 8:
+                sentences.append({"query": " ".join(words[:SENTENCE_WORDS]), "files": [m["file"]], "kind": "sentence"})
+    rng.shuffle(identifiers)
+    rng.shuffle(sentences)
+    half = n // 2
+    return identifiers[:half] + sentences[:n - min(half, len(identifiers))]
+
+
+def load_queries(path):
+    queries = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if line.strip():
+            item = json.loads(line)
+            files = item.get("files") or [item["file"]]
+            queries.append({"query": item["query"], "files": files, "kind": item.get("kind", "labelled")})
+    return queries
+
+
+def evaluate(queries, mode, max_k):
+    """Per-query latency and rank of the first relevant file (None if not in the top `max_k`)."""
+    # Start every mode with a cold query-embedding cache so dense and hybrid pay the same encode cost
+    query_cache.clear()
+    ranks, latencies = [], []
+    for item in queries:
+        started = time.perf_counter()
+        results = search_kb(item["query"], max_k, mode=mode)
+        latencies.append((time.perf_counter() - started) * 1000)
+        relevant = set(item["files"])
+        ranks.append(next((i for i, r in enumerate(results, start=1) if r["file"] in relevant), None))
+    return ranks, latencies
+
+
+def summarize(queries, ranks, latencies, k_sweep):
+    row = {}
+    for k in k_sweep:
+        row[f"recall@{k}"] = float(np.mean([r is not None and r <= k for r in ranks])) if ranks else 0.0
+    row["mrr"] = float(np.mean([1.0 / r if r else 0.0 for r in ranks])) if ranks else 0.0
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    row.update({"p50_ms": float(np.percentile(lat, 50)), "p95_ms": float(np.percentile(lat, 95)),
+                "queries": len(queries)})
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency evaluation of the KB search modes")
+    parser.add_argument("--queries", type=str, default=None, help="JSONL of labelled queries (default: generate from the KB)")
+    parser.add_argument("--generate", type=int, default=200, help="number of generated queries")
+    parser.add_argument("--modes", nargs="+", choices=SEARCH_MODES, default=list(SEARCH_MODES))
+    parser.add_argument("--k", nargs="+", type=int, default=K_SWEEP, help="cutoffs to report recall at")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, default=None, help="write results to this file")
+    args = parser.parse_args()
+
+    snapshot = kb_store.snapshot()
+    queries = load_queries(args.queries) if args.queries else generated_queries(snapshot.meta, args.generate, args.seed)
+    if not queries:
+        print("No queries to evaluate.")
+        return
+    kinds = sorted({q["kind"] for q in queries})
+    counts = ", ".join(f"{kind}={sum(q['kind'] == kind for q in queries)}" for kind in kinds)
+    print(f"KB: {len(snapshot.meta)} chunks, {snapshot.bm25.terms} BM25 terms; queries: {len(queries)} ({counts})")
+
+    results = []
+    for mode in args.modes:
+        try:
+            ranks, latencies = evaluate(queries, mode, max(args.k))
+        except Exception as e:
+            print(f"{mode:<7} skipped: {e}")
+            continue
+        for kind in kinds + ["all"]:
+            picks = [i for i, q in enumerate(queries) if kind == "all" or q["kind"] == kind]
+            row = {"mode": mode, "kind": kind,
+                   **summarize(picks, [ranks[i] for i in picks], [latencies[i] for i in picks], args.k)}
+            results.append(row)
+            recall = " ".join(f"R@{k}={row[f'recall@{k}']:.3f}" for k in args.k)
+            print(f"{mode:<7} {kind:<11} {recall} MRR={row['mrr']:.3f} "
+                  f"p50={row['p50_ms']:.2f}ms p95={row['p95_ms']:.2f}ms n={row['queries']}")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
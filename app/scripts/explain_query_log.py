@@ -0,0 +1,124 @@
+import argparse
+import json
+import re
+import sqlite3
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+# Add the root directory to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+
+from create_db import DB_PATH
+from app.services.sql_guard import SQL_QUERY_LOG
+
+# Replay the generated-SQL log through EXPLAIN QUERY PLAN and flag full table
+# scans and temp B-tree sorts, most frequent queries first, so missing
+# indexes show up as the tables grow. The log is off by default; start the
+# API with SQL_QUERY_LOG=data/sql_query_log.jsonl to collect it.
+#
+#   python app/scripts/explain_query_log.py
+#   python app/scripts/explain_query_log.py --min-rows 10000 --top 20
+
+FULL_SCAN_RE = re.compile(r"^SCAN (\w+)(?! USING (?:COVERING )?INDEX)(?! USING INTEGER PRIMARY KEY)")
+TEMP_BTREE_RE = re.compile(r"USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)")
+TABLE_REF_RE = re.compile(r"\b(?:FROM|JOIN)\s+(\w+)(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|LEFT|INNER|CROSS|GROUP|ORDER|LIMIT)\b)(\w+))?", re.I)
+
+
+def shape(sql: str) -> str:
+    """Group queries that differ only in literals."""
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+\b", "?", sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def load_log(path: Path):
+    groups = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "errors": 0, "sql": None, "params": None})
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            g = groups[shape(entry["sql"])]
+            g["count"] += 1
+            g["total_ms"] += entry.get("elapsed_ms") or 0.0
+            g["errors"] += entry.get("error") is not None
+            if g["sql"] is None:
+                g["sql"], g["params"] = entry["sql"], entry.get("params") or {}
+    return groups
+
+
+def aliases(sql: str):
+    """Plans name tables by their alias (SCAN j); map those back to table names."""
+    mapping = {}
+    for table, alias in TABLE_REF_RE.findall(sql):
+        mapping[table] = table
+        if alias:
+            mapping[alias] = table
+    return mapping
+
+
+def table_rows(conn: sqlite3.Connection):
+    tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    return {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tables}
+
+
+def explain(conn: sqlite3.Connection, sql: str, params):
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flag full scans in logged generated SQL")
+    parser.add_argument("--log", type=Path, default=Path(SQL_QUERY_LOG) if SQL_QUERY_LOG else None)
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--min-rows", type=int, default=0, help="ignore scans of tables smaller than this")
+    parser.add_argument("--top", type=int, default=50, help="report at most this many query shapes")
+    args = parser.parse_args()
+
+    if args.log is None or not args.log.exists():
+        print(f"No query log at {args.log}; start the API with SQL_QUERY_LOG=data/sql_query_log.jsonl "
+              f"and run some /route/ask queries first")
+        return
+
+    conn = sqlite3.connect(f"file:{args.db}?mode=ro", uri=True)
+    rows = table_rows(conn)
+    groups = sorted(load_log(args.log).values(), key=lambda g: -g["count"])[:args.top]
+    print(f"{len(groups)} query shapes from {args.log} against {args.db}\n")
+
+    flagged = 0
+    scans_by_table = defaultdict(int)
+    for g in groups:
+        try:
+            plan = explain(conn, g["sql"], g["params"])
+        except sqlite3.Error as e:
+            print(f"[skip] {e}: {shape(g['sql'])}\n")
+            continue
+        problems = []
+        names = aliases(g["sql"])
+        for step in plan:
+            scan = FULL_SCAN_RE.match(step)
+            table = names.get(scan.group(1), scan.group(1)) if scan else None
+            if scan and rows.get(table, 0) >= args.min_rows:
+                problems.append(f"full scan of {table} ({rows.get(table, 0)} rows)")
+                scans_by_table[table] += g["count"]
+            sort = TEMP_BTREE_RE.search(step)
+            if sort:
+                problems.append(f"temp B-tree for {sort.group(1)}")
+        if not problems:
+            continue
+        flagged += 1
+        print(f"x{g['count']:<5} avg {g['total_ms'] / g['count']:.2f} ms  {shape(g['sql'])}")
+        for p in problems:
+            print(f"       ! {p}")
+        for step in plan:
+            print(f"         {step}")
+        print()
+
+    print(f"{flagged} of {len(groups)} query shapes need attention")
+    for table, count in sorted(scans_by_table.items(), key=lambda kv: -kv[1]):
+        print(f"  {table}: {count} logged executions did a full scan")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Add the root directory to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+
+from sqlalchemy import create_engine
+from models import Base
+from create_db import DB_PATH
+from app.scripts.load_data_to_sqllite import DATA_DIR, connect, load_table
+
+# Scale the employees / jira_tickets / deployments tables for load tests.
+# Writes <table>.ndjson files in the bulk loader's input format; with --load
+# they are merged into --db through the loader (validated, shadow-table swap).
+# Point --db at a copy and start the API with DB_PATH set to it:
+#
+#   cp data/data_store.db data/loadtest.db
+#   python app/scripts/gen_synthetic_data.py --employees 5000 --tickets 500000 --deployments 100000 \
+#       --load --db data/loadtest.db
+#   DB_PATH=data/loadtest.db uvicorn main:app
+#
+# Synthetic ids (employees from 100000, tickets SYN-*) don't collide with the
+# real rows, so re-running replaces them; deployments have no key and append
+# (only exact service/version/date repeats are skipped).
+
+TEAMS = ["Backend", "Frontend", "DevOps", "Management", "Payments", "Platform", "Data", "Mobile"]
+ROLES = ["Engineer", "Senior Engineer", "Lead", "Manager", "QA Engineer", "SRE", "Designer"]
+FIRST = ["ahmed", "fatima", "sarah", "adam", "lina", "omar", "rami", "huda", "yousef", "maya", "karim", "noor"]
+LAST = ["ali", "khalil", "odeh", "saleh", "haddad", "nasser", "farah", "qasem", "mansour", "aziz"]
+TICKET_STATUSES = ["Open", "In Progress", "Closed"]
+PRIORITIES = ["Low", "Medium", "High", "Critical"]
+SERVICES = ["payments", "onboarding", "frontend", "backend", "scheduler", "payroll", "notifications", "search",
+            "auth", "reports", "timeclock", "billing"]
+VERBS = ["Fix", "Refactor", "Add", "Remove", "Update", "Investigate", "Document", "Migrate"]
+SUBJECTS = ["login flow", "deployment pipeline", "shift swap API", "payroll export", "search ranking",
+            "notification retries", "onboarding checklist", "timeclock sync", "billing webhooks", "report caching"]
+EMPLOYEE_ID_START = 100000
+
+
+def employees(n: int, rng: random.Random):
+    for i in range(n):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        team = rng.choice(TEAMS)
+        yield {
+            "id": EMPLOYEE_ID_START + i,
+            "name": f"{first.title()} {last.title()}",
+            "role": f"{team} {rng.choice(ROLES)}",
+            "email": f"{first}.{last}.{i}@harri.com",
+            "team": team,
+            "jira_username": f"{first}_{last[0]}{i}",
+        }
+
+
+def tickets(n: int, usernames, rng: random.Random):
+    busy = usernames[:max(1, len(usernames) // 20)]
+    for i in range(n):
+        yield {
+            "id": f"SYN-{i + 1}",
+            "summary": f"{rng.choice(VERBS)} {rng.choice(SUBJECTS)} in {rng.choice(SERVICES)}",
+            # Skewed like real backlogs: most tickets are closed, 5% of people hold 30% of them
+            "status": rng.choices(TICKET_STATUSES, weights=[3, 2, 5])[0],
+            "assignee": rng.choice(busy) if rng.random() < 0.3 else rng.choice(usernames),
+            "priority": rng.choices(PRIORITIES, weights=[4, 4, 2, 1])[0],
+        }
+
+
+def deployments(n: int, rng: random.Random):
+    now = datetime.now(timezone.utc)
+    versions = {service: [1, 0, 0] for service in SERVICES}
+    for _ in range(n):
+        service = rng.choice(SERVICES)
+        version = versions[service]
+        version[2] += 1
+        if rng.random() < 0.1:
+            version[1], version[2] = version[1] + 1, 0
+        yield {
+            "service": service,
+            "version": "v{}.{}.{}".format(*version),
+            "date": (now - timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "status": "Failed" if rng.random() < 0.08 else "Success",
+        }
+
+
+def write_ndjson(path: Path, records) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic table data for load tests")
+    parser.add_argument("--employees", type=int, default=1000)
+    parser.add_argument("--tickets", type=int, default=100000)
+    parser.add_argument("--deployments", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-dir", type=Path, default=DATA_DIR / "synthetic", help="where the .ndjson files go")
+    parser.add_argument("--load", action="store_true", help="merge the generated rows into --db")
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    people = list(employees(args.employees, rng))
+    usernames = [p["jira_username"] for p in people] or ["ahmed_ali"]
+    started = time.perf_counter()
+    counts = {
+        "employees": write_ndjson(args.out_dir / "employees.ndjson", people),
+        "jira_tickets": write_ndjson(args.out_dir / "jira_tickets.ndjson", tickets(args.tickets, usernames, rng)),
+        "deployments": write_ndjson(args.out_dir / "deployments.ndjson", deployments(args.deployments, rng)),
+    }
+    print(f"Generated {counts} in {time.perf_counter() - started:.1f}s -> {args.out_dir}")
+
+    if not args.load:
+        print(f"Load with: python app/scripts/load_data_to_sqllite.py --merge --data-dir {args.out_dir} --db {args.db}")
+        return
+    print(f"Merging into {args.db}")
+    Base.metadata.create_all(create_engine(f"sqlite:///{args.db}"))  # no-op for tables that exist
+    conn = connect(args.db)
+    try:
+        for table in counts:
+            result = load_table(conn, table, args.out_dir / f"{table}.ndjson", merge=True)
+            print(f"  {table}: {result['rows']} rows ({result['rejected']} rejected, "
+                  f"{result['duplicates']} duplicates) in {result['seconds']:.1f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+# Add the root directory to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+
+from app.services.kb_store import KB_DIR
+
+# Scale the knowledge base for load tests: writes N service runbooks as
+# kb/synthetic_NNNNN.md next to the real docs (same markdown shapes: nested
+# headings, lists, fenced commands, tables), plus labelled queries for
+# eval_kb_retrieval.py / load_test.py. Rebuild the index afterwards.
+#
+#   python app/scripts/gen_synthetic_kb.py --docs 5000 --queries data/synthetic_kb_queries.jsonl
+#   python app/services/kb_indexer.py
+#   python app/scripts/gen_synthetic_kb.py --clean        # remove them again
+
+PREFIX = "synthetic_"
+TEAMS = ["Backend", "Frontend", "DevOps", "Payments", "Platform", "Data", "Mobile", "Security"]
+DOMAINS = ["ledger", "payroll", "shift", "onboarding", "scheduler", "billing", "notify", "search", "timeclock",
+           "reports", "auth", "inventory", "hiring", "messaging", "forecast", "gateway"]
+ROLES = ["sync", "worker", "api", "ingest", "exporter", "cache", "router", "indexer", "auditor", "bridge"]
+ENVS = ["staging", "production", "sandbox"]
+SEVERITIES = ["P1", "P2", "P3", "P4"]
+DATASTORES = ["PostgreSQL", "Redis", "SQLite", "Elasticsearch", "S3", "Kafka"]
+FILLER = [
+    "Changes must go through code review and pass CI before they are merged to main.",
+    "Secrets are read from the vault at startup; never commit them to the repository.",
+    "Dashboards for latency, error rate and saturation live in the team's monitoring folder.",
+    "Capacity is reviewed every quarter against the traffic forecast from the data team.",
+    "Deploys outside business hours need approval from the on-call lead.",
+    "Rollbacks are preferred over hotfixes while an incident is still open.",
+    "Feature flags gate every user-facing change until it has run a full day in staging.",
+    "Logs are retained for thirty days and sampled at ten percent above the INFO level.",
+    "Schema migrations run before the new version is rolled out and must be backwards compatible.",
+    "The service exposes liveness and readiness probes that the orchestrator polls every ten seconds.",
+    "Ownership changes are announced in #engineering-announcements and recorded in the service catalog.",
+    "Load tests run weekly against staging with production-shaped traffic.",
+]
+
+
+def service_name(i: int, rng: random.Random) -> str:
+    return f"{rng.choice(DOMAINS)}-{rng.choice(ROLES)}-{i:05d}"
+
+
+def paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(rng.sample(FILLER, min(sentences, len(FILLER))))
+
+
+def make_doc(i: int, rng: random.Random, paragraphs: int):
+    """(file name, markdown, labelled queries) for one synthetic service runbook."""
+    service = service_name(i, rng)
+    team, store = rng.choice(TEAMS), rng.choice(DATASTORES)
+    port = 8000 + i % 1000
+    flag = f"--{rng.choice(ROLES)}-batch-size"
+    alerts = [(f"ALRT-{i:05d}{n}", rng.choice(SEVERITIES)) for n in range(rng.randint(2, 4))]
+    owner = f"{rng.choice(['ahmed', 'fatima', 'sarah', 'adam', 'lina', 'omar', 'rami', 'huda'])}_{i % 97}"
+
+    lines = [
+        f"# {service} Runbook",
+        "",
+        f"{service} is owned by the {team} team and stores its state in {store}. "
+        f"The primary on-call engineer is {owner}.",
+        "",
+        "## Overview",
+        "",
+    ]
+    for _ in range(paragraphs):
+        lines += [paragraph(rng, rng.randint(3, 6)), ""]
+    lines += [
+        "## Deployment",
+        "",
+        "### Staging",
+        "",
+        f"1. Build the image and deploy with `./scripts/deploy.sh {service} staging`.",
+        "2. Run the smoke tests and check the dashboard for new errors.",
+        f"3. If the error rate rises above {rng.choice([1, 2, 5])}%, roll back.",
+        "",
+        "### Production",
+        "",
+        "Only team leads may promote a release to production:",
+        "",
+        "```bash",
+        f"./scripts/deploy.sh {service} production --port {port} {flag} {rng.choice([64, 128, 256])}",
+        "```",
+        "",
+        "## Rollback",
+        "",
+        f"Roll {service} back to the previous version with:",
+        "",
+        "```bash",
+        f"./scripts/rollback.sh {service} production",
+        "```",
+        "",
+        paragraph(rng, 2),
+        "",
+        "## Alerts",
+        "",
+        "| Alert | Severity | Action |",
+        "| --- | --- | --- |",
+    ]
+    for code, severity in alerts:
+        lines.append(f"| {code} | {severity} | Page the {team} on-call and follow the rollback steps |")
+    lines += ["", "## FAQ", ""]
+    for env in rng.sample(ENVS, 2):
+        lines += [f"- **How do I get access to {service} in {env}?** Ask in #{team.lower()}-support; "
+                  f"access is granted per environment.", ""]
+
+    file = f"{PREFIX}{i:05d}.md"
+    queries = [
+        {"query": f"How do I roll back {service}?", "files": [file], "kind": "synthetic"},
+        {"query": f"Which team owns {service}?", "files": [file], "kind": "synthetic"},
+        {"query": f"What should I do when {alerts[0][0]} fires?", "files": [file], "kind": "synthetic"},
+    ]
+    return file, "\n".join(lines) + "\n", queries
+
+
+def clean(kb_dir: Path) -> int:
+    removed = 0
+    for path in kb_dir.glob(f"{PREFIX}*.md"):
+        path.unlink()
+        removed += 1
+    return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic KB documents for load tests")
+    parser.add_argument("--docs", type=int, default=1000, help="number of documents to write")
+    parser.add_argument("--paragraphs", type=int, default=3, help="overview paragraphs per document (document size)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--kb-dir", type=Path, default=KB_DIR)
+    parser.add_argument("--queries", type=str, default=None, help="write labelled queries (JSONL) to this file")
+    parser.add_argument("--clean", action="store_true", help="remove previously generated documents and exit")
+    args = parser.parse_args()
+
+    removed = clean(args.kb_dir)
+    if args.clean:
+        print(f"Removed {removed} synthetic documents from {args.kb_dir}")
+        return
+
+    rng = random.Random(args.seed)
+    queries, total_bytes = [], 0
+    for i in range(args.docs):
+        file, text, doc_queries = make_doc(i, rng, args.paragraphs)
+        (args.kb_dir / file).write_text(text, encoding="utf-8")
+        total_bytes += len(text.encode("utf-8"))
+        queries.extend(doc_queries)
+    print(f"Wrote {args.docs} documents ({total_bytes / 1e6:.1f} MB) to {args.kb_dir}"
+          f"{f' (replaced {removed})' if removed else ''}")
+
+    if args.queries:
+        with open(args.queries, "w", encoding="utf-8") as f:
+            for item in queries:
+                f.write(json.dumps(item) + "\n")
+        print(f"Wrote {len(queries)} labelled queries to {args.queries}")
+    print("Rebuild the index to serve them: python app/services/kb_indexer.py")
+
+
+if __name__ == "__main__":
+    main()
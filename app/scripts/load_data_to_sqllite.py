@@ -1,168 +1,287 @@
+import argparse
 import json
-import os
+import sqlite3
 import sys
+import time
 from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 # INSERT JSON FILE TO SQLLITE
 # Add the root directory to the Python path so we can import from the root level
 root_dir = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(root_dir))
 
+from pydantic import BaseModel, TypeAdapter, ValidationError
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.schema import CreateIndex, CreateTable, MetaData
 
 # Use absolute import instead of relative import
-from models import Employee, JiraTicket, Deployment
+from models import Base
+from create_db import DB_PATH
+from app.models import data_models
+
+# Bulk loader: streams JSON arrays or NDJSON, validates in batches with the
+# pydantic models, and loads each table into a shadow copy that is swapped in
+# atomically, so the API keeps reading the old rows until the new ones are ready.
+#
+#   python app/scripts/load_data_to_sqllite.py                       # all tables from data/
+#   python app/scripts/load_data_to_sqllite.py --table jira_tickets --file tickets.ndjson
+#   python app/scripts/load_data_to_sqllite.py --merge               # upsert into the existing rows
+#
+# Deployments have no natural key; --merge skips incoming deployments that
+# repeat the (service, version, date) of a row already in the table.
 
 # Use the actual data directory path
 DATA_DIR = root_dir / "data"
-DB_PATH = f"sqlite:///{DATA_DIR}/data_store.db"
 
-# Print paths for debugging
-print(f"Root directory: {root_dir}")
-print(f"Data directory: {DATA_DIR}")
-print(f"Database path: {DB_PATH}")
+# table -> pydantic model and upsert key (None = plain INSERT, rows have no natural key)
+TABLES = {
+    "employees": (data_models.Employee, ("id",)),
+    "jira_tickets": (data_models.Jira_tickets, ("id",)),
+    "deployments": (data_models.Deployment, None),
+}
+# Keyless tables: columns that identify a duplicate row when merging
+MERGE_DEDUPE = {
+    "deployments": ("service", "version", "date"),
+}
+BATCH_SIZE = 10000
+COMMIT_EVERY = 200000  # rows per transaction while filling the shadow table
+
+
+def iter_json_array(f, chunk_size: int = 1 << 20) -> Iterator[Dict[str, Any]]:
+    """Yield the objects of a top-level JSON array without reading the whole file."""
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size).lstrip()
+    if not buf.startswith("["):
+        raise ValueError("expected a JSON array")
+    buf, pos, eof = buf[1:], 0, False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield obj
+        pos = end
+
 
-engine = create_engine(DB_PATH)
-# Import the Base and all models
-from models import Base, Employee, JiraTicket, Deployment
+def iter_records(path: Path) -> Iterator[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix in (".ndjson", ".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(f)
 
-# Drop all tables and recreate them
-print("Dropping all existing tables...")
-Base.metadata.drop_all(engine)
-print("Creating new tables...")
-Base.metadata.create_all(engine)
 
-Session = sessionmaker(bind=engine)
-session = Session()
+def find_input(table: str, data_dir: Path) -> Optional[Path]:
+    for suffix in (".ndjson", ".jsonl", ".json"):
+        path = data_dir / f"{table}{suffix}"
+        if path.exists():
+            return path
+    return None
 
-def load_json(filename):
-    file_path = DATA_DIR / filename
-    print(f"Loading data from: {file_path}")
+
+def batched(records: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def validate_batch(adapter: TypeAdapter, model, batch: List[Dict[str, Any]]) -> Tuple[List[BaseModel], List[int]]:
+    """Validate a whole batch at once; only on failure fall back to per-record to find the bad rows."""
     try:
-        with open(file_path, "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: File not found: {file_path}")
-        sys.exit(1)
-    except json.JSONDecodeError:
-        print(f"Error: Invalid JSON in file: {file_path}")
-        sys.exit(1)
-
-def load_employees():
-    print("Loading employees...")
-    employees = load_json("employees.json")
-    count = 0
-    
-    # Create a fresh session for this operation
-    emp_session = Session()
-    
-    for emp in employees:
-        try:
-            # Check if employee already exists
-            existing = emp_session.query(Employee).filter_by(id=emp["id"]).first()
-            if existing:
-                print(f"Employee with ID {emp['id']} already exists, updating...")
-                for key, value in emp.items():
-                    setattr(existing, key, value)
-            else:
-                print(f"Adding employee: {emp['name']}")
-                emp_session.add(Employee(**emp))
-                count += 1
-                
-            # Commit after each employee to avoid transaction issues
-            emp_session.commit()
-        except Exception as e:
-            print(f"Error adding employee {emp.get('id', 'unknown')}: {str(e)}")
-            emp_session.rollback()  # Roll back on error
-    
-    emp_session.close()
-    print(f"Added {count} new employees")
-
-def load_jira_tickets():
-    print("Loading JIRA tickets...")
-    tickets = load_json("jira_tickets.json")
-    count = 0
-    
-    # Create a fresh session for this operation
-    ticket_session = Session()
-    
-    for ticket in tickets:
-        try:
-            # Check if ticket already exists
-            existing = ticket_session.query(JiraTicket).filter_by(id=ticket["id"]).first()
-            if existing:
-                print(f"Ticket with ID {ticket['id']} already exists, updating...")
-                for key, value in ticket.items():
-                    setattr(existing, key, value)
-            else:
-                print(f"Adding ticket: {ticket['id']}")
-                ticket_session.add(JiraTicket(**ticket))
-                count += 1
-                
-            # Commit after each ticket to avoid transaction issues
-            ticket_session.commit()
-        except Exception as e:
-            print(f"Error adding ticket {ticket.get('id', 'unknown')}: {str(e)}")
-            ticket_session.rollback()  # Roll back on error
-    
-    ticket_session.close()
-    print(f"Added {count} new JIRA tickets")
-
-def load_deployments():
-    print("Loading deployments...")
-    deployments = load_json("deployments.json")
-    count = 0
-    
-    # Create a fresh session for this operation
-    dep_session = Session()
-    
-    for dep in deployments:
-        try:
-            # Ensure ISO format date string
-            if isinstance(dep["date"], str):
-                try:
-                    datetime.fromisoformat(dep["date"].replace('Z', '+00:00'))
-                except ValueError:
-                    print(f"Warning: Invalid ISO date: {dep['date']}, attempting to fix...")
-                    # Try to parse with datetime
-                    try:
-                        dt = datetime.strptime(dep["date"], "%Y-%m-%dT%H:%M:%SZ")
-                        dep["date"] = dt.isoformat()
-                    except ValueError:
-                        print(f"Error: Could not parse date: {dep['date']}")
-                        continue
-            
-            print(f"Adding deployment: {dep['service']} {dep['version']}")
-            # Create new deployment record
-            dep_session.add(Deployment(**dep))
-            count += 1
-            
-            # Commit after each deployment to avoid transaction issues
-            dep_session.commit()
-        except Exception as e:
-            print(f"Error adding deployment for {dep.get('service', 'unknown')}: {str(e)}")
-            dep_session.rollback()  # Roll back on error
-    
-    dep_session.close()
-    print(f"Added {count} new deployments")
+        return adapter.validate_python(batch), []
+    except ValidationError:
+        valid, bad = [], []
+        for i, record in enumerate(batch):
+            try:
+                valid.append(model.model_validate(record))
+            except ValidationError:
+                bad.append(i)
+        return valid, bad
 
-if __name__ == "__main__":
+
+def to_row(table: str, item: BaseModel, raw: Dict[str, Any], columns: List[str]) -> Tuple:
+    values = item.model_dump()
+    if table == "deployments" and isinstance(raw.get("date"), str):
+        values["date"] = raw["date"]  # keep the ISO string as written, like the API has always stored it
+    return tuple(values.get(c) for c in columns)
+
+
+def shadow_ddl(table: str, shadow: str) -> str:
+    """CREATE TABLE for an index-free copy of `table` named `shadow`, from the SQLAlchemy model."""
+    copy = Base.metadata.tables[table].to_metadata(MetaData(), name=shadow)
+    for index in list(copy.indexes):
+        copy.indexes.discard(index)
+    return str(CreateTable(copy).compile(dialect=sqlite_dialect.dialect()))
+
+
+def index_ddl(conn: sqlite3.Connection, table: str) -> List[str]:
+    """Indexes to rebuild after the swap: the live table's plus any declared on the model."""
+    statements = [sql for (sql,) in conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table,))]
+    for index in Base.metadata.tables[table].indexes:
+        ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=sqlite_dialect.dialect()))
+        statements.append(ddl)
+    return statements
+
+
+def upsert_sql(table: str, columns: List[str], key: Optional[Tuple[str, ...]],
+               dedupe: Optional[Tuple[str, ...]] = None) -> str:
+    """
+    INSERT, or upsert on `key`. With `dedupe`, a row that matches an existing
+    row on those columns is skipped; its parameters are followed by its `dedupe` values.
+    """
+    placeholders = ", ".join("?" for _ in columns)
+    if dedupe:
+        match = " AND ".join(f"{c} IS ?" for c in dedupe)
+        return (f"INSERT INTO {table} ({', '.join(columns)}) SELECT {placeholders} "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE {match})")
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    if key:
+        updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c not in key)
+        sql += f" ON CONFLICT({', '.join(key)}) DO UPDATE SET {updates}"
+    return sql
+
+
+def load_table(conn: sqlite3.Connection, table: str, path: Path, merge: bool = False,
+               batch_size: int = BATCH_SIZE) -> Dict[str, Any]:
+    model, key = TABLES[table]
+    adapter = TypeAdapter(List[model])
+    shadow = f"{table}__shadow"
+    live_columns = [c.name for c in Base.metadata.tables[table].columns]
+    columns = [c for c in live_columns if c in model.model_fields]
+
+    started = time.perf_counter()
+    conn.execute(f"DROP TABLE IF EXISTS {shadow}")
+    conn.execute(shadow_ddl(table, shadow))
+    dedupe = MERGE_DEDUPE.get(table) if merge and not key else None
+    if merge:
+        conn.execute(f"INSERT INTO {shadow} SELECT {', '.join(live_columns)} FROM {table}")
+    if dedupe:
+        # Lookup index for the duplicate check; dropped again before the swap
+        conn.execute(f"CREATE INDEX {shadow}__dedupe ON {shadow} ({', '.join(dedupe)})")
+    conn.commit()
+
+    insert = upsert_sql(shadow, columns, key, dedupe)
+    positions = [columns.index(c) for c in dedupe] if dedupe else []
+    loaded = rejected = pending = duplicates = 0
+    for batch in batched(iter_records(path), batch_size):
+        items, bad = validate_batch(adapter, model, batch)
+        if bad:
+            bad_set = set(bad)
+            good_raw = [r for i, r in enumerate(batch) if i not in bad_set]
+        else:
+            good_raw = batch
+        rows = (to_row(table, item, raw, columns) for item, raw in zip(items, good_raw))
+        if dedupe:
+            rows = (row + tuple(row[i] for i in positions) for row in rows)
+        before = conn.total_changes
+        conn.executemany(insert, rows)
+        skipped = len(items) - (conn.total_changes - before)
+        duplicates += skipped
+        loaded += len(items) - skipped
+        rejected += len(bad)
+        pending += len(items)
+        if pending >= COMMIT_EVERY:
+            conn.commit()
+            pending = 0
+            print(f"  {table}: {loaded} rows...")
+    if dedupe:
+        conn.execute(f"DROP INDEX {shadow}__dedupe")
+    conn.commit()
+
+    # Swap: readers see the old table until this transaction commits
+    swap_started = time.perf_counter()
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        print("Starting data loading process...")
-        
-        # Use separate sessions for each data type to avoid transaction conflicts
-        load_employees()
-        print("Employees loaded successfully!")
-        
-        load_jira_tickets()
-        print("JIRA tickets loaded successfully!")
-        
-        load_deployments()
-        print("Deployments loaded successfully!")
-        
-        print("All data loaded successfully!")
-    except Exception as e:
-        print(f"Error during data loading: {str(e)}")
+        indexes = index_ddl(conn, table)
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"ALTER TABLE {shadow} RENAME TO {table}")
+        for ddl in indexes:
+            conn.execute(ddl)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    conn.execute(f"ANALYZE {table}")  # the old table's planner stats went with it
+    conn.commit()
+    elapsed = time.perf_counter() - started
+    return {
+        "table": table,
+        "rows": loaded,
+        "rejected": rejected,
+        "duplicates": duplicates,
+        "seconds": elapsed,
+        "swap_seconds": time.perf_counter() - swap_started,
+        "rows_per_sec": loaded / elapsed if elapsed else 0.0,
+    }
+
+
+def connect(path: Path = DB_PATH) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 30000")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -262144")  # 256 MB for index builds
+    return conn
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-load JSON/NDJSON into SQLite via shadow tables")
+    parser.add_argument("--table", choices=list(TABLES), action="append", help="table(s) to load (default: all)")
+    parser.add_argument("--file", type=Path, help="input file (with a single --table)")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    parser.add_argument("--merge", action="store_true", help="upsert into a copy of the existing rows instead of replacing them")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    tables = args.table or list(TABLES)
+    if args.file and len(tables) != 1:
+        parser.error("--file needs exactly one --table")
+
+    print(f"Database path: {args.db}")
+    Base.metadata.create_all(create_engine(f"sqlite:///{args.db}"))  # no-op for tables that exist
+    conn = connect(args.db)
+    results = []
+    try:
+        for table in tables:
+            path = args.file or find_input(table, args.data_dir)
+            if path is None:
+                print(f"Skipping {table}: no {table}.json/.ndjson/.jsonl in {args.data_dir}")
+                continue
+            print(f"Loading {table} from {path}{' (merge)' if args.merge else ''}...")
+            results.append(load_table(conn, table, path, merge=args.merge, batch_size=args.batch_size))
     finally:
-        print("Database operations completed.")
+        conn.close()
+
+    total_rows = sum(r["rows"] for r in results)
+    total_secs = sum(r["seconds"] for r in results)
+    print(f"\n{'table':<14} {'rows':>10} {'rejected':>9} {'dupes':>7} {'seconds':>8} {'swap s':>7} {'rows/sec':>10}")
+    for r in results:
+        print(f"{r['table']:<14} {r['rows']:>10} {r['rejected']:>9} {r['duplicates']:>7} {r['seconds']:>8.2f} "
+              f"{r['swap_seconds']:>7.2f} {r['rows_per_sec']:>10.0f}")
+    if total_secs:
+        print(f"{'total':<14} {total_rows:>10} {'':>9} {'':>7} {total_secs:>8.2f} {'':>7} "
+              f"{total_rows / total_secs:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
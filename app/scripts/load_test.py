@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+import numpy as np
+
+# Add the root directory to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+
+# Closed-loop load driver: `--concurrency` workers replay a weighted query mix
+# against a running API, each sending its next request as soon as the last one
+# returns. Reports RPS and p50/p95/p99 per endpoint plus per-stage breakdowns
+# (the `timings` block of /kb/ask and /route/ask, the Server-Timing header
+# elsewhere), and saves JSON so runs can be compared between commits.
+#
+#   python app/scripts/mock_llm_server.py --port 8081 --latency-ms 300 &
+#   LLM_BASE_URL=http://127.0.0.1:8081/v1 GROQ_API_KEY=mock uvicorn main:app --port 8000 &
+#   python app/scripts/load_test.py --concurrency 1,8,32 --duration 30 --json results/$(git rev-parse --short HEAD).json
+#   python app/scripts/load_test.py --concurrency 8 --compare results/baseline.json --max-regression 10
+#
+# Mix lines are {"endpoint", "q", "weight", "params"}. Lines without an
+# endpoint (e.g. gen_synthetic_kb.py's labelled queries, {"query": ...}) are
+# sent to every endpoint in --endpoints.
+
+DEFAULT_MIX = root_dir / "data" / "load_queries.jsonl"
+ENDPOINTS = ("/kb/search", "/kb/ask", "/route/ask")
+PERCENTILES = (50, 95, 99)
+
+
+def load_mix(path, endpoints):
+    mix = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        query = item.get("q") or item["query"]
+        targets = [item["endpoint"]] if item.get("endpoint") else endpoints
+        for endpoint in targets:
+            if endpoint in endpoints:
+                mix.append({"endpoint": endpoint, "params": {"q": query, **item.get("params", {})},
+                            "weight": float(item.get("weight", 1))})
+    if not mix:
+        raise SystemExit(f"No queries in {path} for endpoints {', '.join(endpoints)}")
+    return mix
+
+
+def parse_server_timing(header):
+    """{"stage": ms} from a Server-Timing header ("name;dur=12.3, ...")."""
+    stages = {}
+    for part in (header or "").split(","):
+        name, _, rest = part.strip().partition(";")
+        if rest.startswith("dur="):
+            try:
+                stages[name] = float(rest[len("dur="):])
+            except ValueError:
+                pass
+    return stages
+
+
+def response_details(response):
+    """Stage timings, route path and cache hit of one response, from its body when it has them."""
+    stages, path, cache_hit = parse_server_timing(response.headers.get("server-timing")), None, None
+    try:
+        body = response.json()
+    except ValueError:
+        return stages, path, cache_hit
+    if isinstance(body, dict):
+        if isinstance(body.get("timings"), dict) and body["timings"]:
+            stages = body["timings"]
+        path = body.get("path")
+        cache_hit = (body.get("cache") or {}).get("hit")
+    return stages, path, cache_hit
+
+
+async def worker(client, mix, weights, deadline, remaining, rng, samples):
+    while time.perf_counter() < deadline:
+        if remaining is not None:
+            if remaining[0] <= 0:
+                return
+            remaining[0] -= 1
+        item = rng.choices(mix, weights=weights)[0]
+        started = time.perf_counter()
+        sample = {"endpoint": item["endpoint"]}
+        try:
+            response = await client.get(item["endpoint"], params=item["params"])
+            sample["ms"] = (time.perf_counter() - started) * 1000
+            sample["status"] = response.status_code
+            sample["ok"] = response.status_code < 400
+            sample["stages"], sample["path"], sample["cache_hit"] = response_details(response)
+        except httpx.HTTPError as e:
+            sample.update(ms=(time.perf_counter() - started) * 1000, status=None, ok=False,
+                          error=e.__class__.__name__, stages={})
+        samples.append(sample)
+
+
+async def run_level(base_url, mix, concurrency, duration, requests, timeout, seed, warmup):
+    weights = [item["weight"] for item in mix]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        if warmup:
+            await asyncio.gather(*(worker(client, mix, weights, time.perf_counter() + warmup, None,
+                                          random.Random(seed + 1000 + i), []) for i in range(concurrency)))
+        samples = []
+        remaining = [requests] if requests else None
+        started = time.perf_counter()
+        deadline = started + duration if duration else float("inf")
+        await asyncio.gather(*(worker(client, mix, weights, deadline, remaining, random.Random(seed + i), samples)
+                               for i in range(concurrency)))
+        return samples, time.perf_counter() - started
+
+
+def latency_summary(values):
+    if not values:
+        return {}
+    summary = {f"p{p}_ms": round(float(np.percentile(values, p)), 2) for p in PERCENTILES}
+    summary["mean_ms"] = round(float(np.mean(values)), 2)
+    return summary
+
+
+def summarize(samples, elapsed):
+    def block(group):
+        ok = [s for s in group if s["ok"]]
+        stages = defaultdict(list)
+        for s in ok:
+            for name, ms in s["stages"].items():
+                stages[name].append(ms)
+        out = {
+            "requests": len(group),
+            "errors": len(group) - len(ok),
+            "rps": round(len(group) / elapsed, 2) if elapsed else 0.0,
+            **latency_summary([s["ms"] for s in ok]),
+            "stages": {name: latency_summary(values) for name, values in sorted(stages.items())},
+        }
+        statuses = defaultdict(int)
+        for s in group:
+            if not s["ok"]:
+                statuses[str(s["status"] or s.get("error"))] += 1
+        if statuses:
+            out["error_statuses"] = dict(statuses)
+        paths = [s["path"] for s in ok if s.get("path")]
+        if paths:
+            out["paths"] = {p: paths.count(p) for p in sorted(set(paths))}
+        hits = [s["cache_hit"] for s in ok if s.get("cache_hit") is not None]
+        if hits:
+            out["cache_hit_rate"] = round(sum(hits) / len(hits), 3)
+        return out
+
+    by_endpoint = defaultdict(list)
+    for s in samples:
+        by_endpoint[s["endpoint"]].append(s)
+    return {"overall": block(samples), "endpoints": {name: block(group) for name, group in sorted(by_endpoint.items())}}
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root_dir, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root_dir,
+                                    capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def print_level(level):
+    print(f"\nconcurrency={level['concurrency']} elapsed={level['elapsed_s']:.1f}s")
+    print(f"{'endpoint':<12} {'reqs':>6} {'err':>5} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    rows = list(level["endpoints"].items()) + [("all", level["overall"])]
+    for name, r in rows:
+        print(f"{name:<12} {r['requests']:>6} {r['errors']:>5} {r['rps']:>8.1f} {r.get('p50_ms', 0):>7.1f}ms "
+              f"{r.get('p95_ms', 0):>7.1f}ms {r.get('p99_ms', 0):>7.1f}ms")
+    for name, r in level["endpoints"].items():
+        if r["stages"]:
+            stages = "  ".join(f"{stage}={s['p50_ms']:.0f}/{s['p95_ms']:.0f}" for stage, s in r["stages"].items()
+                               if stage != "total")
+            print(f"  {name} stages p50/p95 ms: {stages}")
+    if level.get("llm"):
+        print(f"  mock LLM: {level['llm']}")
+
+
+def compare(results, baseline, max_regression):
+    """Print latency / throughput changes against a saved run; returns the regressions over the limit."""
+    base_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    regressions = []
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'} (+ = slower / more RPS):")
+    for level in results["levels"]:
+        base = base_levels.get(level["concurrency"])
+        if base is None:
+            continue
+        for name, r in list(level["endpoints"].items()) + [("all", level["overall"])]:
+            b = base["overall"] if name == "all" else base["endpoints"].get(name)
+            if not b or not b.get("p95_ms"):
+                continue
+            deltas = {key: (r.get(key, 0) - b[key]) / b[key] * 100 for key in ("rps", "p50_ms", "p95_ms", "p99_ms")
+                      if b.get(key)}
+            print(f"  c={level['concurrency']:<3} {name:<12} " + "  ".join(f"{k}={v:+.1f}%" for k, v in deltas.items()))
+            if max_regression is not None and deltas.get("p95_ms", 0) > max_regression:
+                regressions.append(f"c={level['concurrency']} {name} p95 {deltas['p95_ms']:+.1f}%")
+    return regressions
+
+
+async def run(args):
+    endpoints = tuple(args.endpoints.split(","))
+    mix = load_mix(args.mix, endpoints)
+    commit, dirty = git_revision()
+    results = {
+        "meta": {
+            "commit": commit, "dirty": dirty, "timestamp": datetime.now(timezone.utc).isoformat(),
+            "base_url": args.base_url, "mix": str(args.mix), "mix_size": len(mix), "endpoints": list(endpoints),
+            "duration_s": args.duration, "requests": args.requests, "warmup_s": args.warmup, "seed": args.seed,
+            "label": args.label,
+        },
+        "levels": [],
+    }
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=10) as admin:
+        for concurrency in [int(c) for c in args.concurrency.split(",")]:
+            if args.purge_cache:
+                await admin.delete("/cache/answers")
+            if args.mock_url:
+                await admin.post(f"{args.mock_url.rstrip('/')}/stats/reset")
+            samples, elapsed = await run_level(args.base_url, mix, concurrency, args.duration, args.requests,
+                                               args.timeout, args.seed, args.warmup)
+            level = {"concurrency": concurrency, "elapsed_s": round(elapsed, 2), **summarize(samples, elapsed)}
+            if args.mock_url:
+                stats = (await admin.get(f"{args.mock_url.rstrip('/')}/stats")).json()
+                level["llm"] = {key: stats[key] for key in ("requests", "errors", "peak_in_flight", "by_kind")}
+            results["levels"].append(level)
+            print_level(level)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput / tail-latency load test against a running API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--mix", type=Path, default=DEFAULT_MIX, help="query mix (JSONL)")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated endpoints to exercise")
+    parser.add_argument("--concurrency", default="8", help="comma-separated worker counts, one run each")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per run (0 = until --requests)")
+    parser.add_argument("--requests", type=int, default=0, help="stop each run after this many requests")
+    parser.add_argument("--warmup", type=float, default=0, help="unrecorded seconds before each run")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--purge-cache", action="store_true", help="clear the answer cache before each run")
+    parser.add_argument("--mock-url", default=None, help="mock LLM server to reset and read stats from, e.g. http://127.0.0.1:8081")
+    parser.add_argument("--label", default=None, help="free-form note stored with the results")
+    parser.add_argument("--json", type=str, default=None, help="write results to this file")
+    parser.add_argument("--compare", type=str, default=None, help="results JSON of an earlier run to compare with")
+    parser.add_argument("--max-regression", type=float, default=None, help="exit 1 if any p95 is this many %% slower than --compare")
+    args = parser.parse_args()
+    if not args.duration and not args.requests:
+        parser.error("set --duration or --requests")
+
+    results = asyncio.run(run(args))
+    if args.json:
+        Path(args.json).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\nResults written to {args.json}")
+    if args.compare:
+        regressions = compare(results, json.loads(Path(args.compare).read_text(encoding="utf-8")), args.max_regression)
+        if regressions:
+            print(f"p95 regressions over {args.max_regression}%: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
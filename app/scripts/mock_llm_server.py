@@ -0,0 +1,230 @@
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+import uuid
+from pathlib import Path
+
+# Add the root directory to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Local stand-in for the OpenAI-compatible chat completions endpoint.
+# Point the API at it with:
+#   LLM_BASE_URL=http://127.0.0.1:8081/v1 GROQ_API_KEY=mock uvicorn main:app
+#
+# Replies are canned but shaped like the real prompts expect: JSON for the
+# classifier, a SELECT for SQL-Gen, prose for everything else.
+#
+# For load tests (app/scripts/load_test.py) latency can be set per reply kind,
+# provider capacity limited with --max-concurrency (requests queue, like a
+# rate-limited account), and 429s carry Retry-After. POST /config changes any
+# setting at runtime; POST /stats/reset zeroes the counters between runs.
+#
+#   python app/scripts/mock_llm_server.py --port 8081 --latency-ms 400 --classify-latency-ms 150 \
+#       --max-concurrency 16 --error-rate 0.02 --error-status 429
+
+app = FastAPI(title="Mock LLM server")
+config = {"latency_ms": 200.0, "jitter_ms": 50.0, "error_rate": 0.0, "error_status": 503, "token_delay_ms": 20.0,
+          "classify_latency_ms": None, "sql_latency_ms": None, "answer_latency_ms": None,  # None = latency_ms
+          "max_concurrency": 0, "retry_after_s": 1.0, "answer_words": 30}
+KINDS = ("classify", "sql", "answer")
+stats = {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0, "by_kind": {kind: 0 for kind in KINDS}}
+_capacity = None  # asyncio.Semaphore when max_concurrency > 0
+
+DOMAIN_KEYWORDS = {
+    "jira_tickets": ("ticket", "jira", "issue", "bug", "assigned"),
+    "deployments": ("deploy", "release", "version", "rollout"),
+    "employees": ("who is", "employee", "team", "email", "role", "engineer"),
+}
+
+
+HYBRID_KEYWORDS = ("process", "policy", "owns", "responsible for")
+
+
+def classify(text: str) -> str:
+    lowered = text.lower()
+    for domain, words in DOMAIN_KEYWORDS.items():
+        if any(w in lowered for w in words) and not lowered.startswith(("how", "what should", "why")):
+            if any(w in lowered for w in HYBRID_KEYWORDS):
+                return f'{{"route": "hybrid", "domain": "{domain}", "confidence": 0.8}}'
+            return f'{{"route": "db", "domain": "{domain}", "confidence": 0.9}}'
+    return '{"route": "kb", "domain": "general", "confidence": 0.7}'
+
+
+def generate_sql(text: str) -> str:
+    lowered = text.lower()
+    if "deploy" in lowered:
+        return "SELECT * FROM deployments ORDER BY date DESC LIMIT 50;"
+    if "ticket" in lowered or "jira" in lowered:
+        return "SELECT * FROM jira_tickets WHERE status = 'Open' LIMIT 50;"
+    return "SELECT * FROM employees LIMIT 50;"
+
+
+def reply_kind(messages) -> str:
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    if "classification engine" in system:
+        return "classify"
+    if "SQL-Gen" in system:
+        return "sql"
+    return "answer"
+
+
+def mock_answer(words: int) -> str:
+    sentence = "This is a mock answer based on the provided context."
+    out = []
+    while len(out) < words:
+        out.extend(sentence.split(" "))
+    return " ".join(out[:words])
+
+
+def reply_for(messages) -> str:
+    user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    kind = reply_kind(messages)
+    if kind == "classify":
+        return classify(user)
+    if kind == "sql":
+        question = re.search(r"User:\s*(.*)", user)
+        return generate_sql(question.group(1) if question else user)
+    return mock_answer(config["answer_words"])
+
+
+def completion_body(model: str, content: str, prompt_chars: int):
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        # Rough 4-chars-per-token estimate so token accounting has something to count
+        "usage": {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (prompt_chars + len(content)) // 4,
+        },
+    }
+
+
+async def stream_body(model: str, content: str, prompt_chars: int):
+    """OpenAI-style SSE chunks, one word per delta, then a usage-only chunk (as with include_usage)."""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    words = content.split(" ")
+    for i, word in enumerate(words):
+        delta = {"content": word + (" " if i < len(words) - 1 else "")}
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(config["token_delay_ms"] / 1000)
+    usage = completion_body(model, content, prompt_chars)["usage"]
+    yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+async def simulated_latency(kind: str):
+    mean = config[f"{kind}_latency_ms"]
+    mean = config["latency_ms"] if mean is None else mean
+    delay = max(0.0, random.gauss(mean, config["jitter_ms"])) / 1000
+    await asyncio.sleep(delay)
+
+
+def set_capacity():
+    global _capacity
+    _capacity = asyncio.Semaphore(int(config["max_concurrency"])) if config["max_concurrency"] else None
+
+
+async def respond(body):
+    messages = body.get("messages", [])
+    kind = reply_kind(messages)
+    stats["by_kind"][kind] += 1
+    await simulated_latency(kind)
+    if random.random() < config["error_rate"]:
+        stats["errors"] += 1
+        headers = {"Retry-After": str(config["retry_after_s"])} if config["error_status"] == 429 else None
+        return JSONResponse(status_code=config["error_status"], content={"error": {"message": "mock failure"}},
+                            headers=headers)
+    content = reply_for(messages)
+    prompt_chars = sum(len(m.get("content", "")) for m in messages)
+    if body.get("stream"):
+        # Latency above models time-to-first-token; tokens then trickle out
+        return StreamingResponse(stream_body(body.get("model", "mock"), content, prompt_chars),
+                                 media_type="text/event-stream")
+    return completion_body(body.get("model", "mock"), content, prompt_chars)
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    stats["in_flight"] += 1
+    stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+    try:
+        if _capacity is None:
+            return await respond(body)
+        # Over capacity, requests wait their turn (streams only hold a slot until the first byte)
+        async with _capacity:
+            return await respond(body)
+    finally:
+        stats["in_flight"] -= 1
+
+
+@app.get("/stats")
+def get_stats():
+    return {**stats, "config": config}
+
+
+@app.post("/stats/reset")
+def reset_stats():
+    stats.update(requests=0, errors=0, peak_in_flight=stats["in_flight"], by_kind={kind: 0 for kind in KINDS})
+    return get_stats()
+
+
+@app.post("/config")
+async def update_config(request: Request):
+    """Change settings at runtime, e.g. {"latency_ms": 800, "error_rate": 0.05}. Unknown keys are rejected."""
+    changes = await request.json()
+    unknown = sorted(set(changes) - set(config))
+    if unknown:
+        return JSONResponse(status_code=400, content={"error": {"message": f"unknown settings: {unknown}"}})
+    config.update(changes)
+    set_capacity()
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=config["latency_ms"], help="mean response latency")
+    parser.add_argument("--jitter-ms", type=float, default=config["jitter_ms"], help="latency standard deviation")
+    parser.add_argument("--error-rate", type=float, default=config["error_rate"], help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=config["error_status"], help="status code for failures")
+    parser.add_argument("--token-delay-ms", type=float, default=config["token_delay_ms"], help="delay between streamed tokens")
+    for kind in KINDS:
+        parser.add_argument(f"--{kind}-latency-ms", type=float, default=None, help=f"mean latency of {kind} replies (default: --latency-ms)")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="requests served at once; the rest queue (0 = unlimited)")
+    parser.add_argument("--retry-after-s", type=float, default=config["retry_after_s"], help="Retry-After sent with 429s")
+    parser.add_argument("--answer-words", type=int, default=config["answer_words"], help="length of prose answers")
+    args = parser.parse_args()
+    config.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                  error_status=args.error_status, token_delay_ms=args.token_delay_ms,
+                  classify_latency_ms=args.classify_latency_ms, sql_latency_ms=args.sql_latency_ms,
+                  answer_latency_ms=args.answer_latency_ms, max_concurrency=args.max_concurrency,
+                  retry_after_s=args.retry_after_s, answer_words=args.answer_words)
+    set_capacity()
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
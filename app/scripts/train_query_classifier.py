@@ -0,0 +1,95 @@
+import argparse
+import sys
+from pathlib import Path
+import numpy as np
+
+# Add the root directory to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+
+from app.services.embeddings import get_embeddings
+from app.services.local_classifier import (
+    CentroidClassifier, CENTROIDS_PATH, LABELED_QUERIES_PATH, KEYWORD_CONFIDENCE,
+    keyword_label, load_labeled_queries,
+)
+
+# Train the local query pre-classifier and report how many questions it would
+# answer without the LLM.
+#
+#   python app/scripts/train_query_classifier.py
+#   python app/scripts/train_query_classifier.py --with-llm   # also score the LLM fallback
+
+THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9]
+
+
+def cross_val_predictions(queries, labels, vectors, folds: int, seed: int = 0):
+    """Out-of-fold (label, confidence, source) for every query."""
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(queries))
+    predictions = [None] * len(queries)
+    for fold in range(folds):
+        test = order[fold::folds]
+        train = np.setdiff1d(order, test)
+        model = CentroidClassifier.fit([queries[i] for i in train], [labels[i] for i in train], vectors[train])
+        for i in test:
+            keyword = keyword_label(queries[i])
+            if keyword is not None:
+                predictions[i] = (keyword, KEYWORD_CONFIDENCE, "keyword")
+            else:
+                label, confidence = model.predict_vector(vectors[i])
+                predictions[i] = (label, confidence, "centroid")
+    return predictions
+
+
+def llm_label(query: str) -> str:
+    from app.services.classifier import classify_query_with_llm
+    cls = classify_query_with_llm(query)
+    return "kb" if cls["route"] != "db" else (cls["domain"] or "kb")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train/evaluate the local query classifier")
+    parser.add_argument("--data", type=Path, default=LABELED_QUERIES_PATH, help="JSONL with query/label fields")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--with-llm", action="store_true", help="call the LLM for low-confidence queries")
+    parser.add_argument("--eval-only", action="store_true", help="don't write the centroids file")
+    args = parser.parse_args()
+
+    rows = load_labeled_queries(args.data)
+    queries = [r["query"] for r in rows]
+    labels = [r["label"] for r in rows]
+    print(f"Loaded {len(rows)} labeled queries from {args.data}")
+
+    vectors = get_embeddings(queries)
+    predictions = cross_val_predictions(queries, labels, vectors, args.folds)
+
+    keyword_hits = [i for i, p in enumerate(predictions) if p[2] == "keyword"]
+    keyword_correct = sum(predictions[i][0] == labels[i] for i in keyword_hits)
+    print(f"Keyword fast path: {len(keyword_hits)} queries, accuracy "
+          f"{keyword_correct / max(1, len(keyword_hits)):.1%}")
+    overall = sum(p[0] == y for p, y in zip(predictions, labels))
+    print(f"Local-only accuracy ({args.folds}-fold CV): {overall / len(rows):.1%}")
+
+    llm_labels = {}
+    print(f"\n{'threshold':>9} {'avoided LLM':>12} {'local acc':>10} {'end-to-end acc':>15}")
+    for threshold in THRESHOLDS:
+        local = [i for i, p in enumerate(predictions) if p[1] >= threshold]
+        local_correct = sum(predictions[i][0] == labels[i] for i in local)
+        line = (f"{threshold:>9.2f} {len(local) / len(rows):>12.1%} "
+                f"{local_correct / max(1, len(local)):>10.1%}")
+        if args.with_llm:
+            fallback = [i for i in range(len(rows)) if i not in set(local)]
+            for i in fallback:
+                if i not in llm_labels:
+                    llm_labels[i] = llm_label(queries[i])
+            correct = local_correct + sum(llm_labels[i] == labels[i] for i in fallback)
+            line += f" {correct / len(rows):>15.1%}"
+        print(line)
+
+    if not args.eval_only:
+        CentroidClassifier.fit(queries, labels, vectors).save(CENTROIDS_PATH)
+        print(f"\nSaved centroids trained on all {len(rows)} queries to {CENTROIDS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
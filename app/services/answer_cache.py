@@ -0,0 +1,335 @@
+# root: app/services/answer_cache.py
+from __future__ import annotations
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Add the project root to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+from app.services.embeddings import get_query_embedding, get_query_embeddings
+from app.services.executors import run_cpu
+from app.services.kb_store import kb_store
+from app.services.sql_cache import normalize_question, sql_plan_cache
+from app.services.timings import current_timings
+from create_db import DB_PATH
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "1") == "1"
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+# A new question hits when its cosine distance to a cached one is at most this.
+# DB and hybrid answers additionally need the same SQL (see `_same_query`).
+ANSWER_CACHE_MAX_DISTANCE = float(os.getenv("ANSWER_CACHE_MAX_DISTANCE", "0.08"))
+# Per-route TTLs (seconds): docs change rarely, table data more often
+ANSWER_CACHE_TTLS = {
+    "kb": float(os.getenv("ANSWER_CACHE_TTL_KB", "3600")),
+    "db": float(os.getenv("ANSWER_CACHE_TTL_DB", "300")),
+    "hybrid": float(os.getenv("ANSWER_CACHE_TTL_HYBRID", "300")),
+}
+
+# Which data sources an answer on each route was built from
+ROUTE_SOURCES = {"kb": ("kb",), "db": ("db",)}
+# Routes whose answers may be shared between merely similar questions
+SIMILARITY_ROUTES = ("kb",)
+
+
+class DataVersion:
+    """
+    Cheap change detection for the SQLite file: `PRAGMA data_version` on a
+    long-lived connection changes whenever another connection (e.g. the
+    loader) commits.
+    """
+
+    def __init__(self, path: Path = DB_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[int]:
+        with self._lock:
+            try:
+                if self._conn is None:
+                    self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+                return self._conn.execute("PRAGMA data_version").fetchone()[0]
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read DB data_version: {e}")
+                self._conn = None
+                return None
+
+
+def kb_generation() -> Optional[int]:
+    try:
+        return kb_store.snapshot().generation
+    except Exception:
+        return None
+
+
+@dataclass
+class CacheEntry:
+    scope: str
+    route: str
+    question: str
+    payload: Dict[str, Any]
+    created: float
+    expires: float
+    versions: Dict[str, Optional[int]]
+    last_used: float
+    normalized: str = ""
+    sql_template: Optional[str] = None
+    sql_params: Optional[Dict[str, Any]] = None
+
+
+def _normalized(question: str) -> str:
+    return normalize_question(question).lower()
+
+
+def _same_query(entry: CacheEntry, question: str) -> bool:
+    """
+    Whether `question` may reuse `entry`. Questions that differ in one value
+    ("assigned to ahmed_ali" / "to fatima_k") embed almost identically, so DB
+    and hybrid answers need the same normalized question, or a question that
+    binds the entry's SQL template to the same parameters.
+    """
+    if entry.route in SIMILARITY_ROUTES:
+        return True
+    if _normalized(question) == entry.normalized:
+        return True
+    if entry.sql_template is None or entry.sql_params is None:
+        return False
+    return sql_plan_cache.bind(entry.sql_template, question) == entry.sql_params
+
+
+def _cacheable(result: Dict[str, Any]) -> bool:
+    """Only complete answers are cached: no failed hybrid branch, no rejected or timed-out SQL."""
+    if not result.get("answer"):
+        return False
+    if any(status != "ok" for status in (result.get("branches") or {}).values()):
+        return False
+    return not (result.get("sql_stats") or {}).get("error")
+
+
+class SemanticAnswerCache:
+    """
+    Answer cache keyed by query embedding. Lookups compare the question's
+    normalized embedding against every cached one (a single matrix-vector
+    product for a few thousand entries) and return the closest answer within
+    `max_distance` that is still fresh and was built from the current KB/DB.
+    """
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, max_distance: float = ANSWER_CACHE_MAX_DISTANCE,
+                 ttls: Dict[str, float] = ANSWER_CACHE_TTLS):
+        self.max_size = max_size
+        self.max_distance = max_distance
+        self.ttls = ttls
+        self.db_version = DataVersion()
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: List[Optional[CacheEntry]] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.expirations = 0
+
+    def current_versions(self) -> Dict[str, Optional[int]]:
+        return {"kb": kb_generation(), "db": self.db_version.current()}
+
+    def _valid(self, entry: CacheEntry, versions: Dict[str, Optional[int]], now: float) -> Tuple[bool, str]:
+        if now > entry.expires:
+            return False, "expired"
+        for source in ROUTE_SOURCES.get(entry.route, ("kb", "db")):
+            if entry.versions.get(source) != versions.get(source):
+                return False, "invalidated"
+        return True, ""
+
+    def _drop(self, slot: int, reason: str):
+        self._entries[slot] = None
+        self._vectors[slot] = 0.0
+        if reason == "expired":
+            self.expirations += 1
+        elif reason == "invalidated":
+            self.invalidations += 1
+
+    def lookup(self, scope: str, vector: np.ndarray, question: str) -> Tuple[Optional[CacheEntry], float]:
+        """Return (entry, similarity) for the closest fresh match within range, or (None, 0.0)."""
+        versions = self.current_versions()
+        now = time.time()
+        with self._lock:
+            if self._vectors is not None and self._entries:
+                sims = self._vectors[:len(self._entries)] @ vector
+                for slot in np.argsort(-sims):
+                    sim = float(sims[slot])
+                    if sim < 1.0 - self.max_distance:
+                        break
+                    entry = self._entries[slot]
+                    if entry is None or entry.scope != scope or not _same_query(entry, question):
+                        continue
+                    ok, reason = self._valid(entry, versions, now)
+                    if not ok:
+                        self._drop(slot, reason)
+                        continue
+                    entry.last_used = now
+                    self.hits += 1
+                    return entry, sim
+            self.misses += 1
+            return None, 0.0
+
+    def store(self, scope: str, route: str, question: str, vector: np.ndarray, payload: Dict[str, Any],
+              versions: Dict[str, Optional[int]]):
+        if self.max_size <= 0:
+            return
+        now = time.time()
+        template_id = payload.get("sql_template") if route not in SIMILARITY_ROUTES else None
+        entry = CacheEntry(
+            scope=scope, route=route, question=question, payload=payload, created=now,
+            expires=now + self.ttls.get(route, min(self.ttls.values())), versions=versions, last_used=now,
+            normalized=_normalized(question), sql_template=template_id,
+            sql_params=sql_plan_cache.bind(template_id, question) if template_id else None,
+        )
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, vector.shape[0]), dtype=np.float32)
+            try:
+                slot = self._entries.index(None)
+            except ValueError:
+                if len(self._entries) < self.max_size:
+                    slot = len(self._entries)
+                    self._entries.append(None)
+                else:
+                    # Least recently used
+                    slot = min(range(len(self._entries)), key=lambda i: self._entries[i].last_used)
+                    self.evictions += 1
+            self._entries[slot] = entry
+            self._vectors[slot] = vector
+
+    def invalidate(self, route: Optional[str] = None) -> int:
+        """Drop every entry (or those on one route). Returns how many were removed."""
+        with self._lock:
+            removed = 0
+            for slot, entry in enumerate(self._entries):
+                if entry is not None and (route is None or entry.route == route):
+                    self._drop(slot, "invalidated")
+                    removed += 1
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": ANSWER_CACHE_ENABLED,
+            "size": sum(e is not None for e in self._entries),
+            "max_size": self.max_size,
+            "max_distance": self.max_distance,
+            "ttls": self.ttls,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+answer_cache = SemanticAnswerCache()
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def _hit_payload(entry: CacheEntry, similarity: float, question: str) -> Dict[str, Any]:
+    payload = dict(entry.payload)
+    if "question" in payload:
+        payload["question"] = question
+    payload["cache"] = {"hit": True, "similarity": round(similarity, 4), "cached_question": entry.question}
+    if "timings" in payload:
+        # The cached stage timings belong to the request that computed the answer
+        timings = current_timings()
+        payload["timings"] = timings.as_dict() if timings is not None else {}
+    return payload
+
+
+def _miss_payload(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {**result, "cache": {"hit": False, "similarity": None}}
+
+
+async def cached_answer(scope: str, question: str, compute: Callable[[], Awaitable[Dict[str, Any]]],
+                        route_of: Callable[[Dict[str, Any]], str] = lambda result: result.get("path", "kb")
+                        ) -> Dict[str, Any]:
+    """
+    Serve `question` from the semantic cache, or run `compute()` and cache its
+    result. The response gets a `cache` block: {"hit", "similarity", "cached_question"}.
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return _miss_payload(await compute())
+
+    try:
+        vector = _unit(await run_cpu(get_query_embedding, question))
+    except Exception as e:
+        logger.warning(f"Answer cache bypassed for {question!r}: {e}")
+        return _miss_payload(await compute())
+    entry, similarity = answer_cache.lookup(scope, vector, question)
+    if entry is not None:
+        return _hit_payload(entry, similarity, question)
+
+    # Snapshot versions before computing so a reload mid-request marks this answer stale
+    versions = answer_cache.current_versions()
+    result = await compute()
+    if _cacheable(result):
+        answer_cache.store(scope, route_of(result), question, vector, result, versions)
+    return _miss_payload(result)
+
+
+async def cached_answers(scope: str, questions: Sequence[str],
+                         compute_batch: Callable[[List[str]], AsyncIterator[Tuple[int, Any]]],
+                         route_of: Callable[[Dict[str, Any]], str] = lambda result: result.get("path", "kb")
+                         ) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    Batch `cached_answer`. All questions are embedded in one call; hits are
+    served from the cache and only the misses go to `compute_batch(misses)`,
+    an async iterator of (index into misses, result or exception). Yields
+    (index, response or exception) in input order.
+    """
+    questions = list(questions)
+    vectors = None
+    if ANSWER_CACHE_ENABLED:
+        try:
+            vectors = [_unit(v) for v in await run_cpu(get_query_embeddings, questions)]
+        except Exception as e:
+            logger.warning(f"Answer cache bypassed for a batch of {len(questions)}: {e}")
+
+    ready: Dict[int, Any] = {}
+    misses = list(range(len(questions)))
+    if vectors is not None:
+        misses = []
+        for i, vector in enumerate(vectors):
+            entry, similarity = answer_cache.lookup(scope, vector, questions[i])
+            if entry is not None:
+                ready[i] = _hit_payload(entry, similarity, questions[i])
+            else:
+                misses.append(i)
+
+    versions = answer_cache.current_versions()
+    next_index = 0
+    while next_index in ready:
+        yield next_index, ready.pop(next_index)
+        next_index += 1
+    if misses:
+        async for j, result in compute_batch([questions[i] for i in misses]):
+            i = misses[j]
+            if not isinstance(result, BaseException):
+                if vectors is not None and _cacheable(result):
+                    answer_cache.store(scope, route_of(result), questions[i], vectors[i], result, versions)
+                result = _miss_payload(result)
+            ready[i] = result
+            while next_index in ready:
+                yield next_index, ready.pop(next_index)
+                next_index += 1
@@ -1,8 +1,16 @@
 from __future__ import annotations
+import asyncio
 import json
+import logging
 import os
-from typing import Literal, TypedDict, Optional
-import requests
+from typing import Literal, TypedDict, Optional, NotRequired
+import re
+from app.services.groq_client import ask_llama3, ask_llama3_async
+from app.services.local_classifier import classify_local, classify_local_batch
+from app.services.executors import run_cpu
+from app.services.llm_client import LLM_BATCH_CONCURRENCY
+
+logger = logging.getLogger(__name__)
 Route = Literal["db", "kb", "hybrid"]
 Domain = Optional[Literal["employees", "deployments", "jira_tickets"]]
 
@@ -10,17 +18,16 @@ class QueryClassification(TypedDict):
     route: Route
     domain:Domain
     confidence:float
-    
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-GROQ_LLM_MODEL = os.getenv("GROQ_LLM_MODEL", "llama-4-scout-17b-16e-instruct") # load the LLM model
-GROQ_URL = "https://api.groq.com/openai/v1/chat/completions"
-
+    source:NotRequired[str]  # keyword | centroid | llm
 
+# Local answers at or above this confidence skip the LLM call
+CLASSIFIER_CONFIDENCE_THRESHOLD = float(os.getenv("CLASSIFIER_CONFIDENCE_THRESHOLD", "0.8"))
+    
 SYSTEM_PROMPT = """
 You are a classification engine.
 YOUR OUTPUT MUST BE VALID JSON WITH NO ADDITIONAL TEXT OR COMMENTS.
 Your task:  
-Determine if a user query is about one of the following database tables or is a general knowledge-base (KB) question.
+Determine if a user query is about one of the following database tables, is a general knowledge-base (KB) question, or needs both (hybrid).
 
 Database tables:
 1. employees
@@ -33,12 +40,14 @@ Database tables:
 Classification rules:
 - If the query requests information that can be answered using **only** the columns from a specific table above:
     → Return: route = "db", domain = "<table_name>"
+- If the query needs rows from a table above **and** knowledge from documents (policies, processes, ownership, how-tos):
+    → Return: route = "hybrid", domain = "<table_name>"
 - Otherwise:
     → Return: route = "kb", domain = "general"
 
 Output format (must always be valid JSON):
 {
-  "route": "<db|kb>",
+  "route": "<db|kb|hybrid>",
   "domain": "<table_name|general>",
   "confidence": <float between 0.5 and 1.0>
 }
@@ -51,44 +60,95 @@ Examples:
 - "Show me my open Jira tickets." → {"route": "db", "domain": "jira_tickets", "confidence": 1.0}
 - "List recent deployments for the payments service." → {"route": "db", "domain": "deployments", "confidence": 1.0}
 - "Who is on-call this week?" → {"route": "kb", "domain": "general", "confidence": 0.7}
+- "Who on the Backend team owns the deployment process?" → {"route": "hybrid", "domain": "employees", "confidence": 0.8}
 """
 
+ROUTES = ("db", "kb", "hybrid")
+DOMAINS = ("employees", "deployments", "jira_tickets")
+
 def classify_query_with_llm(query:str)-> QueryClassification:
-   headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
-   payload = {
-      "model" : f"meta-llama/{GROQ_LLM_MODEL}",
-      "messages":[
-         {"role":"system", "content":SYSTEM_PROMPT},
-         {"role":"user", "content":query}
-      ],
-      "temperature": 0.2  # Lower temperature for more deterministic responses
-   }
-   response = requests.post(GROQ_URL, headers=headers, json=payload)
-   response.raise_for_status()
-   raw = response.json()["choices"][0]["message"]["content"]
-   
+   # Lower temperature for more deterministic responses
+   raw = ask_llama3(SYSTEM_PROMPT, query, temperature=0.2)
+   return parse_classification(raw)
+
+async def classify_query_with_llm_async(query:str)-> QueryClassification:
+   raw = await ask_llama3_async(SYSTEM_PROMPT, query, temperature=0.2)
+   return parse_classification(raw)
+
+def parse_classification(raw:str)-> QueryClassification:
    try:
-      # Debug the response
-      print("RAW RESPONSE:", raw)
-      
+      logger.debug(f"Classifier raw response: {raw!r}")
+
       # Try to extract JSON if it's embedded in text
-      import re
       json_match = re.search(r'\{.*\}', raw, re.DOTALL)
       if json_match:
           raw = json_match.group(0)
       
       data = json.loads(raw)
-      print("CLASSIFICATION SUCCESSFUL")
+      route = data.get("route", "kb")
+      domain = data.get("domain", None)
       return{
-         "route": data.get("route", "kb"),
-         "domain": data.get("domain", None),
+         "route": route if route in ROUTES else "kb",
+         "domain": domain if domain in DOMAINS else None,
          "confidence": data.get("confidence", 0.5),
       }
    except json.JSONDecodeError as e:
-      print(f"CLASSIFICATION FAILED: {e}")
-      print(f"Raw response was: {raw}")
+      logger.warning(f"Classifier response is not JSON ({e}), defaulting to kb: {raw!r}")
       return {
          "route": "kb",
          "domain": None,
          "confidence": 0.5
-      }
\ No newline at end of file
+      }
+
+def _from_local(local) -> QueryClassification:
+   label = local["label"]
+   return {
+      "route": "kb" if label == "kb" else "db",
+      "domain": None if label == "kb" else label,
+      "confidence": round(local["confidence"], 4),
+      "source": local["source"],
+   }
+
+def classify_query(query:str, threshold:float=CLASSIFIER_CONFIDENCE_THRESHOLD)-> QueryClassification:
+   """Local pre-classifier first; fall back to the LLM when it isn't confident enough."""
+   local = classify_local(query)
+   if local is not None and local["confidence"] >= threshold:
+      return _from_local(local)
+   return {**classify_query_with_llm(query), "source": "llm"}
+
+async def classify_local_async(query:str)-> Optional[QueryClassification]:
+   """Local pre-classification only (None when no local model is available)."""
+   # The centroid path embeds the query, which is CPU work
+   local = await run_cpu(classify_local, query)
+   return _from_local(local) if local is not None else None
+
+async def classify_query_async(query:str, threshold:float=CLASSIFIER_CONFIDENCE_THRESHOLD)-> QueryClassification:
+   local = await classify_local_async(query)
+   if local is not None and local["confidence"] >= threshold:
+      return local
+   return {**(await classify_query_with_llm_async(query)), "source": "llm"}
+
+async def classify_queries_async(queries:list[str], threshold:float=CLASSIFIER_CONFIDENCE_THRESHOLD,
+                                 concurrency:int=LLM_BATCH_CONCURRENCY)-> list:
+   """
+   classify_query_async over a batch, in input order. Local classification
+   embeds the whole batch in one model call; LLM fallbacks run `concurrency`
+   at a time. A failed item comes back as its exception.
+   """
+   try:
+      locals_ = await run_cpu(classify_local_batch, list(queries))
+   except Exception:
+      locals_ = None  # classify item by item, so a failure lands on the items it affects
+   semaphore = asyncio.Semaphore(max(1, concurrency))
+
+   async def one(i, query):
+      if locals_ is None:
+         async with semaphore:
+            return await classify_query_async(query, threshold)
+      local = locals_[i]
+      if local is not None and local["confidence"] >= threshold:
+         return _from_local(local)
+      async with semaphore:
+         return {**(await classify_query_with_llm_async(query)), "source": "llm"}
+
+   return await asyncio.gather(*(one(i, q) for i, q in enumerate(queries)), return_exceptions=True)
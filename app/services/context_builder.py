@@ -0,0 +1,176 @@
+# root: app/services/context_builder.py
+from __future__ import annotations
+import os
+import re
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+# Add the project root to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+from app.services.tokenizer import TokenCounter
+from app.services.kb_chunker import token_counter
+
+# tokenizer.json path or hub id for counting; defaults to the chunker's
+# tokenizer (the embedding model's, local or from the hub), then to a
+# ~4-chars-per-token estimate. Reports name the tokenizer that was used.
+CONTEXT_TOKENIZER = os.getenv("CONTEXT_TOKENIZER", "")
+CONTEXT_KB_TOKEN_BUDGET = int(os.getenv("CONTEXT_KB_TOKEN_BUDGET", "1500"))
+CONTEXT_SQL_TOKEN_BUDGET = int(os.getenv("CONTEXT_SQL_TOKEN_BUDGET", "1200"))
+CONTEXT_MIN_PARTIAL_TOKENS = 64   # don't add a truncated chunk smaller than this
+CONTEXT_SUMMARY_MAX_DISTINCT = 10  # columns with at most this many values get counts for omitted rows
+ROW_DELIMITER = " | "
+
+_counter: Optional[TokenCounter] = None
+
+
+def _token_counter() -> TokenCounter:
+    global _counter
+    if _counter is None:
+        _counter = TokenCounter(CONTEXT_TOKENIZER) if CONTEXT_TOKENIZER else token_counter()
+    return _counter
+
+
+def tokenizer_name() -> str:
+    return _token_counter().name
+
+
+def count_tokens(text: str) -> int:
+    return _token_counter().count(text)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Longest whole-word prefix of `text` within `budget` tokens."""
+    return _token_counter().truncate(text, budget)
+
+
+@dataclass
+class Context:
+    """Prompt context plus what it cost; `report()` goes into API responses."""
+    text: str
+    tokens: int
+    items_used: int
+    items_total: int
+    truncated: bool = False
+    notes: Dict[str, Any] = field(default_factory=dict)
+    chunks: List[Dict[str, Any]] = field(default_factory=list)  # KB chunks as sent
+    prompt_tokens: Optional[int] = None  # whole prompt (system + user) once it's built
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "tokens": self.tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "items_used": self.items_used,
+            "items_total": self.items_total,
+            "truncated": self.truncated,
+            "tokenizer": tokenizer_name(),
+            **self.notes,
+        }
+
+
+def prompt_tokens(*parts: str) -> int:
+    return sum(count_tokens(p) for p in parts)
+
+
+# ---------------------------------------------------------------------------
+# KB chunks
+# ---------------------------------------------------------------------------
+
+def dedupe_chunks(chunks: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Drop repeated chunks (the same text from several files or retrievers),
+    best-scoring first. Section chunks don't overlap, so nothing is trimmed.
+    """
+    kept: List[Dict[str, Any]] = []
+    seen_texts = set()
+    for chunk in sorted(chunks, key=lambda c: -c.get("score", 0.0)):
+        text = " ".join(chunk["text"].split())
+        if not text or text in seen_texts:
+            continue
+        seen_texts.add(text)
+        kept.append(chunk)
+    return kept
+
+
+def build_kb_context(chunks: Sequence[Dict[str, Any]], budget: int = CONTEXT_KB_TOKEN_BUDGET) -> Context:
+    """Pack the best deduplicated chunks into `budget` tokens, best first."""
+    unique = dedupe_chunks(chunks)
+    used, parts, tokens, truncated = [], [], 0, False
+    for chunk in unique:
+        cost = count_tokens(chunk["text"]) + 1  # +1 for the separating newline
+        if tokens + cost <= budget:
+            text = chunk["text"]
+        elif budget - tokens >= CONTEXT_MIN_PARTIAL_TOKENS:
+            text = truncate_to_tokens(chunk["text"], budget - tokens - 1)
+            cost = count_tokens(text) + 1
+            truncated = True
+        else:
+            truncated = True
+            break
+        parts.append(text)
+        used.append({**chunk, "text": text})
+        tokens += cost
+    return Context(text="\n".join(parts), tokens=tokens, items_used=len(used), items_total=len(chunks),
+                   truncated=truncated, notes={"duplicates_removed": len(chunks) - len(unique)}, chunks=used)
+
+
+# ---------------------------------------------------------------------------
+# SQL rows
+# ---------------------------------------------------------------------------
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    return re.sub(r"\s+", " ", str(value)).replace("|", "/")
+
+
+def summarize_rows(columns: Sequence[str], rows: Sequence[Dict[str, Any]]) -> str:
+    """Value counts for low-cardinality columns, so omitted rows still inform the answer."""
+    parts = []
+    for col in columns:
+        counts = Counter(_cell(r.get(col)) for r in rows)
+        if 1 < len(counts) <= CONTEXT_SUMMARY_MAX_DISTINCT:
+            parts.append(f"{col}: " + ", ".join(f"{v or 'NULL'}={n}" for v, n in counts.most_common()))
+    return "; ".join(parts)
+
+
+def build_rows_context(columns: Sequence[str], rows: Sequence[Dict[str, Any]],
+                       budget: int = CONTEXT_SQL_TOKEN_BUDGET, truncated_by_query: bool = False) -> Context:
+    """
+    Rows as a header line plus one delimited line per row, cut off at `budget`
+    tokens. Omitted rows are replaced by a count and per-column value summary.
+    """
+    if not rows:
+        return Context(text="(no rows)", tokens=count_tokens("(no rows)"), items_used=0, items_total=0)
+    columns = list(columns) or list(rows[0].keys())
+    header = ROW_DELIMITER.join(columns)
+    lines, tokens = [header], count_tokens(header) + 1
+    for row in rows:
+        line = ROW_DELIMITER.join(_cell(row.get(c)) for c in columns)
+        cost = count_tokens(line) + 1
+        if tokens + cost > budget:
+            break
+        lines.append(line)
+        tokens += cost
+    omitted = len(rows) - (len(lines) - 1)
+    if omitted:
+        stats = summarize_rows(columns, rows)
+        while True:  # give back rows until the summary fits too
+            summary = f"... {omitted} more rows not shown ({len(rows)} total)."
+            if stats:
+                summary += f" Across all rows: {stats}"
+            cost = count_tokens(summary) + 1
+            if tokens + cost <= budget or len(lines) == 1:
+                break
+            tokens -= count_tokens(lines.pop()) + 1
+            omitted += 1
+        lines.append(summary)
+        tokens += cost
+    elif truncated_by_query:
+        lines.append("... more rows matched but were cut off by the row limit.")
+        tokens += count_tokens(lines[-1]) + 1
+    return Context(text="\n".join(lines), tokens=tokens, items_used=len(rows) - omitted, items_total=len(rows),
+                   truncated=bool(omitted) or truncated_by_query)
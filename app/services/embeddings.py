@@ -1,9 +1,255 @@
-from sentence_transformers import SentenceTransformer
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+import numpy as np
+from app.services.timings import stage
 
-print("LOADING EMBEDDING MODEL")
-# Local model — free
-model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_MODEL_PATH = os.getenv("EMBEDDING_MODEL_PATH", "")  # load from a local directory instead of the hub
+EMBEDDING_MODEL_ID = EMBEDDING_MODEL_PATH or EMBEDDING_MODEL_NAME
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_NUM_THREADS = int(os.getenv("EMBED_NUM_THREADS", "0"))  # 0 = torch default
+
+# Query-embedding cache
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "10000"))        # entries kept in memory (0 disables)
+EMBED_CACHE_TTL = float(os.getenv("EMBED_CACHE_TTL", "86400"))        # seconds (0 = no expiry)
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "")                  # SQLite file for the on-disk tier
+
+# Local model — free. Loaded on first use (or by warm_up()) so importing this
+# module doesn't pull in torch.
+_model = None
+_model_lock = threading.Lock()
+model_load_seconds: Optional[float] = None
+
+def set_num_threads(num_threads: int):
+    """Cap the intra-op CPU threads torch uses for encoding (0 leaves the default)."""
+    if num_threads and num_threads > 0:
+        import torch
+        torch.set_num_threads(num_threads)
+
+def get_model(num_threads: Optional[int] = None):
+    """
+    Return the shared SentenceTransformer, loading it on first call. The torch
+    thread cap is process-wide, so it's set once here, from `num_threads` if
+    given or else EMBED_NUM_THREADS; later calls don't change it.
+    """
+    global _model, model_load_seconds
+    if _model is not None:
+        return _model
+    with _model_lock:
+        if _model is None:
+            logger.info(f"Loading embedding model {EMBEDDING_MODEL_ID}")
+            started = time.perf_counter()
+            from sentence_transformers import SentenceTransformer
+            set_num_threads(EMBED_NUM_THREADS if num_threads is None else num_threads)
+            loaded = SentenceTransformer(
+                EMBEDDING_MODEL_PATH or EMBEDDING_MODEL_NAME,
+                device="cpu",
+                local_files_only=bool(EMBEDDING_MODEL_PATH),
+            )
+            model_load_seconds = time.perf_counter() - started
+            _model = loaded
+    return _model
+
+def is_model_loaded() -> bool:
+    return _model is not None
+
+def warm_up():
+    """Load the model and run one encode so the first real request doesn't pay for lazy init."""
+    get_model().encode("warm up", convert_to_numpy=True)
+
+def model_status() -> Dict[str, Any]:
+    return {
+        "model": EMBEDDING_MODEL_ID,
+        "loaded": is_model_loaded(),
+        "load_seconds": model_load_seconds,
+        "num_threads": EMBED_NUM_THREADS or None,
+    }
 
 def get_embedding(text: str):
     """Generate local embedding for text (list[float])."""
-    return model.encode(text, convert_to_numpy=True).tolist()
+    return get_model().encode(text, convert_to_numpy=True).tolist()
+
+def get_embeddings(texts: Sequence[str], batch_size: int = EMBED_BATCH_SIZE) -> np.ndarray:
+    """Embed many texts in batches; returns a (len(texts), dim) float32 array."""
+    model = get_model()
+    if not texts:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    vectors = model.encode(
+        list(texts),
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def normalize_query(text: str) -> str:
+    """Cache key for a query. MiniLM's tokenizer is uncased, so case and spacing don't change the vector."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded LRU + TTL cache of query embeddings, with an optional SQLite tier
+    that survives restarts. Entries are scoped to the model name, so switching
+    models never serves vectors from the old one.
+    """
+
+    def __init__(self, model_name: str, max_size: int = EMBED_CACHE_SIZE,
+                 ttl: float = EMBED_CACHE_TTL, disk_path: str = EMBED_CACHE_PATH):
+        self.model_name = model_name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._disk = None
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._disk = sqlite3.connect(path, check_same_thread=False)
+        self._disk.execute(
+            "CREATE TABLE IF NOT EXISTS query_embeddings ("
+            " model TEXT NOT NULL, key TEXT NOT NULL, created REAL NOT NULL, vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, key))"
+        )
+        # Vectors from any other model are useless now; drop them
+        self._disk.execute("DELETE FROM query_embeddings WHERE model != ?", (self.model_name,))
+        if self.ttl > 0:
+            self._disk.execute("DELETE FROM query_embeddings WHERE created < ?", (time.time() - self.ttl,))
+        self._disk.commit()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and time.time() - created > self.ttl
+
+    def _disk_get(self, key: str):
+        row = self._disk.execute(
+            "SELECT created, vector FROM query_embeddings WHERE model = ? AND key = ?",
+            (self.model_name, key),
+        ).fetchone()
+        if row is None or self._expired(row[0]):
+            return None
+        return row[0], np.frombuffer(row[1], dtype=np.float32)
+
+    def _disk_put(self, key: str, created: float, vector: np.ndarray):
+        self._disk.execute(
+            "INSERT OR REPLACE INTO query_embeddings (model, key, created, vector) VALUES (?, ?, ?, ?)",
+            (self.model_name, key, created, vector.tobytes()),
+        )
+        self._disk.commit()
+
+    def _put_memory(self, key: str, created: float, vector: np.ndarray):
+        self._entries[key] = (created, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            if self._disk is not None:
+                entry = self._disk_get(key)
+                if entry is not None:
+                    self._put_memory(key, *entry)
+                    self.disk_hits += 1
+                    return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, vector: np.ndarray):
+        if self.max_size <= 0:
+            return
+        vector = np.ascontiguousarray(vector, dtype=np.float32)
+        vector.flags.writeable = False  # shared between callers
+        created = time.time()
+        with self._lock:
+            self._put_memory(key, created, vector)
+            if self._disk is not None:
+                self._disk_put(key, created, vector)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM query_embeddings")
+                self._disk.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "model": self.model_name,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "disk_tier": self._disk is not None,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+query_cache = QueryEmbeddingCache(EMBEDDING_MODEL_ID)
+
+def get_query_embedding(text: str) -> np.ndarray:
+    """Embedding for a search query (read-only float32 vector), served from the cache when possible."""
+    key = normalize_query(text)
+    if query_cache.max_size > 0:
+        cached = query_cache.get(key)
+        if cached is not None:
+            return cached
+    model = get_model()
+    with stage("embed"):
+        vector = model.encode(key, convert_to_numpy=True).astype(np.float32)
+    query_cache.put(key, vector)
+    return vector
+
+def get_query_embeddings(texts: Sequence[str]) -> np.ndarray:
+    """
+    Embeddings for many search queries as a (len(texts), dim) float32 array.
+    Cached vectors are reused and the rest are encoded in one batched call.
+    """
+    keys = [normalize_query(t) for t in texts]
+    vectors: Dict[str, np.ndarray] = {}
+    if query_cache.max_size > 0:
+        for key in dict.fromkeys(keys):
+            cached = query_cache.get(key)
+            if cached is not None:
+                vectors[key] = cached
+    missing = [key for key in dict.fromkeys(keys) if key not in vectors]
+    if missing:
+        get_model()  # a first-call model load isn't part of the embed stage
+        with stage("embed"):
+            encoded = get_embeddings(missing)
+        for key, vector in zip(missing, encoded):
+            vector = vector.copy()  # don't let cache entries pin the whole batch array
+            query_cache.put(key, vector)
+            vectors[key] = vector
+    if not keys:
+        return np.empty((0, get_model().get_sentence_embedding_dimension()), dtype=np.float32)
+    return np.stack([vectors[key] for key in keys])
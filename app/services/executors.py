@@ -0,0 +1,37 @@
+# root: app/services/executors.py
+from __future__ import annotations
+import asyncio
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+# Bounded pools for blocking work called from async handlers. Embedding and
+# FAISS release the GIL, so a few threads saturate the CPU; SQLite calls get
+# their own pool so slow queries can't starve retrieval.
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+DB_EXECUTOR_WORKERS = int(os.getenv("DB_EXECUTOR_WORKERS", "8"))
+
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_EXECUTOR_WORKERS, thread_name_prefix="cpu")
+db_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+
+
+async def run_cpu(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run CPU-bound work (embedding, FAISS search) without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (the request's stage timings) into the worker thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(cpu_executor, partial(context.run, fn, *args, **kwargs))
+
+
+async def run_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a blocking database call without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(db_executor, partial(context.run, fn, *args, **kwargs))
+
+
+def shutdown():
+    cpu_executor.shutdown(wait=False, cancel_futures=True)
+    db_executor.shutdown(wait=False, cancel_futures=True)
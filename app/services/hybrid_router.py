@@ -0,0 +1,49 @@
+# root: app/services/hybrid_router.py
+from __future__ import annotations
+from typing import Optional, Tuple
+from app.services.groq_client import ask_llama3_async, stream_llama3_async
+from app.services.context_builder import Context, build_kb_context, build_rows_context, prompt_tokens
+from app.services.sql_guard import SqlResult
+
+HYBRID_SYSTEM_PROMPT = """
+You are an assistant that answers questions using two sources: rows from the company database and
+passages from the internal knowledge base.
+
+Rules:
+1. Use only the provided DB rows and KB passages; combine them when the question needs both.
+2. If one source is marked unavailable, answer from the other and say briefly what could not be checked.
+3. Keep the answer short and direct; use a compact list when it helps.
+4. Do NOT show SQL or mention databases, queries or retrieval.
+"""
+
+
+def hybrid_user_prompt(question: str, rows: Optional[Context], kb: Optional[Context]) -> str:
+    db_context = rows.text if rows is not None else "(unavailable)"
+    kb_context = kb.text if kb is not None else "(unavailable)"
+    return f"""
+        USER: {question}
+        DB ROWS:
+        {db_context}
+        KB PASSAGES:
+        {kb_context}
+    """
+
+
+def hybrid_contexts(question: str, result: Optional[SqlResult], chunks) -> Tuple[Optional[Context], Optional[Context]]:
+    """Budgeted (rows, kb) contexts for whichever branches returned; the prompt total goes on both."""
+    rows = build_rows_context(result.columns, result.rows, truncated_by_query=result.truncated) if result is not None else None
+    kb = build_kb_context(chunks) if chunks is not None else None
+    total = prompt_tokens(HYBRID_SYSTEM_PROMPT, hybrid_user_prompt(question, rows, kb))
+    for context in (rows, kb):
+        if context is not None:
+            context.prompt_tokens = total
+    return rows, kb
+
+
+async def compose_hybrid_answer_async(question: str, rows: Optional[Context], kb: Optional[Context]) -> str:
+    return await ask_llama3_async(HYBRID_SYSTEM_PROMPT, hybrid_user_prompt(question, rows, kb))
+
+
+async def compose_hybrid_answer_stream(question: str, rows: Optional[Context], kb: Optional[Context]):
+    async for token in stream_llama3_async(HYBRID_SYSTEM_PROMPT, hybrid_user_prompt(question, rows, kb)):
+        yield token
@@ -0,0 +1,118 @@
+# root: app/services/kb_bm25.py
+from __future__ import annotations
+import json
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+import numpy as np
+
+# BM25 parameters: k1 caps term-frequency saturation, b scales length normalisation
+KB_BM25_K1 = float(os.getenv("KB_BM25_K1", "1.2"))
+KB_BM25_B = float(os.getenv("KB_BM25_B", "0.75"))
+BM25_FORMAT_VERSION = 1
+
+# Identifiers stay whole ("pay-1234", "payments-service", "dry-run", "err_timeout",
+# "v2.3.1") and are also indexed by their parts, so both spellings match
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+PART_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its
+me my no not of on or our so that the their them then there these they this to was we
+what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for match in TOKEN_RE.finditer(text.lower()):
+        token = match.group(0)
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        parts = PART_RE.findall(token)
+        if len(parts) > 1:
+            tokens.extend(p for p in parts if p not in STOPWORDS)
+    return tokens
+
+
+@dataclass(frozen=True)
+class BM25Index:
+    """
+    In-memory inverted index over KB chunks. Each term maps to the chunk
+    positions it occurs in and the precomputed BM25 weight at each one, so a
+    query is a handful of vectorised scatter-adds.
+    """
+    chunk_ids: np.ndarray                               # position -> chunk id
+    postings: Dict[str, Tuple[np.ndarray, np.ndarray]]  # term -> (positions, weights)
+    avg_len: float
+    k1: float
+    b: float
+
+    @property
+    def size(self) -> int:
+        return len(self.chunk_ids)
+
+    @property
+    def terms(self) -> int:
+        return len(self.postings)
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Top `k` (chunk id, score) pairs; chunks sharing no term with the query are left out."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        matched = np.flatnonzero(scores)
+        if not len(matched):
+            return []
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(self.chunk_ids[pos]), float(scores[pos])) for pos in top]
+
+
+def build_postings(docs: Iterable[Tuple[int, str]]) -> Dict[str, Any]:
+    """Raw term counts for (chunk id, text) pairs; the serialisable form of the index."""
+    chunk_ids, lengths, postings = [], [], {}
+    for pos, (chunk_id, text) in enumerate(docs):
+        counts = Counter(tokenize(text))
+        chunk_ids.append(int(chunk_id))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term, ([], []))
+            postings[term][0].append(pos)
+            postings[term][1].append(tf)
+    return {"version": BM25_FORMAT_VERSION, "chunk_ids": chunk_ids, "lengths": lengths, "postings": postings}
+
+
+def from_postings(data: Dict[str, Any], k1: float = KB_BM25_K1, b: float = KB_BM25_B) -> BM25Index:
+    if data.get("version") != BM25_FORMAT_VERSION:
+        raise ValueError(f"Unsupported BM25 index version {data.get('version')!r}")
+    lengths = np.asarray(data["lengths"], dtype=np.float32)
+    n = len(lengths)
+    avg_len = float(lengths.mean()) if n else 0.0
+    norm = k1 * (1 - b + b * lengths / avg_len) if n and avg_len else np.full(n, k1, dtype=np.float32)
+    postings = {}
+    for term, (positions, tfs) in data["postings"].items():
+        positions = np.asarray(positions, dtype=np.int64)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        idf = math.log(1 + (n - len(positions) + 0.5) / (len(positions) + 0.5))
+        postings[term] = (positions, (idf * tfs * (k1 + 1) / (tfs + norm[positions])).astype(np.float32))
+    return BM25Index(np.asarray(data["chunk_ids"], dtype=np.int64), postings, avg_len, k1, b)
+
+
+def build_bm25(meta: Sequence[Dict[str, Any]]) -> BM25Index:
+    return from_postings(build_postings((m.get("id", pos), m["text"] or "") for pos, m in enumerate(meta)))
+
+
+def write_postings(data: Dict[str, Any], path: Path):
+    path.write_text(json.dumps(data, separators=(",", ":")), encoding="utf-8")
+
+
+def read_bm25(path: Path) -> BM25Index:
+    return from_postings(json.loads(path.read_text(encoding="utf-8")))
@@ -0,0 +1,184 @@
+# root: app/services/kb_chunker.py
+from __future__ import annotations
+import os
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add the project root to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+from app.services.tokenizer import TokenCounter, embedding_tokenizer_source
+
+# Chunks are sized in embedding-model tokens. MiniLM reads at most 256
+# (including [CLS]/[SEP]); anything past that is cut off at encode time.
+KB_CHUNK_MAX_TOKENS = int(os.getenv("KB_CHUNK_MAX_TOKENS", "240"))
+KB_CHUNK_TOKENIZER = os.getenv("KB_CHUNK_TOKENIZER", "")  # tokenizer.json or hub id (default: the embedding model's)
+# Bumped when chunk boundaries or text change, so incremental builds re-chunk everything
+CHUNKER_VERSION = 2
+HEADING_SEPARATOR = " > "
+
+ATX_HEADING_RE = re.compile(r"^ {0,3}(#{1,6})[ \t]+(.*?)[ \t#]*$")
+SETEXT_RE = re.compile(r"^ {0,3}(=+|-+)[ \t]*$")
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+RULE_RE = re.compile(r"^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$")
+
+_counter: Optional[TokenCounter] = None
+
+
+def token_counter() -> TokenCounter:
+    # Created per process: the indexer chunks files in worker processes
+    global _counter
+    if _counter is None:
+        _counter = TokenCounter(KB_CHUNK_TOKENIZER or embedding_tokenizer_source(allow_hub=True))
+    return _counter
+
+
+def chunk_display_text(heading: str, body: str) -> str:
+    """The text that is embedded, indexed and shown: heading path, then the raw markdown."""
+    return f"{heading}\n{body}" if heading else body
+
+
+@dataclass
+class Block:
+    """A paragraph, list, table or code block: lines [start, end) of one section."""
+    path: Tuple[str, ...]
+    start: int
+    end: int
+    code: bool = False
+
+
+def parse_blocks(lines: List[str]) -> List[Block]:
+    """
+    Split markdown lines into blocks separated by blank lines, tracking the
+    heading path. Fenced code stays one block; headings and rules only end blocks.
+    """
+    blocks: List[Block] = []
+    stack: List[Tuple[int, str]] = []
+    current: Optional[Block] = None
+    fence: Optional[str] = None
+
+    def path():
+        return tuple(title for _, title in stack)
+
+    def set_heading(level: int, title: str):
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, title))
+
+    for i, line in enumerate(lines):
+        text = line.rstrip("\r\n")
+        if fence is not None:
+            current.end = i + 1
+            if text.strip().startswith(fence):
+                fence, current = None, None
+            continue
+        fence_match = FENCE_RE.match(text)
+        if fence_match:
+            fence = fence_match.group(1)[0] * 3
+            current = Block(path(), i, i + 1, code=True)
+            blocks.append(current)
+            continue
+        heading = ATX_HEADING_RE.match(text)
+        if heading:
+            set_heading(len(heading.group(1)), heading.group(2).strip())
+            current = None
+            continue
+        # "Title\n===" / "Title\n---": a one-line paragraph underlined becomes a heading
+        setext = SETEXT_RE.match(text)
+        if setext and current is not None and not current.code and current.end - current.start == 1 and current.end == i:
+            blocks.pop()
+            set_heading(1 if setext.group(1)[0] == "=" else 2, lines[current.start].strip())
+            current = None
+            continue
+        if not text.strip() or RULE_RE.match(text):
+            current = None
+            continue
+        if current is None:
+            current = Block(path(), i, i + 1)
+            blocks.append(current)
+        else:
+            current.end = i + 1
+    return blocks
+
+
+def _split_line(line: str, line_start: int, budget: int, counter: TokenCounter) -> List[Tuple[int, int, int]]:
+    """(start char, end char, tokens) word-boundary pieces of one over-long line."""
+    pieces, start, end, tokens = [], None, None, 0
+    for word in re.finditer(r"\S+", line):
+        cost = counter.count(word.group(0))
+        if start is not None and tokens + cost > budget:
+            pieces.append((start, end, tokens))
+            start, tokens = None, 0
+        if start is None:
+            start = line_start + word.start()
+        end, tokens = line_start + word.end(), tokens + cost
+    if start is not None:
+        pieces.append((start, end, tokens))
+    return pieces
+
+
+def _split_block(lines: List[str], line_starts: List[int], block: Block, budget: int,
+                 counter: TokenCounter) -> List[Tuple[int, int, int]]:
+    """(start char, end char, tokens) pieces of a block, split at lines and, failing that, words."""
+    pieces, start, tokens = [], line_starts[block.start], 0
+    for i in range(block.start, block.end):
+        cost = counter.count(lines[i])
+        if tokens and tokens + cost > budget:
+            pieces.append((start, line_starts[i], tokens))
+            start, tokens = line_starts[i], 0
+        if cost > budget:
+            pieces.extend(_split_line(lines[i], line_starts[i], budget, counter))
+            start = line_starts[i + 1]
+            continue
+        tokens += cost
+    if tokens:
+        pieces.append((start, line_starts[block.end], tokens))
+    return pieces
+
+
+def chunk_markdown(text: str, max_tokens: int = KB_CHUNK_MAX_TOKENS) -> List[Dict[str, Any]]:
+    """
+    Chunk markdown by section. Consecutive blocks of one section are packed up
+    to `max_tokens` (heading path included); chunks never span sections and
+    only split inside a block when the block alone is too long.
+
+    Returns dicts with `heading` (path joined by " > "), `start_byte` /
+    `end_byte` into the UTF-8 source, `tokens` and `text`.
+    """
+    counter = token_counter()
+    lines = text.splitlines(keepends=True)
+    line_starts = [0]
+    for line in lines:
+        line_starts.append(line_starts[-1] + len(line))
+
+    chunks: List[Dict[str, Any]] = []
+
+    def emit(path, start, end):
+        heading = HEADING_SEPARATOR.join(path)
+        body = text[start:end].rstrip()
+        display = chunk_display_text(heading, body)
+        start_byte = len(text[:start].encode("utf-8"))
+        chunks.append({
+            "heading": heading,
+            "start_byte": start_byte,
+            "end_byte": start_byte + len(body.encode("utf-8")),
+            "tokens": counter.count(display),
+            "text": display,
+        })
+
+    span: Optional[List] = None  # [path, start char, end char, tokens]
+    for block in parse_blocks(lines):
+        budget = max_tokens - counter.count(HEADING_SEPARATOR.join(block.path)) - 1
+        for start, end, tokens in _split_block(lines, line_starts, block, budget, counter):
+            if span is not None and span[0] == block.path and span[3] + tokens <= budget:
+                span[2], span[3] = end, span[3] + tokens
+                continue
+            if span is not None:
+                emit(span[0], span[1], span[2])
+            span = [block.path, start, end, tokens]
+    if span is not None:
+        emit(span[0], span[1], span[2])
+    return chunks
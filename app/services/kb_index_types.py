@@ -0,0 +1,118 @@
+# root: app/services/kb_index_types.py
+from __future__ import annotations
+import logging
+import math
+import os
+from typing import Any, Dict, Optional
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Index type used by the indexer: flat | ivf | hnsw | ivfpq
+KB_INDEX_TYPE = os.getenv("KB_INDEX_TYPE", "flat")
+KB_NLIST = int(os.getenv("KB_NLIST", "0"))            # IVF cells (0 = derived from corpus size)
+KB_HNSW_M = int(os.getenv("KB_HNSW_M", "32"))         # HNSW graph degree
+KB_PQ_M = int(os.getenv("KB_PQ_M", "48"))             # PQ sub-quantizers (must divide the dimension)
+KB_PQ_NBITS = int(os.getenv("KB_PQ_NBITS", "8"))
+KB_HNSW_EF_CONSTRUCTION = int(os.getenv("KB_HNSW_EF_CONSTRUCTION", "200"))
+
+# Query-time knobs, overridable per request
+KB_NPROBE = int(os.getenv("KB_NPROBE", "16"))
+KB_EF_SEARCH = int(os.getenv("KB_EF_SEARCH", "64"))
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+
+def default_nlist(n_vectors: int) -> int:
+    """~4*sqrt(N) cells, capped so every cell gets enough training points."""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def index_config(index_type: str = KB_INDEX_TYPE, n_vectors: int = 0, nlist: int = KB_NLIST,
+                 hnsw_m: int = KB_HNSW_M, pq_m: int = KB_PQ_M, pq_nbits: int = KB_PQ_NBITS) -> Dict[str, Any]:
+    """Resolve the requested index type into concrete build parameters for this corpus size."""
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type!r}; expected one of {INDEX_TYPES}")
+    if index_type == "hnsw":
+        return {"type": "hnsw", "hnsw_m": hnsw_m}
+    if index_type in ("ivf", "ivfpq"):
+        nlist = nlist or default_nlist(n_vectors)
+        # k-means wants ~39 points per centroid; PQ codebooks need 2^nbits points each
+        min_train = max(nlist, 39, 2 ** pq_nbits if index_type == "ivfpq" else 0)
+        if n_vectors < min_train:
+            logger.warning(f"Only {n_vectors} vectors; {index_type} needs at least {min_train} to train — using flat.")
+            return {"type": "flat"}
+        if index_type == "ivf":
+            return {"type": "ivf", "nlist": nlist}
+        return {"type": "ivfpq", "nlist": nlist, "pq_m": pq_m, "pq_nbits": pq_nbits}
+    return {"type": "flat"}
+
+
+def make_index(dim: int, config: Dict[str, Any]):
+    """Build an empty, ID-mapped inner-product index for `config` (train it before adding)."""
+    kind = config["type"]
+    if kind == "flat":
+        base = faiss.IndexFlatIP(dim)
+    elif kind == "ivf":
+        base = faiss.index_factory(dim, f"IVF{config['nlist']},Flat", faiss.METRIC_INNER_PRODUCT)
+    elif kind == "hnsw":
+        base = faiss.index_factory(dim, f"HNSW{config['hnsw_m']}", faiss.METRIC_INNER_PRODUCT)
+        base.hnsw.efConstruction = KB_HNSW_EF_CONSTRUCTION
+    elif kind == "ivfpq":
+        pq_m = config["pq_m"]
+        if dim % pq_m:
+            # Sub-quantizers must split the vector evenly; use the nearest smaller divisor
+            pq_m = max(m for m in range(1, pq_m + 1) if dim % m == 0)
+            logger.warning(f"PQ{config['pq_m']} does not divide dimension {dim} — using PQ{pq_m}.")
+        base = faiss.index_factory(
+            dim, f"IVF{config['nlist']},PQ{pq_m}x{config['pq_nbits']}", faiss.METRIC_INNER_PRODUCT
+        )
+    else:
+        raise ValueError(f"Unknown index type {kind!r}")
+    return faiss.IndexIDMap2(base)
+
+
+def train_index(index, vectors: np.ndarray):
+    if not index.is_trained:
+        index.train(vectors)
+
+
+def base_index(index):
+    """Unwrap the ID map to get the underlying ANN index."""
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def index_kind(index) -> str:
+    base = base_index(index)
+    if isinstance(base, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(base, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(base, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def supports_remove(index) -> bool:
+    # HNSW graphs can't drop nodes; callers rebuild instead
+    return index_kind(index) != "hnsw"
+
+
+def search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Per-query search parameters, so concurrent requests can use different knobs on a shared index."""
+    kind = index_kind(index)
+    if kind in ("ivf", "ivfpq"):
+        return faiss.SearchParametersIVF(nprobe=nprobe or KB_NPROBE)
+    if kind == "hnsw":
+        return faiss.SearchParametersHNSW(efSearch=ef_search or KB_EF_SEARCH)
+    return None
+
+
+def search(index, query_vecs: np.ndarray, k: int, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    params = search_params(index, nprobe, ef_search)
+    if params is None:
+        return index.search(query_vecs, k)
+    return index.search(query_vecs, k, params=params)
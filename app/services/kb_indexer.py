@@ -1,17 +1,26 @@
 import os
 import json
+import time
+import hashlib
+import argparse
 import faiss
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-import markdown
-from bs4 import BeautifulSoup
 import sys
 
 # Add the project root to the Python path
 root_dir = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(root_dir))
 
-from app.services.embeddings import get_embedding  # Local embeddings
+from app.services.embeddings import get_embeddings, get_model, EMBED_BATCH_SIZE, EMBED_NUM_THREADS  # Local embeddings
+from app.services.kb_index_types import (
+    INDEX_TYPES, KB_INDEX_TYPE, KB_NLIST, KB_HNSW_M, KB_PQ_M, KB_PQ_NBITS,
+    index_config, make_index, train_index, index_kind, supports_remove,
+)
+from app.services.kb_bm25 import build_postings, write_postings
+from app.services.kb_chunker import CHUNKER_VERSION, KB_CHUNK_MAX_TOKENS, chunk_markdown, token_counter
+from app.services.kb_meta import ChunkMeta, write_meta
 
 # Paths
 KB_DIR = root_dir / "kb"
@@ -19,77 +28,227 @@ DATA_DIR = root_dir / "data"
 DATA_DIR.mkdir(exist_ok=True)
 
 INDEX_PATH = DATA_DIR / "kb_index.faiss"
-META_PATH = DATA_DIR / "kb_meta.json"
-
-CHUNK_SIZE = 500  # words
-CHUNK_OVERLAP = 50
-
-def strip_html(text: str) -> str:
-    """Convert markdown to plain text without HTML tags."""
-    html = markdown.markdown(text)
-    soup = BeautifulSoup(html, "html.parser")
-    return soup.get_text()
-
-def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP):
-    """Chunk text into overlapping pieces."""
-    words = text.split()
-    chunks = []
-    start = 0
-    while start < len(words):
-        end = min(start + size, len(words))
-        chunk = " ".join(words[start:end])
-        chunks.append((start, end, chunk))
-        start += size - overlap
-    return chunks
-
-def build_index():
-    kb_files = list(KB_DIR.glob("*.md"))
+META_PATH = DATA_DIR / "kb_meta.db"  # chunk offsets + headings; text is read from kb/ on demand
+MANIFEST_PATH = DATA_DIR / "kb_manifest.json"  # per-file content hash -> chunk ids
+BM25_PATH = DATA_DIR / "kb_bm25.json"  # inverted index for lexical search, same chunk ids
+
+# Worker processes for markdown -> text (0 = one per CPU)
+KB_PREPROCESS_WORKERS = int(os.getenv("KB_PREPROCESS_WORKERS", "0"))
+
+def prepare_file(path: str, max_tokens: int = KB_CHUNK_MAX_TOKENS):
+    """Read and chunk one markdown file. Runs in a worker process."""
+    file = Path(path)
+    raw = file.read_bytes()
+    # Hash the bytes that were chunked, so recorded offsets always match the recorded hash
+    digest = hashlib.sha256(raw).hexdigest()
+    text = raw.decode("utf-8")
+    if not text.strip():
+        return file.name, digest, len(raw), []
+    return file.name, digest, len(raw), chunk_markdown(text, max_tokens)
+
+def iter_chunks(kb_files, workers: int = KB_PREPROCESS_WORKERS, sources=None, max_tokens: int = KB_CHUNK_MAX_TOKENS):
+    """
+    Yield (file_name, chunk) for every file, preprocessing files in parallel.
+    `sources` (if given) is filled with file name -> (sha256, size) as files are read.
+    """
+    max_workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        # map keeps file order stable so reindexing the same KB gives the same chunk order
+        paths = [str(f) for f in kb_files]
+        for file_name, digest, size, chunks in pool.map(prepare_file, paths, [max_tokens] * len(paths), chunksize=8):
+            if sources is not None:
+                sources[file_name] = (digest, size)
+            if not chunks:
+                print(f"Skipping empty file: {file_name}")
+                continue
+            for chunk in chunks:
+                yield file_name, chunk
+
+def embed_chunks(chunk_iter, batch_size: int = EMBED_BATCH_SIZE, num_threads: int = EMBED_NUM_THREADS):
+    """Stream chunks through the batched encoder. Returns (meta, float32 embeddings, failed file names)."""
     meta = []
-    embeddings = []
-
-    for file in kb_files:
-        raw_text = file.read_text(encoding="utf-8").strip()
-        if not raw_text:
-            print(f"Skipping empty file: {file.name}")
-            continue
-        
-        clean_text = strip_html(raw_text)
-        chunks = chunk_text(clean_text)
-
-        for start, end, chunk in chunks:
-            try:
-                embedding = get_embedding(chunk)
-                embeddings.append(embedding)
-                meta.append({
-                    "file": file.name,
-                    "start_word": start,
-                    "end_word": end,
-                    "text": chunk
-                })
-            except Exception as e:
-                print(f"Error embedding chunk from {file.name}: {e}")
-
-    if not embeddings:
+    parts = []
+    pending = []
+    failed = set()
+
+    def flush():
+        try:
+            get_model(num_threads)  # the thread cap only takes effect when this call loads the model
+            parts.append(get_embeddings([m["text"] for m in pending], batch_size=batch_size))
+            meta.extend(pending)
+        except Exception as e:
+            print(f"Error embedding batch of {len(pending)} chunks: {e}")
+            failed.update(m["file"] for m in pending)
+        pending.clear()
+
+    for file_name, chunk in chunk_iter:
+        pending.append({"file": file_name, **chunk})
+        if len(pending) >= batch_size:
+            flush()
+    if pending:
+        flush()
+
+    if not parts:
+        return meta, None, failed
+    return meta, np.concatenate(parts, axis=0), failed
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+def chunker_config(max_tokens: int = KB_CHUNK_MAX_TOKENS):
+    return {"version": CHUNKER_VERSION, "max_tokens": max_tokens, "tokenizer": token_counter().name}
+
+def load_previous_index(max_tokens: int = KB_CHUNK_MAX_TOKENS):
+    """Load the last build for incremental updates, or None if it can't be reused."""
+    if not (INDEX_PATH.exists() and META_PATH.exists() and MANIFEST_PATH.exists()):
+        return None
+    manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    if manifest.get("chunker") != chunker_config(max_tokens):
+        print("Chunking settings changed since the last build — doing a full rebuild.")
+        return None
+    index = faiss.read_index(str(INDEX_PATH))
+    if not isinstance(index, faiss.IndexIDMap2):
+        # Built before chunk ids existed; positions can't survive deletions
+        return None
+    chunk_meta = ChunkMeta.from_sqlite(META_PATH, KB_DIR)
+    meta = [chunk_meta.get(i, with_text=False) for i in chunk_meta.ids()]
+    manifest_ids = {i for entry in manifest["files"].values() for i in entry["ids"]}
+    if manifest_ids != {m["id"] for m in meta} or index.ntotal != len(meta):
+        print("Manifest does not match the saved index — doing a full rebuild.")
+        return None
+    return manifest, index, meta, chunk_meta
+
+def previous_next_id() -> int:
+    """First unused chunk id. Ids are never reused, not even by a full rebuild,
+    so files from two different builds can't hold the same set of ids."""
+    try:
+        return int(json.loads(MANIFEST_PATH.read_text(encoding="utf-8")).get("next_id", 0))
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+def write_index(index, meta, manifest, postings):
+    # Write to temp files and rename so a running API (which watches these
+    # paths) never reads a partially written file. The renames aren't atomic
+    # as a group; the API's KB store only swaps in files whose chunk ids agree.
+    # Manifest goes last so an interrupted run is detected as a mismatch next time.
+    tmp_index = INDEX_PATH.with_suffix(".faiss.tmp")
+    tmp_meta = META_PATH.with_suffix(".db.tmp")
+    tmp_bm25 = BM25_PATH.with_suffix(".json.tmp")
+    tmp_manifest = MANIFEST_PATH.with_suffix(".json.tmp")
+    faiss.write_index(index, str(tmp_index))
+    files = {name: (entry["hash"], entry["size"]) for name, entry in manifest["files"].items()}
+    write_meta(tmp_meta, meta, files, {"chunker": manifest["chunker"], "index_type": manifest["index_type"]})
+    write_postings(postings, tmp_bm25)
+    tmp_manifest.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp_index, INDEX_PATH)
+    os.replace(tmp_meta, META_PATH)
+    os.replace(tmp_bm25, BM25_PATH)
+    os.replace(tmp_manifest, MANIFEST_PATH)
+
+def build_index(batch_size: int = EMBED_BATCH_SIZE, num_threads: int = EMBED_NUM_THREADS,
+                workers: int = KB_PREPROCESS_WORKERS, incremental: bool = False,
+                index_type: str = KB_INDEX_TYPE, max_tokens: int = KB_CHUNK_MAX_TOKENS, **index_options):
+    """
+    Build (or incrementally update) the KB index.
+
+    `index_type` is one of flat | ivf | hnsw | ivfpq; `index_options` are passed
+    to `index_config` (nlist, hnsw_m, pq_m, pq_nbits). Trained index types are
+    trained on the full corpus embeddings. `max_tokens` caps each chunk in
+    embedding-model tokens.
+    """
+    started = time.perf_counter()
+    kb_files = sorted(KB_DIR.glob("*.md"))
+    hashes = {f.name: file_hash(f) for f in kb_files}
+
+    previous = load_previous_index(max_tokens) if incremental else None
+    if previous is not None and previous[0].get("index_type", "flat") != index_type:
+        print(f"Saved index is {previous[0].get('index_type', 'flat')}, requested {index_type} — doing a full rebuild.")
+        previous = None
+    if previous is not None and not supports_remove(previous[1]):
+        changed = [n for n, e in previous[0]["files"].items() if hashes.get(n) != e["hash"]]
+        if changed:
+            print(f"{index_kind(previous[1])} indexes can't remove vectors — doing a full rebuild.")
+            previous = None
+    if previous is None:
+        if incremental:
+            print("No reusable index found — doing a full rebuild.")
+        manifest = {"next_id": previous_next_id(), "index_type": index_type, "chunker": chunker_config(max_tokens), "files": {}}
+        index, meta, previous_meta = None, [], None
+    else:
+        manifest, index, meta, previous_meta = previous
+
+    old_files = manifest["files"]
+    to_embed = [f for f in kb_files if old_files.get(f.name, {}).get("hash") != hashes[f.name]]
+    stale = [name for name in old_files if name not in hashes or old_files[name]["hash"] != hashes[name]]
+
+    # Drop vectors of deleted and changed files
+    stale_ids = [i for name in stale for i in old_files.pop(name)["ids"]]
+    if stale_ids:
+        index.remove_ids(np.array(stale_ids, dtype="int64"))
+        dropped = set(stale_ids)
+        meta = [m for m in meta if m["id"] not in dropped]
+    reused = len(meta)
+
+    sources = {}
+    new_meta, embeddings_np, failed = embed_chunks(iter_chunks(to_embed, workers, sources, max_tokens),
+                                                   batch_size, num_threads)
+
+    if embeddings_np is not None:
+        faiss.normalize_L2(embeddings_np)
+        ids = np.arange(manifest["next_id"], manifest["next_id"] + len(new_meta), dtype="int64")
+        manifest["next_id"] += len(new_meta)
+        for chunk_id, m in zip(ids, new_meta):
+            m["id"] = int(chunk_id)
+        if index is None:
+            # Build FAISS index; ID-mapped so single files can be removed later
+            config = index_config(index_type, len(embeddings_np), **index_options)
+            print(f"Building {config['type']} index: {config}")
+            index = make_index(embeddings_np.shape[1], config)
+            train_index(index, embeddings_np)
+        index.add_with_ids(embeddings_np, ids)
+        meta.extend(new_meta)
+
+    for f in to_embed:
+        if f.name in failed:
+            continue  # leave out of the manifest so the next run retries it
+        digest, size = sources[f.name]
+        old_files[f.name] = {"hash": digest, "size": size, "ids": [m["id"] for m in new_meta if m["file"] == f.name]}
+
+    if index is None:
         print("No embeddings generated — index not created.")
         return
 
-    # Convert to numpy array
-    embeddings_np = np.array(embeddings, dtype="float32")
-    faiss.normalize_L2(embeddings_np)
+    # The BM25 postings come from the same chunk texts, so the two indexes
+    # always cover the same chunk ids. Counting terms is cheap next to
+    # embedding, so the inverted index is rebuilt in full on every run;
+    # reused chunks read their text back from the unchanged source files.
+    postings = build_postings((m["id"], m["text"] if "text" in m else previous_meta.text(m["id"])) for m in meta)
 
-    # Build FAISS index
-    dim = embeddings_np.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    index.add(embeddings_np)
+    write_index(index, meta, manifest, postings)
 
-    # Save index & metadata
-    faiss.write_index(index, str(INDEX_PATH))
-    META_PATH.write_text(json.dumps(meta, indent=2), encoding="utf-8")
-
-    print(f"Indexed {len(meta)} chunks from {len(kb_files)} files.")
+    print(f"Indexed {len(meta)} chunks from {len(kb_files)} files in {time.perf_counter() - started:.2f}s "
+          f"(reused {reused}, recomputed {len(new_meta)}, removed {len(stale_ids)}; "
+          f"largest chunk {max((m['tokens'] for m in meta), default=0)} tokens; {len(postings['postings'])} BM25 terms).")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the KB FAISS and BM25 indexes from kb/*.md")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="chunks per encode call")
+    parser.add_argument("--threads", type=int, default=EMBED_NUM_THREADS, help="torch CPU threads (0 = default)")
+    parser.add_argument("--workers", type=int, default=KB_PREPROCESS_WORKERS, help="markdown preprocessing processes (0 = CPU count)")
+    parser.add_argument("--incremental", action="store_true", help="only re-embed files whose content changed")
+    parser.add_argument("--max-tokens", type=int, default=KB_CHUNK_MAX_TOKENS, help="chunk size cap in embedding-model tokens")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=KB_INDEX_TYPE, help="FAISS index type")
+    parser.add_argument("--nlist", type=int, default=KB_NLIST, help="IVF cells (0 = derived from corpus size)")
+    parser.add_argument("--hnsw-m", type=int, default=KB_HNSW_M, help="HNSW graph degree")
+    parser.add_argument("--pq-m", type=int, default=KB_PQ_M, help="IVF-PQ sub-quantizers")
+    parser.add_argument("--pq-nbits", type=int, default=KB_PQ_NBITS, help="IVF-PQ bits per code")
+    args = parser.parse_args()
+
     print("Knowledge Base Directory:", KB_DIR)
     print("Index Path:", INDEX_PATH)
     print("Meta Path:", META_PATH)
-    build_index()
+    print("Manifest Path:", MANIFEST_PATH)
+    print("BM25 Path:", BM25_PATH)
+    build_index(batch_size=args.batch_size, num_threads=args.threads, workers=args.workers,
+                incremental=args.incremental, index_type=args.index_type, max_tokens=args.max_tokens, nlist=args.nlist,
+                hnsw_m=args.hnsw_m, pq_m=args.pq_m, pq_nbits=args.pq_nbits)
@@ -0,0 +1,170 @@
+# root: app/services/kb_meta.py
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Add the project root to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+from app.services.kb_chunker import chunk_display_text
+
+logger = logging.getLogger(__name__)
+
+# Source files kept in memory for lazy chunk text (bytes, across all files)
+KB_TEXT_CACHE_BYTES = int(os.getenv("KB_TEXT_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+SCHEMA = """
+CREATE TABLE files (name TEXT PRIMARY KEY, sha256 TEXT NOT NULL, size INTEGER NOT NULL);
+CREATE TABLE chunks (
+    id INTEGER PRIMARY KEY,
+    file TEXT NOT NULL,
+    start_byte INTEGER NOT NULL,
+    end_byte INTEGER NOT NULL,
+    tokens INTEGER NOT NULL,
+    heading TEXT NOT NULL
+);
+CREATE TABLE info (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+# Row layout held in memory per chunk
+ROW_FIELDS = ("file", "start_byte", "end_byte", "tokens", "heading")
+
+
+def write_meta(path: Path, chunks: Iterable[Dict[str, Any]], files: Dict[str, Tuple[str, int]], info: Dict[str, Any]):
+    """Write the sidecar: chunk offsets (no text), source file hashes and build info."""
+    if path.exists():
+        path.unlink()
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany(
+            "INSERT INTO chunks (id, file, start_byte, end_byte, tokens, heading) VALUES (?, ?, ?, ?, ?, ?)",
+            ((c["id"], c["file"], c["start_byte"], c["end_byte"], c["tokens"], c["heading"]) for c in chunks),
+        )
+        conn.executemany("INSERT INTO files (name, sha256, size) VALUES (?, ?, ?)",
+                         ((name, digest, size) for name, (digest, size) in files.items()))
+        conn.executemany("INSERT INTO info (key, value) VALUES (?, ?)",
+                         ((key, json.dumps(value)) for key, value in info.items()))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class SourceFiles:
+    """
+    LRU of raw KB source files, checked against the hashes recorded at index
+    time. A file that changed or disappeared since then reads as None: its
+    chunk offsets no longer point at the indexed text.
+    """
+
+    def __init__(self, kb_dir: Path, hashes: Dict[str, str], max_bytes: int = KB_TEXT_CACHE_BYTES):
+        self.kb_dir = kb_dir
+        self.hashes = hashes
+        self.max_bytes = max_bytes
+        self._files: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.stale: set = set()
+
+    def read(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._files.get(name)
+            if data is not None:
+                self._files.move_to_end(name)
+                return data
+        if name in self.stale:
+            return None
+        try:
+            data = (self.kb_dir / name).read_bytes()
+        except FileNotFoundError:
+            data = None
+        if data is None or hashlib.sha256(data).hexdigest() != self.hashes.get(name):
+            # Edited or deleted since the last index build; its chunks are left out until the indexer reruns
+            self.stale.add(name)
+            logger.warning("KB source %s changed since it was indexed; its chunks are skipped until reindexed", name)
+            return None
+        with self._lock:
+            if name not in self._files:
+                self._files[name] = data
+                self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._files) > 1:
+                _, evicted = self._files.popitem(last=False)
+                self._bytes -= len(evicted)
+        return data
+
+
+class ChunkMeta:
+    """
+    Chunk metadata by chunk id. The sidecar holds only offsets, so chunk text
+    is sliced out of the source files on access; legacy kb_meta.json builds
+    carry their text inline. Chunks of a source file that changed since the
+    build have no text (None).
+    """
+
+    def __init__(self, rows: Dict[int, Tuple], sources: Optional[SourceFiles] = None,
+                 texts: Optional[Dict[int, str]] = None, info: Optional[Dict[str, Any]] = None):
+        self.rows = rows
+        self.sources = sources
+        self.texts = texts
+        self.info = info or {}
+
+    @classmethod
+    def from_sqlite(cls, path: Path, kb_dir: Path) -> "ChunkMeta":
+        # Read-only and closed straight away: the indexer replaces this file while the API runs
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = {row[0]: row[1:] for row in conn.execute(
+                "SELECT id, file, start_byte, end_byte, tokens, heading FROM chunks ORDER BY id")}
+            hashes = {name: digest for name, digest in conn.execute("SELECT name, sha256 FROM files")}
+            info = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM info")}
+        finally:
+            conn.close()
+        return cls(rows, sources=SourceFiles(kb_dir, hashes), info=info)
+
+    @classmethod
+    def from_json(cls, path: Path) -> "ChunkMeta":
+        meta = json.loads(path.read_text(encoding="utf-8"))
+        rows, texts = {}, {}
+        for pos, m in enumerate(meta):
+            chunk_id = m.get("id", pos)  # older flat builds are addressed by position
+            rows[chunk_id] = (m["file"], m.get("start_byte"), m.get("end_byte"), m.get("tokens"), m.get("heading", ""))
+            texts[chunk_id] = m["text"]
+        return cls(rows, texts=texts, info={"format": "json"})
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, chunk_id: int) -> bool:
+        return int(chunk_id) in self.rows
+
+    def ids(self) -> List[int]:
+        return list(self.rows)
+
+    def text(self, chunk_id: int) -> Optional[str]:
+        chunk_id = int(chunk_id)
+        if self.texts is not None:
+            return self.texts[chunk_id]
+        file, start, end, _, heading = self.rows[chunk_id]
+        data = self.sources.read(file)
+        if data is None:
+            return None
+        body = data[start:end].decode("utf-8", errors="replace")
+        return chunk_display_text(heading, body)
+
+    def get(self, chunk_id: int, with_text: bool = True) -> Dict[str, Any]:
+        chunk_id = int(chunk_id)
+        chunk = {"id": chunk_id, **dict(zip(ROW_FIELDS, self.rows[chunk_id]))}
+        if with_text:
+            chunk["text"] = self.text(chunk_id)
+        return chunk
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for chunk_id in self.rows:
+            yield self.get(chunk_id)
@@ -0,0 +1,157 @@
+# root: app/services/kb_reranker.py
+from __future__ import annotations
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Second-stage reranking of retrieved chunks with a local cross-encoder (off by default)
+KB_RERANK = os.getenv("KB_RERANK", "0") == "1"
+KB_RERANK_MODEL_NAME = os.getenv("KB_RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+KB_RERANK_MODEL_PATH = os.getenv("KB_RERANK_MODEL_PATH", "")  # load from a local directory instead of the hub
+KB_RERANK_CANDIDATES = int(os.getenv("KB_RERANK_CANDIDATES", "30"))  # first-stage results rescored
+KB_RERANK_BATCH_SIZE = int(os.getenv("KB_RERANK_BATCH_SIZE", "16"))
+KB_RERANK_MAX_LENGTH = int(os.getenv("KB_RERANK_MAX_LENGTH", "256"))  # query + chunk tokens per pair
+# Per-request budget (ms); when the next batch would overrun it, the first-stage order is kept
+KB_RERANK_BUDGET_MS = float(os.getenv("KB_RERANK_BUDGET_MS", "150"))
+
+_model = None
+_model_lock = threading.Lock()
+_loading: Optional[threading.Thread] = None
+model_load_seconds: Optional[float] = None
+
+# Process-wide counters and the running per-pair cost used to predict the next batch
+_stats_lock = threading.Lock()
+_stats: Dict[str, Any] = {"reranked": 0, "fallbacks": {}, "pairs_scored": 0, "rerank_ms_total": 0.0}
+_ms_per_pair: Optional[float] = None
+
+
+def get_model():
+    """Return the shared CrossEncoder, loading it on first call."""
+    global _model, model_load_seconds
+    if _model is not None:
+        return _model
+    with _model_lock:
+        if _model is None:
+            logger.info(f"Loading rerank model {KB_RERANK_MODEL_PATH or KB_RERANK_MODEL_NAME}")
+            started = time.perf_counter()
+            from sentence_transformers import CrossEncoder
+            loaded = CrossEncoder(
+                KB_RERANK_MODEL_PATH or KB_RERANK_MODEL_NAME,
+                device="cpu",
+                max_length=KB_RERANK_MAX_LENGTH,
+                local_files_only=bool(KB_RERANK_MODEL_PATH),
+            )
+            model_load_seconds = time.perf_counter() - started
+            _model = loaded
+    return _model
+
+
+def is_model_loaded() -> bool:
+    return _model is not None
+
+
+def warm_up():
+    """Load the model and score one pair, which also seeds the batch-cost estimate."""
+    global _ms_per_pair
+    model = get_model()
+    started = time.perf_counter()
+    model.predict([("warm up", "warm up")], show_progress_bar=False)
+    _ms_per_pair = (time.perf_counter() - started) * 1000
+
+
+def load_in_background():
+    """Start loading the model on a daemon thread (no-op if loaded or already loading)."""
+    global _loading
+    with _model_lock:
+        if _model is not None or (_loading is not None and _loading.is_alive()):
+            return
+        _loading = threading.Thread(target=_safe_warm_up, name="rerank-warmup", daemon=True)
+        _loading.start()
+
+
+def _safe_warm_up():
+    try:
+        warm_up()
+    except Exception as e:
+        logger.error(f"Rerank model warm-up failed: {e}")
+
+
+def _record(outcome: str, pairs: int, ms: float):
+    with _stats_lock:
+        if outcome == "reranked":
+            _stats["reranked"] += 1
+        else:
+            _stats["fallbacks"][outcome] = _stats["fallbacks"].get(outcome, 0) + 1
+        _stats["pairs_scored"] += pairs
+        _stats["rerank_ms_total"] += ms
+
+
+def rerank(query: str, candidates: Sequence[Dict[str, Any]], k: int,
+           budget_ms: float = KB_RERANK_BUDGET_MS) -> Tuple[List[Dict[str, Any]], str]:
+    """
+    Rescore first-stage `candidates` (best first) with the cross-encoder and
+    return the top `k` plus the outcome: "reranked", or why the first-stage
+    order was kept ("skipped" for fewer than two candidates, "model_loading",
+    "budget", "error").
+
+    Scoring runs in batches; before each one the elapsed time plus the
+    predicted batch cost is checked against `budget_ms`, so a slow request
+    stops early instead of overrunning.
+    """
+    global _ms_per_pair
+    if len(candidates) <= 1:
+        return list(candidates[:k]), "skipped"
+    if _model is None:
+        # Never load a model inside a request; start loading and serve the first-stage order
+        load_in_background()
+        _record("model_loading", 0, 0.0)
+        return list(candidates[:k]), "model_loading"
+
+    started = time.perf_counter()
+    scores: List[float] = []
+    outcome = "reranked"
+    try:
+        for i in range(0, len(candidates), KB_RERANK_BATCH_SIZE):
+            batch = candidates[i:i + KB_RERANK_BATCH_SIZE]
+            elapsed = (time.perf_counter() - started) * 1000
+            if budget_ms and _ms_per_pair is not None and elapsed + _ms_per_pair * len(batch) > budget_ms:
+                outcome = "budget"
+                break
+            batch_started = time.perf_counter()
+            scores.extend(float(s) for s in _model.predict(
+                [(query, c["text"]) for c in batch], batch_size=len(batch), show_progress_bar=False))
+            per_pair = (time.perf_counter() - batch_started) * 1000 / len(batch)
+            # Smoothed so one slow batch (GC, contention) doesn't disable reranking for everyone
+            _ms_per_pair = per_pair if _ms_per_pair is None else 0.8 * _ms_per_pair + 0.2 * per_pair
+    except Exception as e:
+        logger.error(f"Reranking failed, keeping first-stage order: {e}")
+        outcome = "error"
+    ms = (time.perf_counter() - started) * 1000
+    _record(outcome, len(scores), ms)
+    if outcome != "reranked":
+        return list(candidates[:k]), outcome
+
+    order = sorted(range(len(candidates)), key=lambda i: -scores[i])[:k]
+    return [{**candidates[i], "rerank_score": scores[i], "first_stage_rank": i + 1} for i in order], outcome
+
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        runs = _stats["reranked"] + sum(_stats["fallbacks"].values())
+        return {
+            "enabled": KB_RERANK,
+            "model": KB_RERANK_MODEL_PATH or KB_RERANK_MODEL_NAME,
+            "loaded": is_model_loaded(),
+            "load_seconds": model_load_seconds,
+            "candidates": KB_RERANK_CANDIDATES,
+            "budget_ms": KB_RERANK_BUDGET_MS,
+            "ms_per_pair": round(_ms_per_pair, 3) if _ms_per_pair is not None else None,
+            "reranked": _stats["reranked"],
+            "fallbacks": dict(_stats["fallbacks"]),
+            "pairs_scored": _stats["pairs_scored"],
+            "avg_rerank_ms": round(_stats["rerank_ms_total"] / runs, 3) if runs else None,
+        }
@@ -1,32 +1,120 @@
-import json
-import faiss
+import os
 import numpy as np
+import faiss
 from pathlib import Path
 import sys
 # Add the project root to the Python path
 root_dir = Path(__file__).resolve().parent.parent.parent
 sys.path.append(str(root_dir))
-from app.services.embeddings import get_embedding  # Local embeddings
-
-DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data"
-INDEX_FILE = DATA_DIR / "kb_index.faiss"
-META_FILE = DATA_DIR / "kb_meta.json"
-
-def search_kb(query:str, k:int=5):
-    index = faiss.read_index(str(INDEX_FILE))
-    meta = json.loads(META_FILE.read_text(encoding="utf-8"))
-    
-    query_vec = np.array([get_embedding(query)], dtype=np.float32)
-    faiss.normalize_L2(query_vec)
-    
-    scores, idxs = index.search(query_vec, k)
-    
+from app.services.embeddings import get_query_embeddings  # Local embeddings (cached)
+from app.services.kb_store import kb_store
+from app.services.kb_index_types import search as index_search
+from app.services.timings import stage
+from app.services.kb_reranker import KB_RERANK, KB_RERANK_BUDGET_MS, KB_RERANK_CANDIDATES, rerank as rerank_chunks
+
+SEARCH_MODES = ("dense", "bm25", "hybrid")
+# dense = FAISS only, bm25 = inverted index only, hybrid = reciprocal rank fusion of both.
+# Dense stays the default so `score` keeps meaning cosine similarity; opt in with KB_SEARCH_MODE=hybrid
+KB_SEARCH_MODE = os.getenv("KB_SEARCH_MODE", "dense")
+KB_RRF_K = int(os.getenv("KB_RRF_K", "60"))                         # rank damping; higher flattens the fusion
+KB_FUSION_CANDIDATES = int(os.getenv("KB_FUSION_CANDIDATES", "50"))  # per-ranker depth fed into the fusion
+
+
+def _chunk_result(snapshot, chunk_id, score, **extra):
+    chunk_meta = snapshot.chunk(chunk_id)
+    if chunk_meta["text"] is None:
+        return None  # source file changed since indexing (see SourceFiles)
+    return {
+        "file": chunk_meta["file"],
+        "heading": chunk_meta["heading"],
+        "score": float(score),
+        "text": chunk_meta["text"],
+        **extra
+    }
+
+
+def _present(results):
+    return [r for r in results if r is not None]
+
+
+def _dense_ids(snapshot, queries, k, nprobe=None, ef_search=None):
+    """Top-`k` (chunk id, score) lists for each query: one encode call, one multi-vector FAISS search."""
+    query_vecs = np.array(get_query_embeddings(queries), dtype=np.float32)
+    faiss.normalize_L2(query_vecs)
+
+    with stage("faiss_search"):
+        scores, idxs = index_search(snapshot.index, query_vecs, k, nprobe=nprobe, ef_search=ef_search)
+    # FAISS pads with -1 when k exceeds the number of indexed chunks
+    return [[(int(idx), float(score)) for score, idx in zip(row_scores, row_idxs) if idx >= 0]
+            for row_scores, row_idxs in zip(scores, idxs)]
+
+
+def rrf_fuse(rankings, k, rrf_k=KB_RRF_K):
+    """
+    Reciprocal rank fusion: each ranker contributes 1 / (rrf_k + rank) per chunk.
+    `rankings` maps a ranker name to its ordered (chunk id, score) list; returns
+    the top `k` as (chunk id, fused score, {ranker: rank}).
+    """
+    fused, ranks = {}, {}
+    for name, ranking in rankings.items():
+        for rank, (chunk_id, _) in enumerate(ranking, start=1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+            ranks.setdefault(chunk_id, {})[name] = rank
+    top = sorted(fused, key=lambda chunk_id: -fused[chunk_id])[:k]
+    return [(chunk_id, fused[chunk_id], ranks[chunk_id]) for chunk_id in top]
+
+
+def search_kb(query:str, k:int=5, nprobe:int=None, ef_search:int=None, mode:str=None,
+              rerank:bool=None, rerank_budget_ms:float=None):
+    """
+    Search the KB. `mode` is dense | bm25 | hybrid (default KB_SEARCH_MODE);
+    `nprobe` (IVF) and `ef_search` (HNSW) trade dense recall for latency.
+    Hybrid scores are fused RRF scores, not cosine similarities.
+
+    With `rerank` (default KB_RERANK) the first stage fetches
+    KB_RERANK_CANDIDATES chunks and a cross-encoder picks the top `k`, within
+    `rerank_budget_ms`; past the budget the first-stage order is kept.
+    """
+    return search_kb_batch([query], k, nprobe, ef_search, mode, rerank, rerank_budget_ms)[0]
+
+
+def search_kb_batch(queries, k:int=5, nprobe:int=None, ef_search:int=None, mode:str=None,
+                    rerank:bool=None, rerank_budget_ms:float=None):
+    """
+    `search_kb` for many queries at once, results in input order. Dense
+    retrieval embeds all queries in one model call and runs one FAISS search;
+    reranking (when on) is per query, each within its own budget.
+    """
+    rerank = KB_RERANK if rerank is None else rerank
+    if not rerank:
+        return _first_stage(queries, k, nprobe, ef_search, mode)
+    budget = KB_RERANK_BUDGET_MS if rerank_budget_ms is None else rerank_budget_ms
+    candidates = _first_stage(queries, max(k, KB_RERANK_CANDIDATES), nprobe, ef_search, mode)
+    with stage("rerank"):
+        return [rerank_chunks(query, found, k, budget)[0] for query, found in zip(queries, candidates)]
+
+
+def _first_stage(queries, k, nprobe, ef_search, mode):
+    mode = mode or KB_SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}; expected one of {SEARCH_MODES}")
+    # Indexes and metadata stay resident in the shared store; no disk I/O per query
+    snapshot = kb_store.snapshot()
+
+    if mode == "dense":
+        return [_present(_chunk_result(snapshot, i, s) for i, s in ids)
+                for ids in _dense_ids(snapshot, queries, k, nprobe, ef_search)]
+    if mode == "bm25":
+        with stage("bm25_search"):
+            found = [snapshot.bm25.search(query, k) for query in queries]
+        return [_present(_chunk_result(snapshot, i, s) for i, s in ids) for ids in found]
+
+    depth = max(k, KB_FUSION_CANDIDATES)
+    dense = _dense_ids(snapshot, queries, depth, nprobe, ef_search)
+    with stage("bm25_search"):
+        keyword = [snapshot.bm25.search(query, depth) for query in queries]
     results = []
-    for score, idx in zip(scores[0], idxs[0]):
-        chunk_meta = meta[idx]
-        results.append({
-            "file": chunk_meta["file"],
-            "score": float(score),
-            "text": chunk_meta["text"]
-        })
-    return results
\ No newline at end of file
+    for dense_ids, bm25_ids in zip(dense, keyword):
+        rankings = {"dense": dense_ids, "bm25": bm25_ids}
+        results.append(_present(_chunk_result(snapshot, i, s, ranks=r) for i, s, r in rrf_fuse(rankings, k)))
+    return results
@@ -1,21 +1,66 @@
 # root: app/services/kb_router.py
 from __future__ import annotations
+from typing import Tuple
 from fastapi import Query
 from app.services.kb_retriever import search_kb
-from app.services.groq_client import ask_llama3
+from app.services.groq_client import ask_llama3, ask_llama3_async, stream_llama3_async
+from app.services.executors import run_cpu
+from app.services.timings import Timings, current_timings
+from app.services.context_builder import Context, build_kb_context, prompt_tokens
+
+KB_SYSTEM_PROMPT = "You are a helpful assistant that answers questions using the provided context."
+
+
+def kb_user_prompt(q: str, context: Context) -> str:
+    return f"Answer the following question using ONLY the provided context:\n\nContext:\n{context.text}\n\nQuestion: {q}"
+
+
+def prepare_kb_prompt(q: str, chunks) -> Tuple[str, Context]:
+    """Dedupe and pack `chunks` into the token budget; returns (user prompt, context)."""
+    context = build_kb_context(chunks)
+    prompt = kb_user_prompt(q, context)
+    context.prompt_tokens = prompt_tokens(KB_SYSTEM_PROMPT, prompt)
+    return prompt, context
 
 
 def answer_with_kb(q:str=Query(...), k:int=5):
     chunks = search_kb(q, k)
-    context_text = "\n".join([chunk["text"] for chunk in chunks])
-    
-    system_prompt = "You are a helpful assistant that answers questions using the provided context."
-    user_prompt = f"Answer the following question using ONLY the provided context:\n\nContext:\n{context_text}\n\nQuestion: {q}"
-    response = ask_llama3(system_prompt, user_prompt)
+    prompt, context = prepare_kb_prompt(q, chunks)
+    response = ask_llama3(KB_SYSTEM_PROMPT, prompt)
+    return {
+        "question":q,
+        "answer": response,
+        "sources": context.chunks,
+        "context": context.report()
+    }
+
+
+async def answer_with_kb_async(q:str, k:int=5):
+    timings = current_timings() or Timings().bind()
+    # Embedding + FAISS are CPU-bound; keep them off the event loop
+    chunks = await timings.timed("kb_retrieval", run_cpu(search_kb, q, k))
+    result = await timings.timed("answer", answer_from_chunks_async(q, chunks))
+    return {**result, "timings": timings.as_dict()}
+
+
+async def answer_from_chunks_async(q:str, chunks):
+    """Compose the answer from chunks that were already retrieved (e.g. speculatively)."""
+    prompt, context = await run_cpu(prepare_kb_prompt, q, chunks)
+    response = await ask_llama3_async(KB_SYSTEM_PROMPT, prompt)
     return {
         "question":q,
         "answer": response,
-        "sources": chunks
+        "sources": context.chunks,
+        "context": context.report()
     }
 
 
+async def answer_with_kb_stream(q:str, k:int=5, chunks=None):
+    """Yield ("sources", chunks) and ("context", token report), then ("token", text) events as the answer streams."""
+    if chunks is None:
+        chunks = await run_cpu(search_kb, q, k)
+    prompt, context = await run_cpu(prepare_kb_prompt, q, chunks)
+    yield "sources", context.chunks
+    yield "context", context.report()
+    async for token in stream_llama3_async(KB_SYSTEM_PROMPT, prompt):
+        yield "token", token
@@ -0,0 +1,232 @@
+# root: app/services/kb_store.py
+from __future__ import annotations
+import logging
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import faiss
+import numpy as np
+
+# Add the project root to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+from app.services.kb_index_types import index_kind
+from app.services.kb_bm25 import BM25Index, build_bm25, read_bm25
+from app.services.kb_meta import ChunkMeta
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = root_dir / "data"
+KB_DIR = root_dir / "kb"
+INDEX_FILE = DATA_DIR / "kb_index.faiss"
+META_FILE = DATA_DIR / "kb_meta.db"
+LEGACY_META_FILE = DATA_DIR / "kb_meta.json"  # builds from before the SQLite sidecar
+BM25_FILE = DATA_DIR / "kb_bm25.json"
+
+# How often the watcher thread checks the index files for changes (seconds)
+KB_RELOAD_INTERVAL = float(os.getenv("KB_RELOAD_INTERVAL", "5"))
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _check_same_build(index, meta: ChunkMeta):
+    """
+    Raise unless the index holds exactly the metadata's chunk ids. The indexer
+    renames its files one after the other, so a reload can see the new index
+    next to the old metadata; the counts may agree, but chunk ids are never
+    reused across builds, so the id sets don't.
+    """
+    if index.ntotal != len(meta):
+        raise ValueError(f"index has {index.ntotal} vectors but metadata has {len(meta)} entries")
+    if not isinstance(index, faiss.IndexIDMap):
+        return  # older flat builds are addressed by position
+    ids = faiss.vector_to_array(index.id_map)
+    if not np.array_equal(np.sort(ids), np.array(sorted(meta.ids()), dtype=ids.dtype)):
+        raise ValueError("index and metadata chunk ids differ (files from different builds)")
+
+
+@dataclass(frozen=True)
+class KBSnapshot:
+    """An immutable, fully loaded view of the index and its metadata."""
+    index: Any
+    bm25: BM25Index
+    meta: ChunkMeta
+    signature: Tuple[Any, ...]
+    generation: int
+    loaded_at: float
+    load_seconds: float
+    index_bytes: int
+    meta_bytes: int
+    bm25_bytes: int
+
+    def chunk(self, idx: int) -> Dict[str, Any]:
+        return self.meta.get(idx)
+
+
+@dataclass
+class KBStore:
+    """
+    Process-wide holder for the FAISS index, the BM25 index and chunk metadata.
+
+    Readers call `snapshot()` and work on the returned object; reloads build a
+    complete new snapshot off to the side and swap the reference in one
+    assignment, so searches never block on (or observe) a half-loaded index.
+    """
+    index_file: Path = INDEX_FILE
+    meta_file: Path = META_FILE
+    legacy_meta_file: Path = LEGACY_META_FILE
+    kb_dir: Path = KB_DIR
+    bm25_file: Path = BM25_FILE
+    reload_interval: float = KB_RELOAD_INTERVAL
+    _snapshot: Optional[KBSnapshot] = None
+    _reload_lock: threading.Lock = field(default_factory=threading.Lock)
+    _stop: threading.Event = field(default_factory=threading.Event)
+    _watcher: Optional[threading.Thread] = None
+    reloads: int = 0
+    reload_errors: int = 0
+    last_error: Optional[str] = None
+
+    def _meta_path(self) -> Path:
+        if not self.meta_file.exists() and self.legacy_meta_file.exists():
+            return self.legacy_meta_file
+        return self.meta_file
+
+    def _signature(self) -> Tuple[Any, ...]:
+        return (_file_signature(self.index_file), _file_signature(self._meta_path()), _file_signature(self.bm25_file))
+
+    def _load(self, signature: Tuple[Any, ...], generation: int) -> KBSnapshot:
+        started = time.perf_counter()
+        index = faiss.read_index(str(self.index_file))
+        meta_path = self._meta_path()
+        if meta_path.suffix == ".json":
+            meta = ChunkMeta.from_json(meta_path)
+        else:
+            meta = ChunkMeta.from_sqlite(meta_path, self.kb_dir)
+        # The indexer replaces the files one after the other; a mismatch keeps the
+        # previous snapshot serving and the watcher retries on its next tick
+        _check_same_build(index, meta)
+        bm25, bm25_bytes = self._load_bm25(meta)
+        return KBSnapshot(
+            index=index,
+            bm25=bm25,
+            meta=meta,
+            signature=signature,
+            generation=generation,
+            loaded_at=time.time(),
+            load_seconds=time.perf_counter() - started,
+            index_bytes=int(faiss.serialize_index(index).nbytes),
+            meta_bytes=meta_path.stat().st_size,
+            bm25_bytes=bm25_bytes,
+        )
+
+    def _load_bm25(self, meta: ChunkMeta) -> Tuple[BM25Index, int]:
+        if self.bm25_file.exists():
+            bm25 = read_bm25(self.bm25_file)
+            if bm25.size != len(meta) or len(set(bm25.chunk_ids.tolist())) != bm25.size \
+                    or not all(i in meta for i in bm25.chunk_ids):
+                raise ValueError(f"BM25 index has {bm25.size} chunks that don't match the {len(meta)} metadata entries")
+            return bm25, self.bm25_file.stat().st_size
+        # Built before the indexer wrote BM25 postings; derive them from the chunk texts
+        logger.info("No BM25 index at %s; building it from the chunk metadata", self.bm25_file)
+        return build_bm25(list(meta)), 0
+
+    def reload(self, force: bool = False) -> bool:
+        """Load the files from disk if they changed. Returns True when a new snapshot was swapped in."""
+        with self._reload_lock:
+            signature = self._signature()
+            current = self._snapshot
+            if not force and current is not None and current.signature == signature:
+                return False
+            if None in signature[:2]:
+                raise FileNotFoundError(f"KB index files missing: {self.index_file}, {self.meta_file}")
+            generation = current.generation + 1 if current else 1
+            try:
+                snapshot = self._load(signature, generation)
+            except Exception as e:
+                self.reload_errors += 1
+                self.last_error = str(e)
+                raise
+            self._snapshot = snapshot
+            self.reloads += 1
+            self.last_error = None
+            logger.info(
+                "Loaded KB index generation %d: %d chunks in %.3fs",
+                generation, snapshot.index.ntotal, snapshot.load_seconds,
+            )
+            return True
+
+    def snapshot(self) -> KBSnapshot:
+        snap = self._snapshot
+        if snap is None:
+            # Not started through the app lifespan (scripts, tests): load on first use
+            self.reload()
+            snap = self._snapshot
+        return snap
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                # Keep serving the previous snapshot; the next tick retries
+                logger.warning("KB reload failed, keeping generation %s: %s",
+                               self._snapshot.generation if self._snapshot else None, e)
+
+    def start(self):
+        """Start the background change watcher and load the index now."""
+        if self.reload_interval > 0 and (self._watcher is None or not self._watcher.is_alive()):
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="kb-store-watcher", daemon=True)
+            self._watcher.start()
+        # Raises if the index is missing; the watcher keeps polling and picks it up once built
+        self.reload()
+
+    def stop(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.reload_interval + 1)
+            self._watcher = None
+
+    def stats(self) -> Dict[str, Any]:
+        snap = self._snapshot
+        stats: Dict[str, Any] = {
+            "loaded": snap is not None,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+            "reload_interval_seconds": self.reload_interval,
+            "index_file": str(self.index_file),
+            "meta_file": str(self._meta_path()),
+            "bm25_file": str(self.bm25_file),
+        }
+        if snap is not None:
+            stats.update({
+                "generation": snap.generation,
+                "chunks": int(snap.index.ntotal),
+                "dim": int(snap.index.d),
+                "index_type": index_kind(snap.index),
+                "loaded_at": snap.loaded_at,
+                "load_seconds": round(snap.load_seconds, 6),
+                "index_bytes": snap.index_bytes,
+                "meta_bytes": snap.meta_bytes,
+                "meta_format": snap.meta.info.get("format", "sqlite"),
+                "stale_sources": sorted(snap.meta.sources.stale) if snap.meta.sources else [],
+                "bm25_terms": snap.bm25.terms,
+                "bm25_bytes": snap.bm25_bytes,
+                "total_bytes": snap.index_bytes + snap.meta_bytes + snap.bm25_bytes,
+            })
+        return stats
+
+
+# Shared instance used by the retriever and the API
+kb_store = KBStore()
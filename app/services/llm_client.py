@@ -0,0 +1,256 @@
+# root: app/services/llm_client.py
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+from app.services.metrics import LLM_PROMPT_TOKENS, LLM_REQUESTS, LLM_RETRIES, LLM_TOKENS
+from app.services.timings import stage
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_LLM_MODEL = os.getenv("GROQ_LLM_MODEL", "llama-4-scout-17b-16e-instruct") # load the LLM model
+LLM_MODEL = os.getenv("LLM_MODEL", f"meta-llama/{GROQ_LLM_MODEL}")
+# Any OpenAI-compatible endpoint works, e.g. http://127.0.0.1:8081/v1 for the mock server
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1").rstrip("/")
+CHAT_COMPLETIONS_URL = f"{LLM_BASE_URL}/chat/completions"
+
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))   # seconds
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))  # in-flight calls per process
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", str(LLM_MAX_CONCURRENCY)))
+# Items of one batch request in flight at once, so a single batch can't take every LLM slot
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "8"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _headers() -> Dict[str, str]:
+    if not GROQ_API_KEY:
+        raise ValueError("GROQ_API_KEY is not set")
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {GROQ_API_KEY}"
+    }
+
+
+def build_payload(messages: List[Dict[str, str]], **options) -> Dict[str, Any]:
+    payload = {"model": LLM_MODEL, "messages": messages}
+    payload.update({k: v for k, v in options.items() if v is not None})
+    return payload
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff; honours a numeric Retry-After from the server."""
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+def message_content(body: Dict[str, Any]) -> str:
+    return body["choices"][0]["message"]["content"]
+
+
+def record_usage(body: Dict[str, Any]):
+    """Count the provider-reported tokens of a completion (or of a stream's final chunk)."""
+    usage = body.get("usage") or (body.get("x_groq") or {}).get("usage")
+    if not usage:
+        return
+    prompt, completion = usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    LLM_TOKENS.inc(prompt, kind="prompt")
+    LLM_TOKENS.inc(completion, kind="completion")
+    LLM_PROMPT_TOKENS.observe(prompt)
+
+
+@contextmanager
+def call_metrics(mode: str):
+    """Time one chat-completion call as the `llm_call` stage and count how it ended."""
+    outcome = "error"
+    try:
+        with stage("llm_call"):
+            yield
+        outcome = "ok"
+    finally:
+        LLM_REQUESTS.inc(mode=mode, outcome=outcome)
+
+
+# ---------------------------------------------------------------------------
+# Sync client: one pooled keep-alive session per process
+# ---------------------------------------------------------------------------
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_sync_limiter = threading.BoundedSemaphore(LLM_MAX_CONCURRENCY)
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=LLM_POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def chat_completion(messages: List[Dict[str, str]], **options) -> Dict[str, Any]:
+    """POST a chat completion and return the decoded JSON body, retrying 429/5xx and network errors."""
+    payload = build_payload(messages, **options)
+    headers = _headers()
+    session = get_session()
+    with _sync_limiter, call_metrics("sync"):
+        for attempt in range(LLM_MAX_RETRIES + 1):
+            last_try = attempt == LLM_MAX_RETRIES
+            try:
+                response = session.post(
+                    CHAT_COMPLETIONS_URL, headers=headers, json=payload,
+                    timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT),
+                )
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_try:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"LLM request failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+                LLM_RETRIES.inc(reason=e.__class__.__name__)
+                time.sleep(delay)
+                continue
+            if response.status_code in RETRY_STATUSES and not last_try:
+                delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                logger.warning(f"LLM returned {response.status_code}, retrying in {delay:.2f}s")
+                LLM_RETRIES.inc(reason=str(response.status_code))
+                time.sleep(delay)
+                continue
+            response.raise_for_status()  # Raise an error for bad responses
+            body = response.json()
+            record_usage(body)
+            return body
+
+
+def chat(messages: List[Dict[str, str]], **options) -> str:
+    return message_content(chat_completion(messages, **options))
+
+
+# ---------------------------------------------------------------------------
+# Async client: shared httpx.AsyncClient, bound to the running event loop
+# ---------------------------------------------------------------------------
+
+_async_client: Optional[httpx.AsyncClient] = None
+_async_limiter: Optional[asyncio.Semaphore] = None
+
+
+def get_async_client() -> httpx.AsyncClient:
+    global _async_client, _async_limiter
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE),
+        )
+        _async_limiter = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _async_client
+
+
+async def aclose():
+    """Close the async client (call from the app's shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def achat_completion(messages: List[Dict[str, str]], **options) -> Dict[str, Any]:
+    payload = build_payload(messages, **options)
+    headers = _headers()
+    client = get_async_client()
+    async with _async_limiter:
+        with call_metrics("async"):
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                last_try = attempt == LLM_MAX_RETRIES
+                try:
+                    response = await client.post(CHAT_COMPLETIONS_URL, headers=headers, json=payload)
+                except httpx.TransportError as e:
+                    if last_try:
+                        raise
+                    delay = backoff_delay(attempt)
+                    logger.warning(f"LLM request failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+                    LLM_RETRIES.inc(reason=e.__class__.__name__)
+                    await asyncio.sleep(delay)
+                    continue
+                if response.status_code in RETRY_STATUSES and not last_try:
+                    delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                    logger.warning(f"LLM returned {response.status_code}, retrying in {delay:.2f}s")
+                    LLM_RETRIES.inc(reason=str(response.status_code))
+                    await asyncio.sleep(delay)
+                    continue
+                response.raise_for_status()
+                body = response.json()
+                record_usage(body)
+                return body
+
+
+async def achat(messages: List[Dict[str, str]], **options) -> str:
+    return message_content(await achat_completion(messages, **options))
+
+
+async def astream_chat(messages: List[Dict[str, str]], **options) -> AsyncIterator[str]:
+    """
+    Stream a chat completion, yielding content deltas as they arrive.
+
+    Retries only happen before the first byte of the body; once tokens have
+    been handed to the caller a failure is raised as-is.
+    """
+    payload = build_payload(messages, stream=True, **options)
+    headers = _headers()
+    client = get_async_client()
+    async with _async_limiter:
+        with call_metrics("stream"):
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                last_try = attempt == LLM_MAX_RETRIES
+                try:
+                    async with client.stream("POST", CHAT_COMPLETIONS_URL, headers=headers, json=payload) as response:
+                        if response.status_code in RETRY_STATUSES and not last_try:
+                            delay = backoff_delay(attempt, response.headers.get("Retry-After"))
+                            logger.warning(f"LLM returned {response.status_code}, retrying in {delay:.2f}s")
+                            LLM_RETRIES.inc(reason=str(response.status_code))
+                            await asyncio.sleep(delay)
+                            continue
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                return
+                            chunk = json.loads(data)
+                            record_usage(chunk)  # final chunk, when the provider reports usage
+                            choices = chunk.get("choices") or [{}]
+                            delta = choices[0].get("delta", {}).get("content")
+                            if delta:
+                                yield delta
+                        return
+                except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                    if last_try:
+                        raise
+                    delay = backoff_delay(attempt)
+                    logger.warning(f"LLM request failed ({e.__class__.__name__}), retrying in {delay:.2f}s")
+                    LLM_RETRIES.inc(reason=e.__class__.__name__)
+                    await asyncio.sleep(delay)
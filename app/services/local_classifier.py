@@ -0,0 +1,163 @@
+# root: app/services/local_classifier.py
+from __future__ import annotations
+import json
+import logging
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Add the project root to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+from app.services.embeddings import get_query_embedding, get_query_embeddings, get_embeddings, EMBEDDING_MODEL_ID
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = root_dir / "data"
+CENTROIDS_PATH = DATA_DIR / "query_centroids.npz"
+LABELED_QUERIES_PATH = DATA_DIR / "labeled_queries.jsonl"
+
+LABELS = ("employees", "jira_tickets", "deployments", "kb")
+# Softmax temperature over cosine similarities; lower = more decisive confidences
+CENTROID_TEMPERATURE = float(os.getenv("CLASSIFIER_CENTROID_TEMPERATURE", "0.05"))
+KEYWORD_CONFIDENCE = 0.95
+
+# Fast path: patterns that identify a label on their own. Only used when
+# exactly one label matches, so mixed questions fall through to the centroids.
+KEYWORD_PATTERNS: Dict[str, List[re.Pattern]] = {
+    "jira_tickets": [
+        re.compile(r"\bjira\b(?![\s_]+user(name)?s?\b)", re.I),  # "jira username" is an employee field
+        re.compile(r"\btickets?\b", re.I),
+        re.compile(r"\b[A-Z][A-Z0-9]+-\d+\b"),  # ticket keys like HARRI-123
+    ],
+    "deployments": [
+        re.compile(r"\b(last|latest|recent|failed|successful)\b.*\bdeployments?\b", re.I),
+        re.compile(r"\bdeployments? (history|status|for|of)\b", re.I),
+        re.compile(r"\bwhat version\b", re.I),
+    ],
+    "employees": [
+        re.compile(r"\b(e-?mail|jira username|contact)\b.*\bof\b", re.I),
+        re.compile(r"\bjira[\s_]+user(name)?s?\b", re.I),
+        re.compile(r"\bmembers? of the\b.*\bteam\b", re.I),
+        re.compile(r"\bwhat role\b", re.I),
+    ],
+    "kb": [
+        re.compile(r"^\s*how (do|can|should) (i|we)\b", re.I),
+        re.compile(r"\b(policy|process|guide|setup|set up|onboarding|escalat\w*|on-?call|postmortem)\b", re.I),
+        re.compile(r"\b(password|reset)\b", re.I),
+    ],
+}
+
+
+# Table entities; a KB keyword next to one of these may be a hybrid question,
+# e.g. "who on the Backend team owns the deployment process?"
+DB_ENTITY_PATTERN = re.compile(r"\b(team|tickets?|jira|deployments?|employees?|engineers?)\b", re.I)
+
+
+def keyword_label(query: str) -> Optional[str]:
+    matched = {label for label, patterns in KEYWORD_PATTERNS.items() if any(p.search(query) for p in patterns)}
+    if matched == {"kb"} and DB_ENTITY_PATTERN.search(query):
+        return None
+    return matched.pop() if len(matched) == 1 else None
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    e = np.exp(x - x.max())
+    return e / e.sum()
+
+
+class CentroidClassifier:
+    """Nearest-centroid classifier over normalized query embeddings."""
+
+    def __init__(self, labels: Sequence[str], centroids: np.ndarray, model_id: str = EMBEDDING_MODEL_ID):
+        self.labels = list(labels)
+        self.centroids = centroids.astype(np.float32)
+        self.model_id = model_id
+
+    @classmethod
+    def fit(cls, queries: Sequence[str], labels: Sequence[str], vectors: Optional[np.ndarray] = None):
+        if vectors is None:
+            vectors = get_embeddings(list(queries))
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        names = [label for label in LABELS if label in set(labels)]
+        label_arr = np.array(labels)
+        centroids = np.stack([vectors[label_arr == name].mean(axis=0) for name in names])
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True)
+        return cls(names, centroids)
+
+    def predict_vector(self, vector: np.ndarray) -> Tuple[str, float]:
+        vector = vector / np.linalg.norm(vector)
+        probs = _softmax((self.centroids @ vector) / CENTROID_TEMPERATURE)
+        best = int(np.argmax(probs))
+        return self.labels[best], float(probs[best])
+
+    def predict(self, query: str) -> Tuple[str, float]:
+        return self.predict_vector(np.asarray(get_query_embedding(query), dtype=np.float32))
+
+    def save(self, path: Path = CENTROIDS_PATH):
+        np.savez(path, labels=np.array(self.labels), centroids=self.centroids, model_id=np.array(self.model_id))
+
+    @classmethod
+    def load(cls, path: Path = CENTROIDS_PATH) -> Optional["CentroidClassifier"]:
+        if not path.exists():
+            return None
+        data = np.load(path)
+        model_id = str(data["model_id"])
+        if model_id != EMBEDDING_MODEL_ID:
+            logger.warning(f"Ignoring {path.name}: trained for {model_id}, running {EMBEDDING_MODEL_ID}")
+            return None
+        return cls([str(x) for x in data["labels"]], data["centroids"], model_id)
+
+
+_centroids: Optional[CentroidClassifier] = None
+_centroids_loaded = False
+
+
+def get_centroid_classifier() -> Optional[CentroidClassifier]:
+    global _centroids, _centroids_loaded
+    if not _centroids_loaded:
+        _centroids = CentroidClassifier.load()
+        _centroids_loaded = True
+    return _centroids
+
+
+def classify_local(query: str) -> Optional[Dict]:
+    """
+    Classify without an LLM call. Returns {"label", "confidence", "source"}
+    or None when no local model is available.
+    """
+    label = keyword_label(query)
+    if label is not None:
+        return {"label": label, "confidence": KEYWORD_CONFIDENCE, "source": "keyword"}
+    model = get_centroid_classifier()
+    if model is None:
+        return None
+    label, confidence = model.predict(query)
+    return {"label": label, "confidence": confidence, "source": "centroid"}
+
+
+def classify_local_batch(queries: Sequence[str]) -> List[Optional[Dict]]:
+    """classify_local for many queries; those without a keyword hit are embedded in one call."""
+    results: List[Optional[Dict]] = []
+    pending: List[int] = []
+    for i, query in enumerate(queries):
+        label = keyword_label(query)
+        results.append({"label": label, "confidence": KEYWORD_CONFIDENCE, "source": "keyword"} if label else None)
+        if label is None:
+            pending.append(i)
+    model = get_centroid_classifier()
+    if model is None or not pending:
+        return results
+    vectors = get_query_embeddings([queries[i] for i in pending])
+    for i, vector in zip(pending, vectors):
+        label, confidence = model.predict_vector(np.asarray(vector, dtype=np.float32))
+        results[i] = {"label": label, "confidence": confidence, "source": "centroid"}
+    return results
+
+
+def load_labeled_queries(path: Path = LABELED_QUERIES_PATH) -> List[Dict[str, str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,157 @@
+# root: app/services/metrics.py
+from __future__ import annotations
+import bisect
+from abc import ABC, abstractmethod
+import math
+import os
+import threading
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+# Process-wide counters and histograms, rendered for /metrics in the
+# Prometheus text exposition format (version 0.0.4). Label values must come
+# from small fixed sets (stage names, route templates), never user input.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY: List["_Metric"] = []
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abstractmethod
+    def lines(self) -> List[str]:
+        """Sample lines in the text exposition format."""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.lines()]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, key)} {_number(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, List] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            if slot < len(self.buckets):
+                state[slot] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        out = []
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                out.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_label_str(self.labelnames, key, le)} {state[-1]}")
+            out.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {_number(state[-2])}")
+            out.append(f"{self.name}_count{_label_str(self.labelnames, key)} {state[-1]}")
+        return out
+
+
+class CallbackMetric(_Metric):
+    """A gauge or counter read at scrape time, for state other modules already track (cache stats)."""
+
+    def __init__(self, name: str, help: str, kind: str, labelnames: Sequence[str],
+                 collect: Callable[[], Dict[Tuple, float]]):
+        super().__init__(name, help, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def lines(self) -> List[str]:
+        return [f"{self.name}{_label_str(self.labelnames, key)} {_number(v)}"
+                for key, v in sorted(self.collect().items()) if v is not None]
+
+
+def render() -> str:
+    """Every registered metric in Prometheus text format."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Per-stage latency. The stage names match the `timings` block of API responses.
+STAGE_SECONDS = Histogram("assistant_stage_duration_seconds", "Latency of one pipeline stage", ("stage",))
+HTTP_SECONDS = Histogram("assistant_http_request_duration_seconds", "HTTP request latency (until the response "
+                         "starts for streams)", ("method", "path", "status"))
+
+LLM_REQUESTS = Counter("assistant_llm_requests_total", "Chat-completion calls", ("mode", "outcome"))
+LLM_RETRIES = Counter("assistant_llm_retries_total", "Chat-completion retries", ("reason",))
+LLM_TOKENS = Counter("assistant_llm_tokens_total", "Tokens reported by the LLM provider", ("kind",))
+LLM_PROMPT_TOKENS = Histogram("assistant_llm_prompt_tokens", "Prompt tokens per LLM call", buckets=TOKEN_BUCKETS)
+
+SQL_QUERIES = Counter("assistant_sql_queries_total", "Generated SQL executions", ("outcome",))
+SQL_ROWS = Histogram("assistant_sql_rows", "Rows returned per SQL execution", buckets=ROW_BUCKETS)
@@ -1,56 +1,329 @@
 # root: app/services/router.py
 from __future__ import annotations
-import re
-from typing import Dict, Any
-from sqlalchemy.orm import Session
-from app.services.groq_client import ask_llama3
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Any, Optional
 from app.services.classifier import QueryClassification
-from app.services.classifier import classify_query_with_llm
-from app.services.sql_gen import llm_generate_sql, execute_sql, llm_compose_answer
-from app.services.kb_router import answer_with_kb
-from app.services.kb_retriever import search_kb
+from app.services.classifier import classify_local_async, classify_query_with_llm_async
+from app.services.classifier import CLASSIFIER_CONFIDENCE_THRESHOLD, classify_queries_async
+from app.services.sql_gen import plan_sql_async, execute_sql_async, llm_compose_answer_async
+from app.services.sql_gen import llm_compose_answer_stream, record_sql_result, rows_context
+from app.services.kb_router import answer_from_chunks_async, answer_with_kb_stream
+from app.services.executors import run_cpu
+from app.services.sql_cache import sql_plan_cache
+from app.services.hybrid_router import compose_hybrid_answer_async
+from app.services.hybrid_router import compose_hybrid_answer_stream, hybrid_contexts
+from app.services.timings import Timings, current_timings
+from app.services.metrics import STAGE_SECONDS
+from app.services.kb_retriever import search_kb, search_kb_batch
+from app.services.llm_client import LLM_BATCH_CONCURRENCY
 
-def route_query(question: str, db: Session) -> Dict[str, Any]:
-    cls = classify_query_with_llm(question)
+logger = logging.getLogger(__name__)
 
+# Overlap KB retrieval / SQL generation with the LLM classifier call
+ROUTE_SPECULATIVE = os.getenv("ROUTE_SPECULATIVE", "1") == "1"
+# Start SQL generation early when the local classifier leans DB at least this much
+SPECULATIVE_SQL_MIN_CONFIDENCE = float(os.getenv("SPECULATIVE_SQL_MIN_CONFIDENCE", "0.5"))
+KB_TOP_K = 5
+# Per-branch budgets (seconds) for the hybrid fan-out; a late branch is dropped, not waited for
+HYBRID_DB_TIMEOUT = float(os.getenv("HYBRID_DB_TIMEOUT", "10"))
+HYBRID_KB_TIMEOUT = float(os.getenv("HYBRID_KB_TIMEOUT", "5"))
+NO_CONTEXT_ANSWER = "Sorry, I couldn't retrieve the data or documents needed to answer this right now."
+
+
+def _context_report(rows=None, kb=None) -> Dict[str, Any]:
+    """Token accounting for the prompt contexts that were actually sent."""
+    return {"rows": rows.report() if rows is not None else None,
+            "kb": kb.report() if kb is not None else None}
+
+
+def _hybrid_response(cls, question, result, template_id, contexts, branches, answer) -> Dict[str, Any]:
+    rows_ctx, kb_ctx = contexts
+    return {
+        "path": "hybrid",
+        "domain": cls["domain"],
+        "confidence": cls["confidence"],
+        "answer": answer,
+        "data": result.rows if result is not None else [],
+        "columns": result.columns if result is not None else [],
+        "sql_template": template_id,
+        "sql_stats": result.stats() if result is not None else None,
+        "sources": kb_ctx.chunks if kb_ctx is not None else [],
+        "branches": branches,
+        "context": _context_report(rows_ctx, kb_ctx),
+    }
+
+def _cancel(task: Optional[asyncio.Task]) -> str:
+    """Cancel a speculative branch that lost; returns how it ended for the response."""
+    if task is None:
+        return "skipped"
+    if task.done():
+        if not task.cancelled():
+            task.exception()  # mark any failure as retrieved
+        return "wasted"
+    task.cancel()
+    return "cancelled"
+
+
+async def _classify_speculative(question: str, timings: Timings, speculative: bool = ROUTE_SPECULATIVE):
+    """
+    Classify `question`. When the local pre-classifier isn't confident and the
+    LLM has to be asked, start KB retrieval (and SQL generation, if the local
+    guess leans DB) alongside the LLM call instead of after it.
+    Returns (classification, kb_task, sql_task); the tasks may be None.
+    """
+    with timings.stage("classify_local"):
+        local = await classify_local_async(question)
+    if local is not None and local["confidence"] >= CLASSIFIER_CONFIDENCE_THRESHOLD:
+        return local, None, None
+
+    cls_task = asyncio.create_task(timings.timed("classify_llm", classify_query_with_llm_async(question)))
+    kb_task = sql_task = None
+    if speculative:
+        kb_task = asyncio.create_task(timings.timed("kb_retrieval", run_cpu(search_kb, question, KB_TOP_K)))
+        if local is not None and local["route"] == "db" and local["confidence"] >= SPECULATIVE_SQL_MIN_CONFIDENCE:
+            sql_task = asyncio.create_task(timings.timed("sql_generation", plan_sql_async(question)))
+    try:
+        cls = {**(await cls_task), "source": "llm"}
+    except BaseException:
+        _cancel(kb_task)
+        _cancel(sql_task)
+        raise
+    return cls, kb_task, sql_task
+
+
+async def _run_db_branch(question: str, timings: Timings, sql_task: Optional[asyncio.Task]):
+    if sql_task is None:
+        sql, params, template_id = await timings.timed("sql_generation", plan_sql_async(question))
+    else:
+        sql, params, template_id = await sql_task
+    result = await timings.timed("sql_execution", execute_sql_async(sql, params))
+    if template_id is not None and result.ok and not result.rows:
+        # A template binding that finds nothing may have captured a word that isn't a value
+        # ("show my tickets" -> status 'My'); let the LLM write this question's SQL
+        logger.info(f"SQL template {template_id} returned no rows; generating SQL")
+        sql_plan_cache.mark_unfit(template_id)
+        sql, params, template_id = await timings.timed("sql_generation", plan_sql_async(question, use_cache=False))
+        result = await timings.timed("sql_execution", execute_sql_async(sql, params))
+    record_sql_result(question, sql, template_id, result)
+    return template_id, result
+
+
+async def _kb_chunks(question: str, timings: Timings, kb_task: Optional[asyncio.Task]):
+    if kb_task is None:
+        return await timings.timed("kb_retrieval", run_cpu(search_kb, question, KB_TOP_K))
+    return await kb_task
+
+
+async def _bounded(awaitable, timeout: float):
+    """(value, status) for a hybrid branch; a timeout or failure leaves the other branch usable."""
+    try:
+        return await asyncio.wait_for(awaitable, timeout), "ok"
+    except asyncio.TimeoutError:
+        return None, "timeout"
+    except Exception as e:
+        logger.error(f"Hybrid branch failed: {e}")
+        return None, f"error: {e.__class__.__name__}"
+
+
+async def _run_hybrid_branches(question: str, timings: Timings, kb_task, sql_task):
+    """Run the DB and KB branches concurrently under their own timeouts."""
+    (db_value, db_status), (chunks, kb_status) = await asyncio.gather(
+        _bounded(_run_db_branch(question, timings, sql_task), HYBRID_DB_TIMEOUT),
+        _bounded(_kb_chunks(question, timings, kb_task), HYBRID_KB_TIMEOUT),
+    )
+    template_id, result = db_value if db_value is not None else (None, None)
+    return template_id, result, chunks, {"db": db_status, "kb": kb_status}
+
+
+async def route_query_async(question: str, speculative: bool = ROUTE_SPECULATIVE) -> Dict[str, Any]:
+    """
+    Async `route_query`: LLM calls await the shared client, retrieval and SQLite
+    run on bounded executors, and with `speculative` independent stages overlap
+    the LLM classification. The response carries per-stage `timings` (ms).
+    """
+    # Lower layers (embedding, index search, LLM calls) record into the same timings
+    timings = current_timings() or Timings().bind()
+    cls, kb_task, sql_task = await _classify_speculative(question, timings, speculative)
+    return await _answer_routed(question, cls, timings, kb_task, sql_task)
+
+
+async def _answer_routed(question: str, cls: QueryClassification, timings: Timings,
+                         kb_task=None, sql_task=None) -> Dict[str, Any]:
+    """Run the branch `cls` picked; `kb_task` / `sql_task` are retrieval or SQL planning already under way."""
     # DB route
     if cls["route"] == "db":
-        domain = cls["domain"]
-        sql = llm_generate_sql(question)
-        cols, rows = execute_sql(db, sql)
-        answer = llm_compose_answer(question, rows)
+        speculation = {"kb_retrieval": _cancel(kb_task), "sql_generation": "used" if sql_task else "skipped"}
+        template_id, result = await _run_db_branch(question, timings, sql_task)
+        context = await run_cpu(rows_context, question, result)
+        answer = await timings.timed("answer", llm_compose_answer_async(question, context))
         return {
-            "path": "db", 
-            "domain": domain,
+            "path": "db",
+            "domain": cls["domain"],
             "confidence": cls["confidence"],
             "answer": answer,
-            "data": rows,
-            "columns": cols
+            "data": result.rows,
+            "columns": result.columns,
+            "sql_template": template_id,
+            "sql_stats": result.stats(),
+            "context": _context_report(rows=context),
+            "speculation": speculation,
+            "timings": timings.as_dict()
         }
 
-    # KB route
-    if cls["route"] == "kb":
-        kb_result = answer_with_kb(question)
-        return {
-            "path": "kb",
-            "domain": None,
-            "confidence": cls["confidence"],
-            "answer": kb_result["answer"],
-            "sources": kb_result["sources"]
-        }
-        
-    # Hybrid route: do both, then ask LLM to pick/merge
+    # Hybrid route: DB and KB in parallel, one composition call over both
     if cls["route"] == "hybrid":
-        # Implement hybrid approach
-        # For now, fall back to KB
-        return route_query(question, db) 
+        speculation = {"kb_retrieval": "used" if kb_task else "skipped",
+                       "sql_generation": "used" if sql_task else "skipped"}
+        template_id, result, chunks, branches = await _run_hybrid_branches(question, timings, kb_task, sql_task)
+        contexts = await run_cpu(hybrid_contexts, question, result, chunks)
+        if result is None and chunks is None:
+            answer = NO_CONTEXT_ANSWER
+        else:
+            answer = await timings.timed("answer", compose_hybrid_answer_async(question, *contexts))
+        return {**_hybrid_response(cls, question, result, template_id, contexts, branches, answer),
+                "speculation": speculation, "timings": timings.as_dict()}
 
-    # Safety fallback
-    kb_result = answer_with_kb(question)
+    # KB route
+    speculation = {"kb_retrieval": "used" if kb_task else "skipped", "sql_generation": _cancel(sql_task)}
+    chunks = await _kb_chunks(question, timings, kb_task)
+    kb_result = await timings.timed("answer", answer_from_chunks_async(question, chunks))
     return {
-        "path": "kb", 
+        "path": "kb",
         "domain": None,
-        "confidence": 0.4,
+        "confidence": cls["confidence"] if cls["route"] == "kb" else 0.4,
         "answer": kb_result["answer"],
-        "sources": kb_result["sources"]
+        "sources": kb_result["sources"],
+        "context": {"rows": None, "kb": kb_result["context"]},
+        "speculation": speculation,
+        "timings": timings.as_dict()
+    }
+
+
+def _done_future(value=None, error: Optional[BaseException] = None) -> asyncio.Future:
+    """A finished future, standing in for a speculative task whose work was done up front."""
+    future = asyncio.get_running_loop().create_future()
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(value)
+    return future
+
+
+async def route_query_batch(questions, concurrency: int = LLM_BATCH_CONCURRENCY):
+    """
+    `route_query_async` over many questions. Classification embeds the batch
+    in one call and KB retrieval for every kb / hybrid item runs as one
+    batched search; the per-item SQL and answer calls then run `concurrency`
+    at a time. Yields (index, response or exception) in input order as each
+    item finishes, so callers can stream results.
+    """
+    questions = list(questions)
+    timings = [Timings() for _ in questions]
+    started = time.perf_counter()
+    classes = await classify_queries_async(questions, concurrency=concurrency)
+    _record_shared(timings, "classify_batch", started)
+
+    kb_items = [i for i, cls in enumerate(classes) if not isinstance(cls, BaseException) and cls["route"] != "db"]
+    kb_futures: Dict[int, asyncio.Future] = {}
+    if kb_items:
+        started = time.perf_counter()
+        try:
+            found = await run_cpu(search_kb_batch, [questions[i] for i in kb_items], KB_TOP_K)
+            kb_futures = {i: _done_future(chunks) for i, chunks in zip(kb_items, found)}
+        except Exception as e:
+            logger.error(f"Batched KB retrieval failed: {e}")
+            kb_futures = {i: _done_future(error=e) for i in kb_items}
+        _record_shared([timings[i] for i in kb_items], "kb_retrieval_batch", started)
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(i):
+        timings[i].bind()  # each task runs in its own copy of the context
+        async with semaphore:
+            return await _answer_routed(questions[i], classes[i], timings[i], kb_futures.get(i))
+
+    tasks = [None if isinstance(cls, BaseException) else asyncio.create_task(one(i)) for i, cls in enumerate(classes)]
+    try:
+        for i, task in enumerate(tasks):
+            if task is None:
+                yield i, classes[i]
+                continue
+            try:
+                yield i, await task
+            except Exception as e:
+                yield i, e
+    finally:
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+
+
+def _record_shared(timings, name: str, started: float):
+    """Charge a stage that ran once for the whole batch to every item in it (observed once)."""
+    ms = (time.perf_counter() - started) * 1000
+    STAGE_SECONDS.observe(ms / 1000, stage=name)
+    for t in timings:
+        t.record(name, ms, observe=False)
+
+
+async def route_query_stream(question: str, speculative: bool = ROUTE_SPECULATIVE):
+    """
+    Streaming `route_query_async`. Yields (event, data) pairs in the order the
+    client can use them: the routing decision, then the retrieved `sources` or
+    SQL `rows` and the prompt `context` token report, then answer `token`s,
+    and finally the stage `timings`.
+    """
+    timings = current_timings() or Timings().bind()
+    cls, kb_task, sql_task = await _classify_speculative(question, timings, speculative)
+
+    # DB route
+    if cls["route"] == "db":
+        _cancel(kb_task)
+        yield "route", {"path": "db", "domain": cls["domain"], "confidence": cls["confidence"]}
+        template_id, result = await _run_db_branch(question, timings, sql_task)
+        yield "rows", {"columns": result.columns, "data": result.rows, "sql_template": template_id,
+                       "sql_stats": result.stats()}
+        context = await run_cpu(rows_context, question, result)
+        yield "context", _context_report(rows=context)
+        with timings.stage("answer"):
+            async for token in llm_compose_answer_stream(question, context):
+                yield "token", token
+        yield "timings", timings.as_dict()
+        return
+
+    # Hybrid route: emit whichever contexts arrived, then stream one merged answer
+    if cls["route"] == "hybrid":
+        yield "route", {"path": "hybrid", "domain": cls["domain"], "confidence": cls["confidence"]}
+        template_id, result, chunks, branches = await _run_hybrid_branches(question, timings, kb_task, sql_task)
+        yield "branches", branches
+        if result is not None:
+            yield "rows", {"columns": result.columns, "data": result.rows, "sql_template": template_id,
+                           "sql_stats": result.stats()}
+        contexts = await run_cpu(hybrid_contexts, question, result, chunks)
+        if chunks is not None:
+            yield "sources", contexts[1].chunks
+        yield "context", _context_report(*contexts)
+        if result is None and chunks is None:
+            yield "token", NO_CONTEXT_ANSWER
+        else:
+            with timings.stage("answer"):
+                async for token in compose_hybrid_answer_stream(question, *contexts):
+                    yield "token", token
+        yield "timings", timings.as_dict()
+        return
+
+    # KB route
+    _cancel(sql_task)
+    yield "route", {
+        "path": "kb",
+        "domain": None,
+        "confidence": cls["confidence"] if cls["route"] == "kb" else 0.4,
     }
+    chunks = await _kb_chunks(question, timings, kb_task)
+    with timings.stage("answer"):
+        async for event, data in answer_with_kb_stream(question, KB_TOP_K, chunks=chunks):
+            yield event, ({"rows": None, "kb": data} if event == "context" else data)
+    yield "timings", timings.as_dict()
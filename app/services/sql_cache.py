@@ -0,0 +1,285 @@
+# root: app/services/sql_cache.py
+from __future__ import annotations
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add the project root to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+
+logger = logging.getLogger(__name__)
+
+SQL_CACHE_ENABLED = os.getenv("SQL_CACHE_ENABLED", "1") == "1"
+SQL_CACHE_MAX_TEMPLATES = int(os.getenv("SQL_CACHE_MAX_TEMPLATES", "500"))
+SQL_CACHE_PATH = os.getenv("SQL_CACHE_PATH", "")  # JSON file to persist templates across restarts
+
+# 'it''s' style SQL strings and bare numbers that aren't part of an identifier
+SQL_LITERAL_RE = re.compile(r"'((?:[^']|'')*)'|(?<![\w.])(\d+)(?![\w.])")
+# The column a literal is compared with: `col = 'x'`, `col != 'x'`, `col IN ('a', 'x')`
+COMPARED_COLUMN_RE = re.compile(r"(?:(\w+)\s*(?:==?|!=|<>)\s*|(\w+)\s+(?:NOT\s+)?IN\s*\([^()]*)$", re.I)
+CASE_STYLES = {
+    "same": lambda v: v,
+    "lower": str.lower,
+    "upper": str.upper,
+    "title": str.title,
+    "capitalize": str.capitalize,
+}
+
+
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().rstrip("?.!").strip()
+
+
+def value_shape(value: str) -> str:
+    """Character-class outline of a value: 'ahmed_ali' -> 'a_a', 'Open' -> 'Aa', 'HARRI-123' -> 'A-9'."""
+    return re.sub(r"\d+", "9", re.sub(r"[a-z]+", "a", re.sub(r"[A-Z]+", "A", value)))
+
+
+def _compared_column(sql: str, start: int) -> Optional[str]:
+    match = COMPARED_COLUMN_RE.search(sql[:start])
+    return (match.group(1) or match.group(2)) if match else None
+
+
+def _case_style(in_question: str, literal: str) -> Optional[str]:
+    """How the SQL literal's casing relates to the words in the question (e.g. 'open' -> 'Open')."""
+    for name, fn in CASE_STYLES.items():
+        if fn(in_question) == literal:
+            return name
+    return None
+
+
+@dataclass
+class SqlTemplate:
+    id: str
+    pattern: str                 # regex over the normalized question
+    question_template: str       # human-readable, with {p0}, {p1}...
+    sql: str                     # SQL with :p0, :p1... bind parameters
+    params: List[Dict[str, str]]  # per parameter: kind (str|int), case style; str: shape and compared column
+    example_question: str
+    created: float
+    hits: int = 0
+    last_used: float = 0.0
+    _regex: Any = field(default=None, repr=False, compare=False)
+
+    @property
+    def regex(self):
+        if self._regex is None:
+            self._regex = re.compile(self.pattern, re.I)
+        return self._regex
+
+    def bind(self, question: str) -> Optional[Dict[str, Any]]:
+        match = self.regex.match(normalize_question(question))
+        if match is None:
+            return None
+        values = {}
+        for i, spec in enumerate(self.params):
+            raw = match.group(i + 1)
+            values[f"p{i}"] = int(raw) if spec["kind"] == "int" else CASE_STYLES[spec["case"]](raw)
+        return values
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("_regex", None)
+        return data
+
+
+def extract_template(question: str, sql: str) -> Optional[SqlTemplate]:
+    """
+    Turn a (question, generated SQL) pair into a reusable template. Every SQL
+    literal that also appears in the question becomes a bind parameter, and
+    the question becomes a regex with a capture group in its place. Literals
+    that don't appear in the question (LIMIT 50, fixed statuses) stay in the SQL.
+    String parameters also record the example value's shape and the column it
+    was compared with, so a later binding can be checked before it's trusted.
+    """
+    normalized = normalize_question(question)
+    spans: List[Tuple[int, int, Dict[str, str], str]] = []  # (start, end, spec, literal as written in SQL)
+    seen = {}
+    for m in SQL_LITERAL_RE.finditer(sql):
+        if m.group(1) is not None:
+            literal, kind = m.group(1).replace("''", "'"), "str"
+        else:
+            literal, kind = m.group(2), "int"
+        if not literal.strip() or literal in seen:
+            continue
+        found = re.search(rf"(?<!\w){re.escape(literal)}(?!\w)", normalized, re.I)
+        if found is None:
+            continue
+        case = _case_style(found.group(0), literal) if kind == "str" else "same"
+        if case is None:
+            continue
+        if any(found.start() < end and start < found.end() for start, end, _, _ in spans):
+            continue
+        seen[literal] = True
+        spec = {"kind": kind, "case": case}
+        if kind == "str":
+            spec["shape"] = value_shape(literal)
+            column = _compared_column(sql, m.start())
+            if column:
+                spec["column"] = column
+        spans.append((found.start(), found.end(), spec, m.group(0)))
+
+    spans.sort(key=lambda s: s[0])
+    pattern, readable, pos = "^", "", 0
+    params = []
+    for i, (start, end, spec, sql_literal) in enumerate(spans):
+        pattern += re.escape(normalized[pos:start])
+        readable += normalized[pos:start]
+        if spec["kind"] == "int":
+            pattern += r"(\d+)"
+        else:
+            # Same number of words as the example, so 'open' can't capture 'high priority'
+            words = len(normalized[start:end].split())
+            pattern += r"(\S+" + r"(?:\s+\S+)" * (words - 1) + ")"
+        readable += f"{{p{i}}}"
+        pos = end
+        params.append(spec)
+    pattern += re.escape(normalized[pos:]) + "$"
+    # Replace whole literal tokens only; a 3 inside '%3%' is part of a string token and stays
+    placeholders = {sql_literal: f":p{i}" for i, (_, _, _, sql_literal) in enumerate(spans)}
+    param_sql = SQL_LITERAL_RE.sub(lambda m: placeholders.get(m.group(0), m.group(0)), sql)
+    readable += normalized[pos:]
+
+    return SqlTemplate(
+        id=hashlib.sha1(pattern.lower().encode("utf-8")).hexdigest()[:12],
+        pattern=pattern,
+        question_template=readable,
+        sql=param_sql,
+        params=params,
+        example_question=question,
+        created=time.time(),
+    )
+
+
+class SqlPlanCache:
+    """LRU-bounded store of validated SQL templates."""
+
+    def __init__(self, max_templates: int = SQL_CACHE_MAX_TEMPLATES, path: str = SQL_CACHE_PATH):
+        self.max_templates = max_templates
+        self.path = Path(path) if path else None
+        self._templates: "OrderedDict[str, SqlTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+        self.evictions = 0
+        self.rejected = 0
+        self.unfit = 0
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    def _load(self):
+        try:
+            for data in json.loads(self.path.read_text(encoding="utf-8")):
+                self._templates[data["id"]] = SqlTemplate(**data)
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable SQL template cache {self.path}: {e}")
+
+    def _save(self):
+        if self.path is None:
+            return
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps([t.to_dict() for t in self._templates.values()], indent=2), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def match(self, question: str) -> Optional[Tuple[SqlTemplate, Dict[str, Any]]]:
+        """Find a template for `question`; returns (template, bound params) or None."""
+        if not SQL_CACHE_ENABLED:
+            return None
+        with self._lock:
+            # Most recently used first
+            for template in reversed(self._templates.values()):
+                params = template.bind(question)
+                if params is not None:
+                    template.hits += 1
+                    template.last_used = time.time()
+                    self._templates.move_to_end(template.id)
+                    self.hits += 1
+                    return template, params
+            self.misses += 1
+            return None
+
+    def learn(self, question: str, sql: str) -> Optional[SqlTemplate]:
+        """Store a template for SQL that executed successfully."""
+        if not SQL_CACHE_ENABLED or self.max_templates <= 0:
+            return None
+        if not re.match(r"^\s*(SELECT|WITH)\b", sql, re.I):
+            return None
+        template = extract_template(question, sql)
+        if template is None:
+            return None
+        with self._lock:
+            self._templates[template.id] = template
+            self._templates.move_to_end(template.id)
+            self.learned += 1
+            while len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+                self.evictions += 1
+            self._save()
+        logger.info(f"Learned SQL template {template.id}: {template.question_template!r}")
+        return template
+
+    def bind(self, template_id: str, question: str) -> Optional[Dict[str, Any]]:
+        """Bind `question` to one known template without counting a lookup; None if it doesn't fit."""
+        with self._lock:
+            template = self._templates.get(template_id)
+            return template.bind(question) if template is not None else None
+
+    def mark_unfit(self, template_id: str):
+        """A matched template's binding was refused (see sql_gen.bound_values_fit); count it as a miss."""
+        with self._lock:
+            template = self._templates.get(template_id)
+            if template is not None:
+                template.hits -= 1
+            self.hits -= 1
+            self.misses += 1
+            self.unfit += 1
+
+    def reject(self, template_id: str):
+        """Drop a template whose SQL failed when re-executed."""
+        with self._lock:
+            if self._templates.pop(template_id, None) is not None:
+                self.rejected += 1
+                self._save()
+
+    def purge(self, template_id: Optional[str] = None) -> int:
+        with self._lock:
+            if template_id is None:
+                removed = len(self._templates)
+                self._templates.clear()
+            else:
+                removed = 1 if self._templates.pop(template_id, None) is not None else 0
+            self._save()
+            return removed
+
+    def templates(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [t.to_dict() for t in reversed(self._templates.values())]
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": SQL_CACHE_ENABLED,
+            "templates": len(self._templates),
+            "max_templates": self.max_templates,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "learned": self.learned,
+            "evictions": self.evictions,
+            "rejected": self.rejected,
+            "unfit": self.unfit,
+        }
+
+
+sql_plan_cache = SqlPlanCache()
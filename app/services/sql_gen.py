@@ -1,10 +1,13 @@
 from __future__ import annotations
-from typing import Any, Dict, List, Tuple
-from sqlalchemy import text
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import SQLAlchemyError
+from typing import Any, Dict, Optional, Tuple
 import logging
-from app.services.groq_client import ask_llama3
+from app.services.groq_client import ask_llama3, ask_llama3_async, stream_llama3_async
+from app.services.executors import run_db
+from app.services.sql_cache import SqlTemplate, sql_plan_cache, value_shape
+from app.services.sql_guard import SqlResult, run_select
+from app.services.context_builder import Context, build_rows_context, prompt_tokens
+from app.services.metrics import SQL_QUERIES, SQL_ROWS
+from models import Base
 import re
 
 # Add this logger at the top of the file
@@ -73,9 +76,14 @@ ANSWER_SYSTEM = """
 You are Answer-Gen — an assistant that turns SQL query results into clear, concise answers for the user.
 
 Rules:
-1. Input: A natural-language user question and SQL result rows (provided as JSON-like records).
+1. Input: A natural-language user question and SQL result rows as a table:
+   - The first line lists the column names, separated by " | ".
+   - Each following line is one row, with values in the same column order; an empty value is NULL.
+   - A last line "... N more rows not shown (M total)." means only some rows are listed; the
+     "Across all rows:" counts after it (column: value=count, ...) cover every row, so use them for totals.
+   - A last line "... more rows matched but were cut off by the row limit." means the result is incomplete.
 2. Output: A short, direct answer in plain language.
-3. If the result set is empty:
+3. If the context is "(no rows)":
    → Respond clearly that no matching records were found.
 4. If helpful for clarity:
    → Present results as a compact bullet-point or table-like list (no full SQL tables).
@@ -85,14 +93,14 @@ Rules:
 6. Keep formatting clean and user-friendly.
 """
 
-def llm_generate_sql(question:str):
-    user_prompt = f"""
+def sql_user_prompt(question:str) -> str:
+    return f"""
     User: {question}
     Output:
     "<SQL_QUERY>"
     """
-    raw_sql = ask_llama3(SQL_SYSTEM, user_prompt)
-    
+
+def clean_sql(raw_sql:str) -> str:
     # Clean up common SQL syntax issues
     # Add space between LIMIT and number if missing
     raw_sql = re.sub(r'LIMIT(\d+)', r'LIMIT \1', raw_sql)
@@ -101,28 +109,108 @@ def llm_generate_sql(question:str):
     logger.info(f"Generated SQL: {raw_sql}")
     return raw_sql
 
-def execute_sql(db:Session, sql:str):
-    try:
-        # Add regex to fix common SQL syntax issues
-        sql = re.sub(r'LIMIT(\d+)', r'LIMIT \1', sql)
-        
-        result = db.execute(text(sql))
-        cols = list(result.keys())  # Convert to list for serialization
-        rows = [dict(zip(cols, r)) for r in result.fetchall()]
-        return cols, rows
-    except SQLAlchemyError as e:
-        logger.error(f"Database error executing SQL: {str(e)}")
-        logger.error(f"Problem SQL: {sql}")
-        # Return empty results rather than crashing
-        return [], []
-    except Exception as e:
-        logger.error(f"Unexpected error executing SQL: {str(e)}")
-        logger.error(f"Problem SQL: {sql}")
-        return [], []
-
-def llm_compose_answer(question:str, rows: List[Dict[str, Any]])-> str:
-    user_prompt = f"""
+def llm_generate_sql(question:str):
+    return clean_sql(ask_llama3(SQL_SYSTEM, sql_user_prompt(question)))
+
+async def llm_generate_sql_async(question:str):
+    return clean_sql(await ask_llama3_async(SQL_SYSTEM, sql_user_prompt(question)))
+
+def _column_has_value(column:str, value:Any) -> bool:
+    tables = [t for t in SCHEMAS if column in Base.metadata.tables[t].columns]
+    if not tables:
+        return True  # not a plain column (alias, expression); only the shape was checked
+    for table in tables:
+        # Names come from the model metadata, the value is bound
+        found = run_select(f"SELECT 1 FROM {table} WHERE {column} = :v LIMIT 1", {"v": value})
+        if found.ok and found.rows:
+            return True
+    return False
+
+def bound_values_fit(template:SqlTemplate, params:Dict[str, Any]) -> bool:
+    """
+    Whether every string the question bound looks like the value the template
+    was learned from and occurs in the column it's compared with. The template
+    learned from "show open jira tickets" also matches "show all jira tickets",
+    but no ticket has status 'All'.
+    """
+    for i, spec in enumerate(template.params):
+        if spec["kind"] != "str":
+            continue
+        value = params[f"p{i}"]
+        if "shape" in spec and value_shape(value) != spec["shape"]:
+            return False
+        if spec.get("column") and not _column_has_value(spec["column"], value):
+            return False
+    return True
+
+def _cached_plan(question:str) -> Optional[Tuple[str, Dict[str, Any], Optional[str]]]:
+    cached = sql_plan_cache.match(question)
+    if cached is None:
+        return None
+    template, params = cached
+    if not bound_values_fit(template, params):
+        sql_plan_cache.mark_unfit(template.id)
+        logger.info(f"SQL template {template.id} doesn't fit {params}; generating SQL")
+        return None
+    logger.info(f"SQL template {template.id} hit: {params}")
+    return template.sql, params, template.id
+
+async def plan_sql_async(question:str, use_cache:bool = True) -> Tuple[str, Dict[str, Any], Optional[str]]:
+    """
+    SQL for `question`: a cached template bound to the question's values when
+    one matches and the values fit, otherwise a fresh LLM generation.
+    Returns (sql, params, template_id). The value check reads the DB, so it
+    runs on the DB executor.
+    """
+    cached = await run_db(_cached_plan, question) if use_cache else None
+    if cached is not None:
+        return cached
+    return await llm_generate_sql_async(question), {}, None
+
+def record_sql_result(question:str, sql:str, template_id:Optional[str], result:SqlResult):
+    """Learn a template from SQL that ran, or drop a cached one that no longer does."""
+    if template_id is None:
+        if result.ok:
+            sql_plan_cache.learn(question, sql)
+    elif not result.ok:
+        sql_plan_cache.reject(template_id)
+
+def execute_sql(sql:str, params:Optional[Dict[str, Any]] = None) -> SqlResult:
+    """
+    Run generated SQL through the guarded read-only executor: single SELECT
+    only, LIMIT clamped to SQL_MAX_ROWS, bounded by SQL_TIMEOUT_MS.
+    """
+    # Add space between LIMIT and number if missing
+    sql = re.sub(r'LIMIT(\d+)', r'LIMIT \1', sql)
+    result = run_select(sql, params)
+    SQL_QUERIES.inc(outcome="error" if not result.ok else "truncated" if result.truncated else "ok")
+    if result.ok:
+        SQL_ROWS.observe(len(result.rows))
+    return result
+
+async def execute_sql_async(sql:str, params:Optional[Dict[str, Any]] = None) -> SqlResult:
+    """Run the query on the DB executor so SQLite I/O doesn't stall the event loop."""
+    return await run_db(execute_sql, sql, params)
+
+def answer_user_prompt(question:str, context: Context) -> str:
+    return f"""
         USER: {question}
-        CONTEXT: {rows}
+        CONTEXT:
+        {context.text}
     """
-    return ask_llama3(ANSWER_SYSTEM, user_prompt)
\ No newline at end of file
+
+def rows_context(question:str, result:SqlResult) -> Context:
+    """Fit the result rows into the SQL token budget for the answer prompt."""
+    context = build_rows_context(result.columns, result.rows, truncated_by_query=result.truncated)
+    context.prompt_tokens = prompt_tokens(ANSWER_SYSTEM, answer_user_prompt(question, context))
+    return context
+
+def llm_compose_answer(question:str, context: Context)-> str:
+    return ask_llama3(ANSWER_SYSTEM, answer_user_prompt(question, context))
+
+async def llm_compose_answer_async(question:str, context: Context)-> str:
+    return await ask_llama3_async(ANSWER_SYSTEM, answer_user_prompt(question, context))
+
+async def llm_compose_answer_stream(question:str, context: Context):
+    async for token in stream_llama3_async(ANSWER_SYSTEM, answer_user_prompt(question, context)):
+        yield token
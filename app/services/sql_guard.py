@@ -0,0 +1,270 @@
+# root: app/services/sql_guard.py
+from __future__ import annotations
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# Add the project root to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+from create_db import read_engine
+
+logger = logging.getLogger(__name__)
+
+SQL_MAX_ROWS = int(os.getenv("SQL_MAX_ROWS", "50"))             # hard cap on rows returned per query
+SQL_TIMEOUT_MS = float(os.getenv("SQL_TIMEOUT_MS", "2000"))     # wall-clock budget per query
+SQL_FETCH_BATCH = int(os.getenv("SQL_FETCH_BATCH", "100"))
+SQL_PROGRESS_STEPS = int(os.getenv("SQL_PROGRESS_STEPS", "200"))  # VM instructions between budget checks
+# JSONL log of executed SQL for app/scripts/explain_query_log.py; off unless set
+# (e.g. SQL_QUERY_LOG=data/sql_query_log.jsonl). Written by a background thread.
+SQL_QUERY_LOG = os.getenv("SQL_QUERY_LOG", "")
+SQL_QUERY_LOG_MAX_BYTES = int(os.getenv("SQL_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # then rotated to <log>.1
+SQL_QUERY_LOG_QUEUE = 10000  # entries waiting for the writer; more are dropped, not waited for
+
+# Everything a plain SELECT needs; writes, PRAGMA, ATTACH etc. are denied
+ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION}
+if hasattr(sqlite3, "SQLITE_RECURSIVE"):
+    ALLOWED_ACTIONS.add(sqlite3.SQLITE_RECURSIVE)
+
+TRAILING_LIMIT_RE = re.compile(
+    r"\bLIMIT\s+(?P<limit>\d+|:\w+)(?:\s*(?P<comma>,)\s*(?P<count>\d+|:\w+)|\s+OFFSET\s+(?P<offset>\d+|:\w+))?\s*$",
+    re.I,
+)
+
+
+class SqlRejected(ValueError):
+    """The statement isn't a single read-only SELECT."""
+
+
+@dataclass
+class SqlResult:
+    columns: List[str] = field(default_factory=list)
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+    truncated: bool = False      # the row cap cut off rows the query would have returned
+    limit: Optional[int] = None  # effective LIMIT after clamping
+    elapsed_ms: float = 0.0
+    # SQLite VM instructions executed, counted by the progress handler in steps of
+    # SQL_PROGRESS_STEPS, so a lower bound rounded down to that granularity. A
+    # measure of work done, not of rows scanned: each row visited costs several
+    # instructions, and the count depends on the query shape.
+    vm_instructions_approx: int = 0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": len(self.rows),
+            "truncated": self.truncated,
+            "limit": self.limit,
+            "elapsed_ms": round(self.elapsed_ms, 2),
+            "vm_instructions_approx": self.vm_instructions_approx,
+            "error": self.error,
+        }
+
+
+def _strip_comments(sql: str) -> str:
+    """Drop -- and /* */ comments outside string literals."""
+    out, i, n = [], 0, len(sql)
+    while i < n:
+        ch = sql[i]
+        if ch in ("'", '"'):
+            j = i + 1
+            while j < n:
+                if sql[j] == ch:
+                    if j + 1 < n and sql[j + 1] == ch:
+                        j += 2
+                        continue
+                    break
+                j += 1
+            out.append(sql[i:j + 1])
+            i = j + 1
+        elif sql.startswith("--", i):
+            j = sql.find("\n", i)
+            i = n if j < 0 else j
+        elif sql.startswith("/*", i):
+            j = sql.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+            out.append(" ")
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+def normalize_select(sql: str) -> str:
+    """
+    Return `sql` as a single SELECT (or WITH ... SELECT) without comments or
+    the trailing semicolon; raise SqlRejected for anything else.
+    """
+    sql = _strip_comments(sql).strip().strip("`").strip()
+    while sql.endswith(";"):
+        sql = sql[:-1].rstrip()
+    if not sql:
+        raise SqlRejected("empty statement")
+    if not sqlite3.complete_statement(sql + ";"):
+        raise SqlRejected("incomplete statement")
+    # A complete statement before the end means there's more than one
+    for match in re.finditer(";", sql):
+        if sqlite3.complete_statement(sql[:match.end()]):
+            raise SqlRejected("multiple statements")
+    if not re.match(r"^(SELECT|WITH)\b", sql, re.I):
+        raise SqlRejected(f"only SELECT is allowed, got {sql.split(None, 1)[0].upper()!r}")
+    return sql
+
+
+def enforce_limit(sql: str, params: Dict[str, Any], max_rows: int) -> Tuple[str, Dict[str, Any], int, bool]:
+    """
+    Clamp a trailing LIMIT to `max_rows` (or add one) and ask SQLite for one
+    extra row so truncation can be detected. Returns (sql, params, effective
+    limit, capped) where `capped` means the guard, not the query, set the limit.
+    """
+    params = dict(params)
+    match = TRAILING_LIMIT_RE.search(sql)
+    if match is None:
+        return f"{sql}\nLIMIT {max_rows + 1}", params, max_rows, True
+
+    # "LIMIT offset, count" puts the row count second
+    token = match.group("count") if match.group("comma") else match.group("limit")
+    if token.startswith(":"):
+        requested = int(params.get(token[1:], max_rows))
+    else:
+        requested = int(token)
+    limit = max(0, min(requested, max_rows))
+    params["_guard_limit"] = limit + 1
+    group = "count" if match.group("comma") else "limit"
+    start, end = match.span(group)
+    return sql[:start] + ":_guard_limit" + sql[end:], params, limit, requested > max_rows
+
+
+def _authorizer(action, arg1, arg2, db_name, trigger):
+    return sqlite3.SQLITE_OK if action in ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+
+class QueryLog:
+    """
+    Size-capped JSONL log appended by one background thread, so a request
+    only pays for a queue put. Past `max_bytes` the file is rotated to
+    <name>.1 (one old generation is kept).
+    """
+
+    def __init__(self, path: str = SQL_QUERY_LOG, max_bytes: int = SQL_QUERY_LOG_MAX_BYTES,
+                 max_queue: int = SQL_QUERY_LOG_QUEUE):
+        self.path = Path(path) if path else None
+        self.max_bytes = max_bytes
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def write(self, entry: Dict[str, Any]):
+        if self.path is None:
+            return
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._run, name="sql-query-log", daemon=True)
+                    self._writer.start()
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            entries = [self._queue.get()]
+            while True:
+                try:
+                    entries.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._rotate()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(e, default=str) + "\n" for e in entries))
+            except OSError as e:
+                logger.warning(f"Could not write SQL query log: {e}")
+
+    def _rotate(self):
+        if self.max_bytes > 0 and self.path.exists() and self.path.stat().st_size >= self.max_bytes:
+            os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+
+
+query_log = QueryLog()
+
+
+def log_query(sql: str, params: Dict[str, Any], result: SqlResult):
+    if query_log.path is not None:
+        query_log.write({"ts": time.time(), "sql": sql, "params": params, **result.stats()})
+
+
+def run_select(sql: str, params: Optional[Dict[str, Any]] = None, max_rows: int = SQL_MAX_ROWS,
+               timeout_ms: float = SQL_TIMEOUT_MS) -> SqlResult:
+    """
+    Run one SELECT on a read-only connection with a row cap and time budget.
+    Never raises for bad SQL; the reason is in `SqlResult.error`.
+    """
+    result = SqlResult()
+    start = time.perf_counter()
+    try:
+        sql = normalize_select(sql)
+        sql, bound, result.limit, capped = enforce_limit(sql, params or {}, max_rows)
+    except SqlRejected as e:
+        logger.warning(f"Rejected SQL ({e}): {sql}")
+        result.error = f"rejected: {e}"
+        return result
+
+    # Pooled read-only connection (query_only, tuned pragmas) from create_db
+    pooled = read_engine.raw_connection()
+    conn: sqlite3.Connection = pooled.driver_connection
+    conn.set_authorizer(_authorizer)
+    deadline = start + timeout_ms / 1000.0
+    steps = [0]
+
+    def _progress():
+        steps[0] += 1
+        return 1 if time.perf_counter() > deadline else 0  # non-zero aborts the statement
+
+    conn.set_progress_handler(_progress, SQL_PROGRESS_STEPS)
+    cursor = None
+    try:
+        cursor = conn.execute(sql, bound)
+        result.columns = [d[0] for d in cursor.description or ()]
+        fetched: List[tuple] = []
+        while len(fetched) <= result.limit:
+            batch = cursor.fetchmany(min(SQL_FETCH_BATCH, result.limit + 1 - len(fetched)))
+            if not batch:
+                break
+            fetched.extend(batch)
+        result.truncated = capped and len(fetched) > result.limit
+        result.rows = [dict(zip(result.columns, r)) for r in fetched[:result.limit]]
+    except sqlite3.OperationalError as e:
+        if "interrupted" in str(e):
+            result.error = f"timeout: exceeded {timeout_ms:.0f} ms"
+        else:
+            result.error = f"database error: {e}"
+        logger.error(f"SQL failed ({result.error}): {sql}")
+    except sqlite3.DatabaseError as e:
+        result.error = f"database error: {e}"
+        logger.error(f"SQL failed ({result.error}): {sql}")
+    finally:
+        if cursor is not None:
+            cursor.close()
+        conn.set_progress_handler(None, 0)
+        conn.set_authorizer(None)
+        pooled.close()  # back to the pool
+        result.vm_instructions_approx = steps[0] * SQL_PROGRESS_STEPS
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+    log_query(sql, bound, result)
+    return result
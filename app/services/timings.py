@@ -0,0 +1,71 @@
+# root: app/services/timings.py
+from __future__ import annotations
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Optional
+from app.services.metrics import STAGE_SECONDS
+
+# The Timings of the request being served; run_cpu / run_db carry it into executor threads
+_current: ContextVar[Optional["Timings"]] = ContextVar("timings", default=None)
+
+
+class Timings:
+    """Wall-clock milliseconds per pipeline stage for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()  # hybrid branches record from two threads
+
+    def bind(self) -> "Timings":
+        """Make this the current request's Timings, so `stage()` in lower layers records here."""
+        _current.set(self)
+        return self
+
+    def record(self, name: str, ms: float, observe: bool = True):
+        with self._lock:
+            self.stages[name] = round(self.stages.get(name, 0.0) + ms, 2)
+        if observe:
+            STAGE_SECONDS.observe(ms / 1000, stage=name)
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000)
+
+    async def timed(self, name: str, awaitable: Awaitable[Any]) -> Any:
+        """Await `awaitable`, recording its duration under `name` (usable inside asyncio tasks)."""
+        with self.stage(name):
+            return await awaitable
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            stages = dict(self.stages)
+        return {**stages, "total": round((time.perf_counter() - self.started) * 1000, 2)}
+
+
+def current_timings() -> Optional[Timings]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a low-level stage (embedding, index search, LLM call): always into
+    the stage histogram, and into the current request's timings when there is one.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - started) * 1000
+        timings = _current.get()
+        if timings is not None:
+            timings.record(name, ms)
+        else:
+            STAGE_SECONDS.observe(ms / 1000, stage=name)
@@ -0,0 +1,81 @@
+# root: app/services/tokenizer.py
+from __future__ import annotations
+import logging
+import math
+import sys
+import threading
+from pathlib import Path
+from typing import Optional
+
+# Add the project root to the Python path
+root_dir = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(root_dir))
+from app.services.embeddings import EMBEDDING_MODEL_NAME, EMBEDDING_MODEL_PATH
+
+logger = logging.getLogger(__name__)
+
+
+def embedding_tokenizer_source(allow_hub: bool = False) -> str:
+    """The embedding model's tokenizer.json, or its hub id when `allow_hub` ("" if neither applies)."""
+    if EMBEDDING_MODEL_PATH and (Path(EMBEDDING_MODEL_PATH) / "tokenizer.json").exists():
+        return str(Path(EMBEDDING_MODEL_PATH) / "tokenizer.json")
+    return EMBEDDING_MODEL_NAME if allow_hub and not EMBEDDING_MODEL_PATH else ""
+
+
+class TokenCounter:
+    """
+    Counts tokens with a HF `tokenizers` tokenizer (a tokenizer.json path or a
+    hub id), loaded on first use. Falls back to a ~4-chars-per-token estimate
+    when there is no source or it can't be loaded; `name` says which is in use.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self._tokenizer = None
+        self._name: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._name is not None:
+                return
+            if self.source:
+                try:
+                    from tokenizers import Tokenizer
+                    source = self.source
+                    tokenizer = Tokenizer.from_file(source) if Path(source).exists() else Tokenizer.from_pretrained(source)
+                    # Counting only: budgets apply to the whole text, not a model's max length
+                    tokenizer.no_truncation()
+                    tokenizer.no_padding()
+                    self._tokenizer = tokenizer
+                    self._name = source
+                    return
+                except Exception as e:
+                    logger.warning(f"Could not load tokenizer {self.source!r}, estimating token counts instead: {e}")
+            self._name = "estimate"
+
+    @property
+    def name(self) -> str:
+        self._load()
+        return self._name
+
+    def count(self, text: str) -> int:
+        """Tokens in `text`, without special tokens such as [CLS]/[SEP]."""
+        if not text:
+            return 0
+        self._load()
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        return math.ceil(len(text) / 4)
+
+    def truncate(self, text: str, budget: int) -> str:
+        """Longest whole-word prefix of `text` within `budget` tokens."""
+        words = text.split()
+        lo, hi = 0, len(words)
+        while lo < hi:  # binary search on the word count
+            mid = (lo + hi + 1) // 2
+            if self.count(" ".join(words[:mid])) <= budget:
+                lo = mid
+            else:
+                hi = mid - 1
+        return " ".join(words[:lo])
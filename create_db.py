@@ -1,8 +1,82 @@
 # create_db.py
-from sqlalchemy import create_engine
+import argparse
+import os
+from pathlib import Path
+from sqlalchemy import create_engine, event
 from models import Base
+from migrations import SCHEMA_VERSION, current_version, migrate
 from sqlalchemy.orm import sessionmaker
 
-engine = create_engine("sqlite:///data/data_store.db", echo=True)
+ROOT_DIR = Path(__file__).resolve().parent
+DB_PATH = Path(os.getenv("DB_PATH", ROOT_DIR / "data" / "data_store.db")).resolve()
+DATABASE_URL = f"sqlite:///{DB_PATH}"
+# Read-only URI: API queries can never write, even if a statement slips past validation
+READONLY_DATABASE_URL = f"sqlite:///file:{DB_PATH}?mode=ro&uri=true"
+
+DB_ECHO = os.getenv("DB_ECHO", "0") == "1"  # log every statement (debugging only)
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "1") == "1"  # upgrade the DB file when the API starts
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.getenv("DB_CACHE_SIZE_KB", "65536"))    # page cache per connection
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+# One read connection per DB executor thread
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", os.getenv("DB_EXECUTOR_WORKERS", "8")))
+
+
+def _apply_pragmas(dbapi_conn, readonly: bool):
+    cursor = dbapi_conn.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size = -{DB_CACHE_SIZE_KB}")
+    cursor.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    cursor.execute("PRAGMA temp_store = MEMORY")
+    if readonly:
+        cursor.execute("PRAGMA query_only = ON")
+    else:
+        # WAL lets readers keep going while the loader writes; NORMAL is durable
+        # across app crashes and only risks the last commit on power loss
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.close()
+
+
+engine = create_engine(DATABASE_URL, echo=DB_ECHO, connect_args={"check_same_thread": False})
+read_engine = create_engine(
+    READONLY_DATABASE_URL,
+    echo=DB_ECHO,
+    connect_args={"check_same_thread": False},
+    pool_size=DB_READ_POOL_SIZE,
+    max_overflow=0,
+    pool_timeout=30,
+)
+
+
+@event.listens_for(engine, "connect")
+def _on_connect(dbapi_conn, connection_record):
+    _apply_pragmas(dbapi_conn, readonly=False)
+
+
+@event.listens_for(read_engine, "connect")
+def _on_read_connect(dbapi_conn, connection_record):
+    _apply_pragmas(dbapi_conn, readonly=True)
+
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base.metadata.create_all(engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+def init_db(run_migrations: bool = DB_AUTO_MIGRATE) -> int:
+    """
+    Create missing tables and apply pending migrations; returns the schema
+    version. Called from the API lifespan and the CLI below, never on import:
+    read-only tools import this module without touching the DB file.
+    """
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    Base.metadata.create_all(engine)
+    return migrate(engine) if run_migrations else current_version(engine)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create the SQLite tables and upgrade the schema")
+    parser.add_argument("--migrate", action="store_true", help="also apply pending migrations")
+    args = parser.parse_args()
+    print(f"Database: {DB_PATH}")
+    print(f"Schema version: v{init_db(run_migrations=args.migrate)} (latest v{SCHEMA_VERSION})")
@@ -1,28 +1,82 @@
-from fastapi import FastAPI, HTTPException, Query, Depends
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exception_handlers import request_validation_exception_handler
 from fastapi.exceptions import RequestValidationError
+import json
 import logging
+import os
+import threading
+import time
 import traceback
-from app.services.router import route_query
-from sqlalchemy.orm import Session
-from app.services.classifier import classify_query_with_llm
-from app.services.groq_client import ask_llama3
-from app.services.kb_retriever import search_kb
-from create_db import SessionLocal
+from contextlib import asynccontextmanager
+from app.services.router import route_query_async, route_query_stream, route_query_batch
+from app.services.classifier import classify_query_async, classify_queries_async
+from app.services import llm_client
+from app.services import executors
+from app.services.executors import run_cpu
+from app.services.kb_router import answer_with_kb_async, answer_with_kb_stream
+from app.services.answer_cache import answer_cache, cached_answer, cached_answers
+from app.services.sql_cache import sql_plan_cache
+from app.services.kb_retriever import search_kb, search_kb_batch, SEARCH_MODES
+from app.services.kb_store import kb_store
+from app.services import kb_reranker
+from app.services import metrics
+from app.services.timings import Timings
+from app.services.embeddings import query_cache, warm_up, is_model_loaded, model_status
+from app.models.request_models import KBSearchBatchRequest, BatchRequest, RouteBatchRequest
+from create_db import init_db
 # Configure logging
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),  # DEBUG adds raw LLM responses
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[logging.StreamHandler()]
 )
 logger = logging.getLogger(__name__)
 
+# Load the embedding model in the background at startup (0 = load on first query)
+EMBED_WARMUP = os.getenv("EMBED_WARMUP", "1") == "1"
+
+
+def _warm_up_embeddings():
+    try:
+        warm_up()
+        logger.info(f"Embedding model ready: {model_status()}")
+    except Exception as e:
+        logger.error(f"Embedding model warm-up failed: {str(e)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Create missing tables and, with DB_AUTO_MIGRATE, apply pending schema migrations
+    try:
+        init_db()
+    except Exception as e:
+        logger.error(f"Database not migrated at startup: {str(e)}")
+    # Load the KB index once per process and keep it resident; the store
+    # watches the files and hot-swaps a new snapshot when they change
+    try:
+        kb_store.start()
+    except Exception as e:
+        logger.error(f"KB index not loaded at startup: {str(e)}")
+    # Warm the model off the event loop so the server binds immediately;
+    # /health/ready reports 503 until it's loaded
+    if EMBED_WARMUP:
+        threading.Thread(target=_warm_up_embeddings, name="embedding-warmup", daemon=True).start()
+    # Until the cross-encoder is loaded, reranking requests keep the first-stage order
+    if kb_reranker.KB_RERANK:
+        kb_reranker.load_in_background()
+    yield
+    kb_store.stop()
+    await llm_client.aclose()
+    executors.shutdown()
+
+
 app = FastAPI(
     title="Harri Assistant API",
     description="API for loading and serving data from JSON files",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -36,6 +90,43 @@ app.add_middleware(
 
 
 
+# Cache and rerank counters are kept by their modules; /metrics reads them at scrape time
+CACHE_STATS = {"query_embedding": query_cache.stats, "answer": answer_cache.stats, "sql_plan": sql_plan_cache.stats}
+
+
+def _cache_stats():
+    return {name: stats() for name, stats in CACHE_STATS.items()}
+
+
+metrics.CallbackMetric("assistant_cache_hits_total", "Cache hits", "counter", ("cache",),
+                       lambda: {(n,): s["hits"] + s.get("disk_hits", 0) for n, s in _cache_stats().items()})
+metrics.CallbackMetric("assistant_cache_misses_total", "Cache misses", "counter", ("cache",),
+                       lambda: {(n,): s["misses"] for n, s in _cache_stats().items()})
+metrics.CallbackMetric("assistant_cache_hit_ratio", "Cache hit rate since start", "gauge", ("cache",),
+                       lambda: {(n,): s["hit_rate"] for n, s in _cache_stats().items()})
+metrics.CallbackMetric("assistant_rerank_total", "Rerank calls by outcome", "counter", ("outcome",),
+                       lambda: {("reranked",): kb_reranker.stats()["reranked"],
+                                **{(reason,): n for reason, n in kb_reranker.stats()["fallbacks"].items()}})
+
+
+# Per-request stage timings: lower layers record into them; they feed the
+# latency histograms and a Server-Timing header
+@app.middleware("http")
+async def request_timings(request: Request, call_next):
+    timings = Timings().bind()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        route = request.scope.get("route")
+        metrics.HTTP_SECONDS.observe(time.perf_counter() - timings.started, method=request.method,
+                                     path=route.path if route is not None else "unmatched", status=status)
+    if metrics.METRICS_ENABLED and timings.stages:
+        response.headers["Server-Timing"] = ", ".join(f"{name};dur={ms}" for name, ms in timings.as_dict().items())
+    return response
+
+
 # Global exception handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
@@ -53,42 +144,200 @@ async def validation_exception_handler(request, exc):
     return await request_validation_exception_handler(request, exc)
 
 
-# END POINT TO RETREIVE RELEVANT DOCS FROM FAISS
+# LIVENESS: THE PROCESS IS UP AND SERVING HTTP
+@app.get('/health/live')
+def health_live():
+    return {"status": "ok"}
+
+
+# READINESS: EMBEDDING MODEL AND KB INDEX ARE LOADED
+@app.get('/health/ready')
+def health_ready():
+    kb = kb_store.stats()
+    ready = is_model_loaded() and kb["loaded"]
+    body = {
+        "ready": ready,
+        "embedding_model": model_status(),
+        "kb_index": {"loaded": kb["loaded"], "generation": kb.get("generation")},
+    }
+    return JSONResponse(status_code=200 if ready else 503, content=body)
+
+
+# END POINT TO RETREIVE RELEVANT DOCS (mode: dense = FAISS (default), bm25 = keyword index, hybrid = RRF of both;
+# rerank = rescore a wider candidate set with the cross-encoder within rerank_budget_ms)
 @app.get('/kb/search')
-def kb_search(q:str=Query(...), k:int=5):
-    results = search_kb(q, k)
+async def kb_search(q:str=Query(...), k:int=5, nprobe:int=None, ef_search:int=None, mode:str=None,
+                    rerank:bool=None, rerank_budget_ms:float=None):
+    if mode is not None and mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}")
+    results = await run_cpu(search_kb, q, k, nprobe=nprobe, ef_search=ef_search, mode=mode,
+                            rerank=rerank, rerank_budget_ms=rerank_budget_ms)
     return results
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# PROMETHEUS METRICS: STAGE LATENCY HISTOGRAMS, LLM TOKENS, SQL ROW COUNTS, CACHE HIT RATES
+@app.get('/metrics')
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# END POINT TO INSPECT THE IN-MEMORY KB INDEX (LOAD TIME, SIZE, GENERATION)
+@app.get('/kb/stats')
+def kb_stats():
+    return {**kb_store.stats(), "reranker": kb_reranker.stats()}
+
+
+# END POINT TO INSPECT THE QUERY-EMBEDDING CACHE (HIT/MISS/EVICTION COUNTERS)
+@app.get('/embeddings/cache/stats')
+def embedding_cache_stats():
+    return query_cache.stats()
+
+
+# END POINT TO INSPECT THE SEMANTIC ANSWER CACHE
+@app.get('/cache/answers/stats')
+def answer_cache_stats():
+    return answer_cache.stats()
+
+
+# END POINT TO PURGE CACHED ANSWERS (ALL, OR ONE ROUTE: kb | db)
+@app.delete('/cache/answers')
+def answer_cache_purge(route: str = None):
+    return {"removed": answer_cache.invalidate(route)}
+
+
+# END POINT TO INSPECT THE SQL PLAN CACHE (HIT RATE + LEARNED QUESTION TEMPLATES)
+@app.get('/sql/templates')
+def sql_templates():
+    return {**sql_plan_cache.stats(), "items": sql_plan_cache.templates()}
+
+
+# END POINT TO PURGE CACHED SQL TEMPLATES (ALL, OR ONE BY ID)
+@app.delete('/sql/templates')
+def sql_templates_purge(template_id: str = None):
+    return {"removed": sql_plan_cache.purge(template_id)}
+
 
 # END POINT TO RETRIEVE RELEVANT DOCS FROM FAISS THEN SEND TO GROQ LLM TO GENERATE PROPER RESPONSE
 @app.get('/kb/ask')
-def kb_ask(q:str=Query(...), k:int=5):
-    chunks = search_kb(q, k)
-    context_text = "\n".join([chunk["text"] for chunk in chunks])
-    
-    system_prompt = "You are a helpful assistant that answers questions using the provided context."
-    user_prompt = f"Answer the following question using ONLY the provided context:\n\nContext:\n{context_text}\n\nQuestion: {q}"
-    response = ask_llama3(system_prompt, user_prompt)
-    return {
-        "question":q,
-        "answer": response,
-        "sources": chunks
-    }
+async def kb_ask(q:str=Query(...), k:int=5):
+    # Paraphrases of a recent question reuse its answer (see answer_cache)
+    return await cached_answer(f"kb_ask:k={k}", q, lambda: answer_with_kb_async(q, k), route_of=lambda r: "kb")
+
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 
+def sse_response(events, question: str) -> StreamingResponse:
+    """
+    Wrap an (event, data) async generator as server-sent events. Tokens are
+    forwarded as they arrive; `done` carries the full answer, `error` replaces
+    it if the pipeline fails mid-stream.
+    """
+    async def body():
+        answer = []
+        try:
+            async for event, data in events:
+                if event == "token":
+                    answer.append(data)
+                    yield sse_event("token", {"text": data})
+                else:
+                    yield sse_event(event, data)
+            yield sse_event("done", {"question": question, "answer": "".join(answer)})
+        except Exception as e:
+            logger.error(f"Streaming failed: {str(e)}")
+            logger.error(traceback.format_exc())
+            yield sse_event("error", {"message": "An internal server error occurred", "details": str(e)})
 
-# END POINT TO CLASSIFY USER QUERY INTO DB, OR KB
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# STREAMING VARIANT OF /kb/ask: SOURCES FIRST, THEN ANSWER TOKENS (SERVER-SENT EVENTS)
+@app.get('/kb/ask/stream')
+async def kb_ask_stream(q:str=Query(...), k:int=5):
+    return sse_response(answer_with_kb_stream(q, k), q)
+
+
+# END POINT TO CLASSIFY USER QUERY INTO DB, KB OR HYBRID
 @app.get("/route/classify")
-def api_classify(q: str = Query(...)):
-    return classify_query_with_llm(q)
+async def api_classify(q: str = Query(...)):
+    return await classify_query_async(q)
 
 # END POINT TO RESPOND TO USER QUERY BASED ON ROUTING
 @app.get("/route/ask")
-def api_route(q: str = Query(...), db: Session = Depends(get_db)):
-    return route_query(q, db)
\ No newline at end of file
+async def api_route(q: str = Query(...)):
+    # Retrieval and SQL generation overlap the classifier call (ROUTE_SPECULATIVE); see `timings` in the response
+    return await cached_answer("route_ask", q, lambda: route_query_async(q))
+
+
+# STREAMING VARIANT OF /route/ask: ROUTE, THEN SOURCES OR ROWS, THEN ANSWER TOKENS (SERVER-SENT EVENTS)
+@app.get("/route/ask/stream")
+async def api_route_stream(q: str = Query(...)):
+    return sse_response(route_query_stream(q), q)
+
+
+def batch_item(index: int, query: str, value) -> dict:
+    if isinstance(value, BaseException):
+        logger.error(f"Batch item {index} failed: {str(value)}")
+        return {"index": index, "query": query, "ok": False,
+                "error": {"type": value.__class__.__name__, "message": str(value)}}
+    return {"index": index, "query": query, "ok": True, "result": value}
+
+
+async def batch_response(items, queries):
+    """
+    Collect an async iterator of (index, result or exception) into one JSON
+    body. One failed query becomes an error item; it doesn't fail the batch.
+    """
+    results = [batch_item(i, queries[i], value) async for i, value in items]
+    return {"results": results, "count": len(results), "errors": sum(not r["ok"] for r in results)}
+
+
+def ndjson_response(items, queries) -> StreamingResponse:
+    """Stream the same items as NDJSON, one line per query in input order, each sent once it's ready."""
+    async def body():
+        try:
+            async for i, value in items:
+                yield json.dumps(batch_item(i, queries[i], value), default=str) + "\n"
+        except Exception as e:
+            logger.error(f"Batch streaming failed: {str(e)}")
+            logger.error(traceback.format_exc())
+            yield json.dumps({"ok": False, "error": {"type": e.__class__.__name__, "message": str(e)}}) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+async def batch_reply(items, body: BatchRequest):
+    return ndjson_response(items, body.queries) if body.stream else await batch_response(items, body.queries)
+
+
+async def _enumerated(results):
+    for i, value in enumerate(results):
+        yield i, value
+
+
+# BATCH /kb/search: ONE EMBEDDING CALL AND ONE FAISS SEARCH FOR ALL QUERIES
+@app.post('/kb/search/batch')
+async def kb_search_batch(body: KBSearchBatchRequest):
+    results = await run_cpu(search_kb_batch, body.queries, body.k, nprobe=body.nprobe, ef_search=body.ef_search,
+                            mode=body.mode, rerank=body.rerank, rerank_budget_ms=body.rerank_budget_ms)
+    return await batch_reply(_enumerated(results), body)
+
+
+# BATCH /route/classify: LOCAL CLASSIFIER OVER THE WHOLE BATCH, LLM FALLBACKS WITH BOUNDED CONCURRENCY
+@app.post('/route/classify/batch')
+async def api_classify_batch(body: BatchRequest):
+    return await batch_reply(_enumerated(await classify_queries_async(body.queries)), body)
+
+
+# BATCH /route/ask: CACHE HITS SERVED DIRECTLY, MISSES CLASSIFIED, RETRIEVED AND ANSWERED TOGETHER
+@app.post('/route/ask/batch')
+async def api_route_batch(body: RouteBatchRequest):
+    concurrency = min(body.concurrency or llm_client.LLM_BATCH_CONCURRENCY, llm_client.LLM_MAX_CONCURRENCY)
+    items = cached_answers("route_ask", body.queries, lambda misses: route_query_batch(misses, concurrency))
+    return await batch_reply(items, body)
@@ -0,0 +1,58 @@
+# migrations.py
+# Versioned, in-place upgrades for existing data_store.db files. The applied
+# version lives in `PRAGMA user_version` and each migration runs once, in
+# order. Statements must be idempotent (IF NOT EXISTS) so a migration that was
+# interrupted before its version was recorded can simply run again.
+# Append new migrations, never edit old ones.
+import logging
+import sys
+from typing import List, Tuple
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS: List[Tuple[int, str, List[str]]] = [
+    (1, "secondary indexes for common filters and joins", [
+        "CREATE INDEX IF NOT EXISTS ix_employees_jira_username ON employees (jira_username)",
+        "CREATE INDEX IF NOT EXISTS ix_employees_team ON employees (team)",
+        "CREATE INDEX IF NOT EXISTS ix_jira_tickets_assignee_status ON jira_tickets (assignee, status)",
+        "CREATE INDEX IF NOT EXISTS ix_jira_tickets_status_priority ON jira_tickets (status, priority)",
+        "CREATE INDEX IF NOT EXISTS ix_jira_tickets_priority ON jira_tickets (priority)",
+        "CREATE INDEX IF NOT EXISTS ix_deployments_service_date ON deployments (service, date)",
+        "CREATE INDEX IF NOT EXISTS ix_deployments_status_date ON deployments (status, date)",
+        "CREATE INDEX IF NOT EXISTS ix_deployments_date ON deployments (date)",
+    ]),
+    (2, "planner statistics for the new indexes", [
+        "ANALYZE",
+    ]),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(engine: Engine) -> int:
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate(engine: Engine) -> int:
+    """Apply pending migrations; returns the resulting schema version."""
+    version = current_version(engine)
+    for target, description, statements in MIGRATIONS:
+        if target <= version:
+            continue
+        logger.info(f"Migrating database to v{target}: {description}")
+        with engine.begin() as conn:
+            for sql in statements:
+                conn.exec_driver_sql(sql)
+            # PRAGMA can't take bound parameters
+            conn.exec_driver_sql(f"PRAGMA user_version = {int(target)}")
+        version = target
+    return version
+
+
+if __name__ == "__main__":
+    from create_db import engine, DB_PATH
+    print(f"Database: {DB_PATH}")
+    print(f"Schema version: v{current_version(engine)} (latest v{SCHEMA_VERSION})")
+    if "--check" not in sys.argv:
+        print(f"Now at v{migrate(engine)}")
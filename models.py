@@ -1,5 +1,4 @@
-from email.mime import text
-from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy import Column, Index, Integer, String, Text
 from sqlalchemy.ext.declarative import declarative_base
 
 
@@ -13,6 +12,11 @@ class Employee(Base):
     role = Column(Text, nullable=False)
     team = Column(Text)
     jira_username = Column(Text)
+
+    __table_args__ = (
+        Index("ix_employees_jira_username", "jira_username"),  # joins to jira_tickets.assignee
+        Index("ix_employees_team", "team"),
+    )
     
 class JiraTicket(Base):
     __tablename__ = "jira_tickets"
@@ -21,6 +25,12 @@ class JiraTicket(Base):
     status = Column(Text)
     assignee = Column(Text)
     priority = Column(Text)
+
+    __table_args__ = (
+        Index("ix_jira_tickets_assignee_status", "assignee", "status"),
+        Index("ix_jira_tickets_status_priority", "status", "priority"),
+        Index("ix_jira_tickets_priority", "priority"),
+    )
     
 class Deployment(Base):
     __tablename__ = "deployments"
@@ -28,4 +38,11 @@ class Deployment(Base):
     service = Column(Text)
     version = Column(Text)
     date = Column(Text)  # Store ISO string
-    status = Column(Text)
\ No newline at end of file
+    status = Column(Text)
+
+    __table_args__ = (
+        # Filter by service/status, newest first
+        Index("ix_deployments_service_date", "service", "date"),
+        Index("ix_deployments_status_date", "status", "date"),
+        Index("ix_deployments_date", "date"),
+    )
\ No newline at end of file